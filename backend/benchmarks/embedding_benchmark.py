@@ -0,0 +1,90 @@
+"""
+Benchmark of the embedding backends: the local ONNX model (services/local_embeddings.py) vs. the remote OpenRouter embeddings.
+
+Usage (from the backend directory):
+    python benchmarks/embedding_benchmark.py [--backends local remote] [--chunks 500] [--queries 50] [--model-dir DIR]
+
+"queries/s" embeds --queries single queries one after another, like the retrievals of generateExam.
+"chunks/s" indexes --chunks synthetic course material chunks into a temporary Chroma DB (embedding + writing, no embedding cache).
+The local model is downloaded from the Hugging Face Hub unless --model-dir is given, the remote backend needs LLM_API_KEY.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from models.course_material_chunk import CourseMaterialChunk
+from services.local_embeddings import OnnxEmbeddingFunction
+from services.openrouter_client import OpenRouterClient, OpenRouterEmbeddingFunction
+from services.vector_db import DEFAULT_EMBEDDING_MODEL, VectorDB
+
+WORDS = (
+    "policy gradient value function bellman equation temporal difference learning bootstrapping return reward "
+    "discount factor markov decision process transition probability exploration exploitation epsilon greedy "
+    "actor critic advantage baseline variance bias trust region proximal clipping objective entropy regularization"
+).split()
+
+
+def make_texts(n: int, words: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(words)) for _ in range(n)]
+
+
+def create_backend(name: str, args):
+    if name == "local":
+        embedding_function = OnnxEmbeddingFunction(model_name=args.model, model_dir=args.model_dir, threads=args.threads or None)
+        return embedding_function, embedding_function.model_id
+    api_key = os.environ.get("LLM_API_KEY")
+    if not api_key:
+        return None, None
+    return OpenRouterEmbeddingFunction(OpenRouterClient(api_key=api_key), model_name=DEFAULT_EMBEDDING_MODEL), DEFAULT_EMBEDDING_MODEL
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["local", "remote"], choices=["local", "remote"])
+    parser.add_argument("--chunks", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--model", default="Xenova/all-MiniLM-L6-v2")
+    parser.add_argument("--model-dir")
+    parser.add_argument("--threads", type=int, default=0)
+    args = parser.parse_args()
+
+    chunks = [
+        CourseMaterialChunk(id=f"bench-{i}", course_id=0, chunk_ind=i, text=text)
+        for i, text in enumerate(make_texts(args.chunks, words=150, seed=1))
+    ]
+    queries = make_texts(args.queries, words=4, seed=2)
+
+    print(f"{'backend':<10}{'model':<28}{'queries/s':>11}{'ms/query':>10}{'chunks/s':>10}")
+    for name in args.backends:
+        embedding_function, model = create_backend(name, args)
+        if embedding_function is None:
+            print(f"{name:<10}skipped (LLM_API_KEY is not set)")
+            continue
+
+        embedding_function([queries[0]])  # warm up (model load, connection)
+        start = time.perf_counter()
+        for query in queries:
+            embedding_function([query])
+        query_seconds = time.perf_counter() - start
+
+        with tempfile.TemporaryDirectory() as tmp:
+            vector_db = VectorDB(db_path=tmp, embedding_function=embedding_function, embedding_model_name=model, require_api_key=False)
+            start = time.perf_counter()
+            vector_db.index_course_material(chunks, [{"topic": "unknown"}] * len(chunks))
+            index_seconds = time.perf_counter() - start
+
+        print(
+            f"{name:<10}{model:<28}{len(queries) / query_seconds:>11.1f}{query_seconds * 1000 / len(queries):>10.1f}"
+            f"{len(chunks) / index_seconds:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Eval harness for the retrieval of old exam questions: recall@k and latency of the fused exam vectors (stem, answers, topic)
+vs. the embedding of the full question text (the ranking before the exam vectors).
+
+Usage (from the backend directory):
+    python benchmarks/exam_retrieval_eval.py [--backend local|remote] [--k 1 3 5] [--weights stem=0.6,answers=0.15,topic=0.25]
+
+The questions are the old exam questions in eval/eval_results.md (one course per prefix, e.g. "GenAI"), the queries and
+the relevant questions (substrings of their text) are in eval/exam_retrieval_cases.json.
+Latency is measured per query without the retrieval cache, so it includes embedding the query.
+The local backend downloads its model from the Hugging Face Hub unless --model-dir is given, the remote backend needs LLM_API_KEY.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from models.exam_question_chunk import ExamQuestionChunk
+from models.question_type import QuestionType
+from services.local_embeddings import OnnxEmbeddingFunction
+from services.openrouter_client import OpenRouterClient, OpenRouterEmbeddingFunction
+from services.vector_db import DEFAULT_EMBEDDING_MODEL, DEFAULT_EXAM_VECTOR_WEIGHTS, VectorDB
+
+EVAL_DIR = Path(__file__).resolve().parents[2] / "eval"
+SECTION = re.compile(r"## (\w+) — Old Exam Questions.*?\n\n~~~json\n(.*?)\n~~~", re.S)
+
+
+# the old exam questions of eval_results.md, grouped by course (duplicates across sections are removed)
+def load_questions(path: Path) -> dict[str, list[dict]]:
+    courses: dict[str, dict[str, dict]] = {}
+    for course, block in SECTION.findall(path.read_text(encoding="utf-8")):
+        for question in json.loads(block):
+            courses.setdefault(course, {})[question["question"]] = question
+    return {course: list(questions.values()) for course, questions in courses.items()}
+
+
+def to_chunks(course_id: int, questions: list[dict]) -> tuple[list[ExamQuestionChunk], list[dict]]:
+    chunks, metadata = [], []
+    for i, question in enumerate(questions):
+        text = question["question"]
+        if question.get("answer_keys"):
+            text += " [ANSWER_KEYS] " + " [SEP] ".join(question["answer_keys"])
+        chunks.append(ExamQuestionChunk(id=f"eval-{course_id}-{i}", course_id=course_id, chunk_ind=i, text=text, question_type=QuestionType(question["question_type"])))
+        metadata.append({"topic": question.get("metadata", {}).get("topic", "unknown")})
+    return chunks, metadata
+
+
+def create_embedding_function(args):
+    if args.backend == "local":
+        embedding_function = OnnxEmbeddingFunction(model_name=args.model, model_dir=args.model_dir)
+        return embedding_function, embedding_function.model_id
+    api_key = os.environ.get("LLM_API_KEY")
+    if not api_key:
+        sys.exit("The remote backend needs LLM_API_KEY")
+    return OpenRouterEmbeddingFunction(OpenRouterClient(api_key=api_key), model_name=DEFAULT_EMBEDDING_MODEL), DEFAULT_EMBEDDING_MODEL
+
+
+def parse_weights(value: str) -> dict[str, float]:
+    return {name.strip(): float(weight) for name, weight in (part.split("=") for part in value.split(",") if part.strip())}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default="local", choices=["local", "remote"])
+    parser.add_argument("--model", default="Xenova/all-MiniLM-L6-v2")
+    parser.add_argument("--model-dir")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--weights", type=parse_weights, default=DEFAULT_EXAM_VECTOR_WEIGHTS)
+    args = parser.parse_args()
+
+    questions = load_questions(EVAL_DIR / "eval_results.md")
+    cases = json.loads((EVAL_DIR / "exam_retrieval_cases.json").read_text(encoding="utf-8"))
+    course_ids = {course: i + 1 for i, course in enumerate(sorted(questions))}
+    embedding_function, model = create_embedding_function(args)
+    max_k = max(args.k)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        vector_db = VectorDB(db_path=tmp, embedding_function=embedding_function, embedding_model_name=model, require_api_key=False, exam_vector_weights=args.weights)
+        for course, course_questions in questions.items():
+            chunks, metadata = to_chunks(course_ids[course], course_questions)
+            vector_db.index_old_exam_questions(chunks, metadata)
+
+        hits = {"full text": {k: 0 for k in args.k}, "fused": {k: 0 for k in args.k}}
+        latency = {"full text": 0.0, "fused": 0.0}
+        relevant_total = {k: 0 for k in args.k}
+        for case in cases:
+            course_id = course_ids[case["course"]]
+
+            vector_db.retrieval_cache.clear()
+            start = time.perf_counter()
+            result = vector_db.old_exam_collection.query(
+                query_embeddings=[vector_db._embed_query(vector_db._normalize_query(case["query"]))],
+                n_results=max_k,
+                where={"course_id": str(course_id)},
+                include=["documents"],
+            )
+            latency["full text"] += time.perf_counter() - start
+            full_text = [document.split("[ANSWER_KEYS]")[0] for document in result["documents"][0]]
+
+            vector_db.retrieval_cache.clear()
+            start = time.perf_counter()
+            fused = [question.question for question in vector_db.retrieve_old_exam_questions(course_id, query=case["query"], n=max_k)]
+            latency["fused"] += time.perf_counter() - start
+
+            for k in args.k:
+                # recall@k: the share of the relevant questions that are among the first k (at most k can be found)
+                relevant_total[k] += min(k, len(case["relevant"]))
+                for name, ranking in (("full text", full_text), ("fused", fused)):
+                    hits[name][k] += sum(1 for needle in case["relevant"] if any(needle in text for text in ranking[:k]))
+
+        print(f"{len(cases)} queries, {sum(len(q) for q in questions.values())} questions, model {model}, weights {args.weights}")
+        print(f"{'ranking':<12}" + "".join(f"{f'recall@{k}':>11}" for k in args.k) + f"{'ms/query':>10}")
+        for name in ("full text", "fused"):
+            print(
+                f"{name:<12}" + "".join(f"{min(1.0, hits[name][k] / max(1, relevant_total[k])):>11.2f}" for k in args.k)
+                + f"{latency[name] * 1000 / len(cases):>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Micro-benchmark of the OCR preprocessing: the old PIL pipeline vs. the NumPy one (services/ocr_preprocessing.py).
+
+Usage (from the backend directory):
+    python benchmarks/ocr_preprocessing_benchmark.py [path/to/slides.pdf] [--pages 5] [--dpi 300] [--repeat 5]
+
+Every page is rendered once at --dpi. Per page, the best time of --repeat runs is reported for every step,
+from the rendered pixmap to the binarized image that goes to Tesseract (Tesseract itself is not part of it).
+"planned" renders the page in grayscale at the zoom FileProcessor._render_zoom picks (the OCR size), so nothing has to be resized.
+Without a PDF, a synthetic A4 page with text and a photo-like figure is used.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import fitz
+import numpy as np
+from PIL import Image, ImageFilter, ImageOps
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.file_processor import FileProcessor
+from services.ocr_preprocessing import pixmap_to_gray, prepare_for_ocr
+
+MIN_DIM = 1200
+MAX_DIM = 2600
+
+
+def build_pages(path: str, n_pages: int) -> None:
+    from fpdf import FPDF
+
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = os.path.join(tmp, "figure.png")
+        Image.effect_noise((600, 400), 60).convert("RGB").save(image_path)
+        pdf = FPDF()
+        pdf.set_font("Arial", size=11)
+        for i in range(n_pages):
+            pdf.add_page()
+            pdf.multi_cell(0, 6, f"Page {i + 1}\n" + "Temporal difference learning bootstraps from its own estimates. " * 30)
+            pdf.image(image_path, x=30, y=180, w=150)
+        pdf.output(path)
+
+
+# the pipeline before services/ocr_preprocessing.py: RGB render -> PIL RGB -> L, filters in PIL, Otsu as a Python loop
+def legacy_prepare(pix):
+    image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    img = image.convert("L")
+    img = ImageOps.autocontrast(img)
+    img = img.filter(ImageFilter.MedianFilter(size=3))
+    long_edge = max(img.width, img.height)
+    if long_edge > MAX_DIM:
+        scale = MAX_DIM / float(long_edge)
+        img = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))), resample=Image.Resampling.LANCZOS)
+    threshold = legacy_otsu(img)
+    binary = img.point(lambda p: 255 if p > threshold else 0, mode="1")
+    return binary.convert("L")
+
+
+def legacy_otsu(img) -> int:
+    hist = img.histogram()
+    total = sum(hist)
+    sum_total = sum(i * hist[i] for i in range(256))
+    sumB = 0
+    wB = 0
+    var_max = 0.0
+    threshold = 0
+    for t in range(256):
+        wB += hist[t]
+        if wB == 0:
+            continue
+        wF = total - wB
+        if wF == 0:
+            break
+        sumB += t * hist[t]
+        mB = sumB / wB
+        mF = (sum_total - sumB) / wF
+        var_between = wB * wF * (mB - mF) ** 2
+        if var_between > var_max:
+            var_max = var_between
+            threshold = t
+    return threshold
+
+
+def numpy_prepare(pix):
+    return prepare_for_ocr(pixmap_to_gray(pix), MIN_DIM, MAX_DIM)
+
+
+def best_of(function, repeat: int) -> float:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", nargs="?")
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    pdf_path = args.pdf
+    generated = None
+    if pdf_path is None:
+        generated = pdf_path = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False).name
+        build_pages(pdf_path, args.pages)
+
+    try:
+        doc = fitz.open(pdf_path)
+        matrix = fitz.Matrix(args.dpi / 72.0, args.dpi / 72.0)
+        processor = FileProcessor(ocr_dpi=args.dpi, ocr_min_dim=MIN_DIM, ocr_max_dim=MAX_DIM)
+        print(f"{'page':>5}{'size':>12}{'render RGB':>12}{'render gray':>13}{'legacy prep':>13}{'numpy prep':>12}{'planned':>9}{'speedup':>9}{'MB before':>11}{'MB after':>10}")
+        totals = np.zeros(5)
+        for page_index in range(min(args.pages, doc.page_count)):
+            page = doc.load_page(page_index)
+            rgb_pix = page.get_pixmap(matrix=matrix, alpha=False)
+            gray_pix = page.get_pixmap(matrix=matrix, colorspace=fitz.csGRAY, alpha=False)
+            zoom = processor._render_zoom(page.rect)
+            planned_matrix = fitz.Matrix(zoom, zoom)
+            planned_pix = page.get_pixmap(matrix=planned_matrix, colorspace=fitz.csGRAY, alpha=False)
+            timings = np.array([
+                best_of(lambda: page.get_pixmap(matrix=matrix, alpha=False), args.repeat),
+                best_of(lambda: page.get_pixmap(matrix=matrix, colorspace=fitz.csGRAY, alpha=False), args.repeat),
+                best_of(lambda: legacy_prepare(rgb_pix), args.repeat),
+                best_of(lambda: numpy_prepare(gray_pix), args.repeat),
+                best_of(lambda: numpy_prepare(page.get_pixmap(matrix=planned_matrix, colorspace=fitz.csGRAY, alpha=False)), args.repeat),
+            ])
+            totals += timings
+            before, after = timings[0] + timings[2], timings[4]
+            print(
+                f"{page_index + 1:>5}{f'{gray_pix.width}x{gray_pix.height}':>12}"
+                + "".join(f"{t * 1000:>{w}.1f}" for t, w in zip(timings, (12, 13, 13, 12, 9)))
+                + f"{before / after:>8.1f}x{len(rgb_pix.samples_mv) / 1e6:>11.1f}{len(planned_pix.samples_mv) / 1e6:>10.1f}"
+            )
+        before, after = totals[0] + totals[2], totals[4]
+        print(f"render + preprocessing per page (ms): legacy {before * 1000 / max(1, page_index + 1):.1f}, planned {after * 1000 / max(1, page_index + 1):.1f}")
+    finally:
+        if generated:
+            os.unlink(generated)
+
+
+if __name__ == "__main__":
+    main()
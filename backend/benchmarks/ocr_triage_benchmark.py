@@ -0,0 +1,130 @@
+"""
+Benchmark of the OCR page triage of the FileProcessor on scanned vs. born-digital PDFs.
+
+Usage (from the backend directory, needs the tesseract binary):
+    python benchmarks/ocr_triage_benchmark.py [--scanned DIR] [--digital DIR] [--pages 20] [--ocr-mode page]
+
+Every corpus is processed with the triage disabled, enabled, and enabled with --probe-text-pages behaviour
+(FileProcessor.triage_probe_text_pages). For each run the number of OCR'd pages, the triage decisions and the duration are reported.
+Without --scanned/--digital, small synthetic corpora are generated:
+born-digital slides (a lecture deck: content slides with a small logo, short title/section slides with the logo that have
+too little text for the text layer to count as usable, and a few slides with a large screenshot of a diagram)
+and scanned pages (the same slides rasterized, without a text layer).
+With --ocr-mode regions, only the images of pages with a text layer are OCR'd (see FileProcessor.ocr_mode).
+"""
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from models.course_material_type import CourseMaterialType
+from services.file_processor import FileProcessor
+
+
+def build_corpora(directory: str, n_pages: int) -> tuple[list[str], list[str]]:
+    import fitz
+    from fpdf import FPDF
+    from PIL import Image
+
+    from PIL import ImageDraw
+
+    logo_path = os.path.join(directory, "logo.png")
+    Image.new("RGB", (60, 60), color=(20, 60, 160)).save(logo_path)
+    # a screenshot of a diagram, its labels are only in the image
+    screenshot_path = os.path.join(directory, "screenshot.png")
+    screenshot = Image.new("RGB", (1200, 600), color=(255, 255, 255))
+    draw = ImageDraw.Draw(screenshot)
+    for row, label in enumerate(["Actor network outputs", "Critic estimates advantage", "Clipped surrogate objective"]):
+        draw.rectangle((100, 60 + row * 180, 1100, 180 + row * 180), outline=(0, 0, 0), width=4)
+        draw.text((140, 100 + row * 180), label, fill=(0, 0, 0), font_size=48)
+    screenshot.save(screenshot_path)
+
+    digital_path = os.path.join(directory, "digital.pdf")
+    pdf = FPDF(orientation="L")
+    pdf.set_font("Arial", size=16)
+    for i in range(n_pages):
+        pdf.add_page()
+        pdf.image(logo_path, x=270, y=5, w=15)
+        if i % 5 == 0:
+            pdf.set_font("Arial", size=32)
+            pdf.multi_cell(0, 20, f"Part {i // 5 + 1}")  # title/section slide
+            pdf.set_font("Arial", size=16)
+        elif i % 5 == 3:
+            pdf.multi_cell(0, 9, f"Lecture 3, slide {i + 1}: the PPO architecture and its clipped objective")
+            pdf.image(screenshot_path, x=30, y=40, w=230)
+        else:
+            pdf.multi_cell(0, 9, f"Lecture 3, slide {i + 1}\n" + "The policy gradient theorem relates the gradient of the return to the score function. " * 4)
+    pdf.output(digital_path)
+
+    # rasterize every slide at 150 dpi and put the images into a PDF without text layer
+    scanned_path = os.path.join(directory, "scanned.pdf")
+    source = fitz.open(digital_path)
+    scanned = fitz.open()
+    for page in source:
+        pix = page.get_pixmap(dpi=150)
+        scanned_page = scanned.new_page(width=page.rect.width, height=page.rect.height)
+        scanned_page.insert_image(scanned_page.rect, pixmap=pix)
+    scanned.save(scanned_path)
+    return [scanned_path], [digital_path]
+
+
+def run(pdf_paths: list[str], triage: bool, probe_text_pages: bool, ocr_mode: str) -> dict:
+    processor = FileProcessor(use_ocr=True, ocr_triage=triage, triage_probe_text_pages=probe_text_pages, ocr_mode=ocr_mode)
+    decisions: Counter = Counter()
+    n_pages = 0
+    start = time.perf_counter()
+    for path in pdf_paths:
+        metadata, _ = processor.chunk_and_enrich(path, CourseMaterialType.SLIDES, course_id=0)
+        pages = {m["page_start"]: m["ocr_decision"] for m in metadata}
+        n_pages += len(pages)
+        decisions.update(pages.values())
+    duration = time.perf_counter() - start
+    return {
+        "pages": n_pages,
+        "ocr_pages": sum(count for decision, count in decisions.items() if decision.startswith("ocr:")),
+        "seconds": duration,
+        "decisions": dict(decisions),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scanned", help="directory with scanned PDFs")
+    parser.add_argument("--digital", help="directory with born-digital PDFs")
+    parser.add_argument("--pages", type=int, default=20, help="pages per synthetic corpus")
+    parser.add_argument("--ocr-mode", default="page", choices=["page", "regions"])
+    args = parser.parse_args()
+
+    if not FileProcessor(use_ocr=True)._ensure_ocr_ready():
+        sys.exit("OCR is not available (pytesseract, Pillow, PyMuPDF and the tesseract binary are needed)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.scanned or args.digital:
+            corpora = {
+                "scanned": sorted(glob.glob(os.path.join(args.scanned, "*.pdf"))) if args.scanned else [],
+                "digital": sorted(glob.glob(os.path.join(args.digital, "*.pdf"))) if args.digital else [],
+            }
+        else:
+            scanned, digital = build_corpora(tmp, args.pages)
+            corpora = {"scanned": scanned, "digital": digital}
+
+        print(f"{'corpus':<9}{'triage':<14}{'pages':>7}{'ocr':>6}{'seconds':>10}{'s/page':>8}  decisions")
+        for name, paths in corpora.items():
+            if not paths:
+                continue
+            for triage, probe_text_pages, label in ((False, False, "off"), (True, False, "on"), (True, True, "on+text")):
+                r = run(paths, triage, probe_text_pages, args.ocr_mode)
+                print(
+                    f"{name:<9}{label:<14}{r['pages']:>7}{r['ocr_pages']:>6}"
+                    f"{r['seconds']:>10.2f}{r['seconds'] / max(r['pages'], 1):>8.3f}  {r['decisions']}"
+                )
+
+
+if __name__ == "__main__":
+    main()
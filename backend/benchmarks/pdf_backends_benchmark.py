@@ -0,0 +1,111 @@
+"""
+Benchmark of the PDF backends of the FileProcessor (pages/sec and peak RSS).
+
+Usage (from the backend directory):
+    python benchmarks/pdf_backends_benchmark.py [path/to/slides.pdf] [--pages 400] [--repeat 3]
+
+Without a PDF, a synthetic slide deck (text + one image per page) with `--pages` pages is generated.
+Every backend runs in its own subprocess, so the peak RSS of one run doesn't hide the other.
+OCR is disabled, only parsing (text + image detection) is measured.
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def build_slide_deck(path: str, n_pages: int) -> None:
+    from fpdf import FPDF
+    from PIL import Image
+
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = os.path.join(tmp, "figure.png")
+        Image.effect_noise((320, 240), 60).convert("RGB").save(image_path)
+
+        pdf = FPDF(orientation="L")
+        pdf.set_font("Arial", size=14)
+        for i in range(n_pages):
+            pdf.add_page()
+            pdf.multi_cell(0, 8, f"Slide {i + 1}: Policy gradients\n" + "Advantage estimation reduces variance. " * 12)
+            pdf.image(image_path, x=150, y=80, w=120)
+        pdf.output(path)
+
+
+def run_backend(pdf_path: str, backend: str, repeat: int) -> dict:
+    from models.course_material_type import CourseMaterialType
+    from services.file_processor import FileProcessor
+
+    with open(pdf_path, "rb") as pdf_file:
+        pdf_bytes = pdf_file.read()
+
+    processor = FileProcessor(use_ocr=False, pdf_backend=backend)
+    durations = []
+    n_chunks = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _, chunks = processor.chunk_and_enrich(io.BytesIO(pdf_bytes), CourseMaterialType.SLIDES, course_id=0)
+        durations.append(time.perf_counter() - start)
+        n_chunks = len(chunks)
+
+    from services.pdf_backends import open_pdf
+    with open_pdf(pdf_bytes, backend) as document:
+        n_pages = document.page_count
+
+    best = min(durations)
+    return {
+        "backend": backend,
+        "pages": n_pages,
+        "chunks": n_chunks,
+        "best_seconds": round(best, 3),
+        "pages_per_second": round(n_pages / best, 1),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", nargs="?", help="PDF to benchmark, a synthetic slide deck is generated if omitted")
+    parser.add_argument("--pages", type=int, default=400, help="pages of the synthetic slide deck")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backends", default="pymupdf,pypdf")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)  # internal: run one backend and print its result as JSON
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_backend(args.pdf, args.worker, args.repeat)))
+        return
+
+    pdf_path = args.pdf
+    generated = None
+    if pdf_path is None:
+        generated = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False).name
+        print(f"Generating a synthetic slide deck with {args.pages} pages ...")
+        build_slide_deck(generated, args.pages)
+        pdf_path = generated
+
+    try:
+        print(f"PDF: {pdf_path} ({os.path.getsize(pdf_path) / 1e6:.1f} MB)")
+        print(f"{'backend':<10}{'pages':>8}{'chunks':>8}{'seconds':>10}{'pages/s':>10}{'peak RSS MB':>13}")
+        for backend in args.backends.split(","):
+            output = subprocess.run(
+                [sys.executable, __file__, pdf_path, "--worker", backend, "--repeat", str(args.repeat)],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            r = json.loads(output.strip().splitlines()[-1])
+            print(f"{r['backend']:<10}{r['pages']:>8}{r['chunks']:>8}{r['best_seconds']:>10}{r['pages_per_second']:>10}{r['peak_rss_mb']:>13}")
+    finally:
+        if generated:
+            os.unlink(generated)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 from fastapi import FastAPI, UploadFile, File, Response, Query, HTTPException, status
-from fastapi.responses import JSONResponse
-from typing import BinaryIO
-import io
+from fastapi.responses import JSONResponse, StreamingResponse
+from contextlib import asynccontextmanager
 import os
 import sys
+import json
+import random
+import asyncio
 import logging
 from dataclasses import asdict
 from fastapi.middleware.cors import CORSMiddleware
@@ -13,17 +15,32 @@ if CURRENT_DIR not in sys.path:
     sys.path.append(CURRENT_DIR)
 
 from services.file_processor import FileProcessor
-from services.vector_db import VectorDB
+from services.vector_db import DEFAULT_EMBEDDING_MODEL, DEFAULT_EXAM_VECTOR_WEIGHTS, VectorDB
+from services.local_embeddings import OnnxEmbeddingFunction
+from services.embedding_cache import EmbeddingCache
+from services.retrieval_cache import RetrievalCache
 from services.question_generator import QuestionGenerator
 from services.pdf_generator import PDFGenerator
 from services.course_service import CourseService
 from services.hash_db import HashDB
+from services.openrouter_client import OpenRouterClient
+from services.context_budgeter import ContextBudgeter
+from services.task_executor import BoundedExecutor, ExecutorSaturatedError
+from services.job_store import JobStore
+from services.ingestion_service import IngestionService
+from services.indexing_pipeline import IndexingPipeline
+from services.job_queue import IngestionJobQueue
+from services.exam_cache import ExamCache
+from services.upload_spooler import UploadSpooler, UploadTooLargeError
+from services.ocr_cache import OcrCache
 from models.course_material_type import CourseMaterialType
 from models.course_material_chunk import CourseMaterialChunk
 from models.question import Question
 from models.course import CourseModel, Course, CourseCreateDTO
 from models.course_material import CourseMaterial
 from models.exam_question_chunk import ExamQuestionChunk
+from models.ingestion_job import IngestionJob
+from models.exam_variant import ExamVariant
 
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(
@@ -37,6 +54,13 @@ def _env_bool(name: str, default: bool = True) -> bool:
         return default
     return val.strip().lower() in {"1", "true", "yes", "on"}
 
+# e.g. "stem=0.6,answers=0.15,topic=0.25" -> {"stem": 0.6, "answers": 0.15, "topic": 0.25}
+def _env_weights(name: str, default: dict[str, float]) -> dict[str, float]:
+    val = os.getenv(name)
+    if not val:
+        return dict(default)
+    return {key.strip(): float(weight) for key, weight in (part.split("=", 1) for part in val.split(",") if part.strip())}
+
 OCR_ENABLED = _env_bool("OCR_ENABLED", True)
 OCR_MAX_IMAGES_PER_PAGE = int(os.getenv("OCR_MAX_IMAGES_PER_PAGE", "10"))
 OCR_MIN_TEXT_FOR_OCR = int(os.getenv("OCR_MIN_TEXT_FOR_OCR", "0"))
@@ -45,6 +69,74 @@ OCR_MIN_DIM = int(os.getenv("OCR_MIN_DIM", "1200"))
 OCR_PSM = os.getenv("OCR_PSM", "3")
 OCR_LOG_TEXT = _env_bool("OCR_LOG_TEXT", False)
 OCR_LANG = os.getenv("OCR_LANG", "eng+deu")
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "1"))
+PDF_BACKEND = os.getenv("PDF_BACKEND", "pymupdf")  # "pymupdf" (single pass) or "pypdf" (fallback)
+OCR_TRIAGE = _env_bool("OCR_TRIAGE", True)  # decide per page (image coverage, text density, thumbnail probe) whether OCR is needed
+OCR_TRIAGE_MIN_IMAGE_COVERAGE = float(os.getenv("OCR_TRIAGE_MIN_IMAGE_COVERAGE", "0.15"))
+OCR_TRIAGE_PROBE_TEXT_PAGES = _env_bool("OCR_TRIAGE_PROBE_TEXT_PAGES", False)  # also OCR image-heavy pages that have a text layer if the probe finds new words
+OCR_MODE = os.getenv("OCR_MODE", "page")  # "page" (render + OCR the full page) or "regions" (only OCR the images of a page)
+OCR_ENGINE = os.getenv("OCR_ENGINE", "pytesseract")  # "tesserocr" keeps tesseract loaded in-process (needs the tesserocr package)
+OCR_PROFILE_SAMPLE_PAGES = int(os.getenv("OCR_PROFILE_SAMPLE_PAGES", "3"))  # pages per document that orientation/language are detected on
+OCR_RECHECK_CONFIDENCE = float(os.getenv("OCR_RECHECK_CONFIDENCE", "60"))  # pages below this OCR confidence get their own detection
+# Persistent OCR results keyed by page content + OCR settings, so re-uploaded PDFs aren't OCR'd again
+OCR_CACHE_ENABLED = _env_bool("OCR_CACHE_ENABLED", True)
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "data/ocr_cache.sqlite3")
+OCR_CACHE_MAX_MB = int(os.getenv("OCR_CACHE_MAX_MB", "512"))  # least recently used results are evicted above this size
+# Execution model: blocking work runs on bounded thread pools instead of the event loop
+CPU_EXECUTOR_WORKERS = int(os.getenv("CPU_EXECUTOR_WORKERS", "2"))  # OCR/PDF parsing and rendering
+IO_EXECUTOR_WORKERS = int(os.getenv("IO_EXECUTOR_WORKERS", "16"))  # Mongo, Chroma and LLM calls
+EXECUTOR_MAX_QUEUE = int(os.getenv("EXECUTOR_MAX_QUEUE", "100"))
+# Large exams are generated in concurrent shards of at most GENERATION_SHARD_SIZE questions
+GENERATION_SHARD_SIZE = int(os.getenv("GENERATION_SHARD_SIZE", "10"))
+GENERATION_MAX_CONCURRENT_SHARDS = int(os.getenv("GENERATION_MAX_CONCURRENT_SHARDS", "4"))
+# Background ingestion of uploads (independent of the executors above)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "data/uploads")
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "100"))  # larger uploads are rejected with 413
+UPLOAD_CHUNK_KB = int(os.getenv("UPLOAD_CHUNK_KB", "1024"))  # memory used per concurrent upload while it is written to disk
+# Persistent embedding cache, so the same text is only embedded once per model
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "data/embedding_cache.sqlite3")
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "5000"))
+# Embeddings: "openrouter" (remote text-embedding-3-small) or "local" (a small ONNX model on the CPU, int8 quantized).
+# Every model has its own collections, switching the backend means the course material has to be uploaded again
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openrouter").strip().lower()
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "Xenova/all-MiniLM-L6-v2")  # downloaded from the Hugging Face Hub once
+LOCAL_EMBEDDING_MODEL_DIR = os.getenv("LOCAL_EMBEDDING_MODEL_DIR") or None  # a directory with tokenizer.json + onnx/model_quantized.onnx instead
+LOCAL_EMBEDDING_THREADS = int(os.getenv("LOCAL_EMBEDDING_THREADS", "0")) or None  # 0 = min(4, CPU cores)
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "32"))
+if EMBEDDING_BACKEND not in ("openrouter", "local"):
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{EMBEDDING_BACKEND}', use 'openrouter' or 'local'")
+# Old exam questions are ranked by the weighted similarity of their stem, answer keys and topic to the query
+EXAM_VECTOR_WEIGHTS = _env_weights("EXAM_VECTOR_WEIGHTS", DEFAULT_EXAM_VECTOR_WEIGHTS)
+# Course material is ranked by vector similarity and BM25 (exact terms like course codes or GRPO), fused with reciprocal rank fusion
+HYBRID_RETRIEVAL = _env_bool("HYBRID_RETRIEVAL", True)
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Course material for a query is picked out of MMR_POOL_FACTOR * n candidates by maximal marginal relevance, so near-duplicate
+# chunks don't all end up in the prompt (MMR_LAMBDA: 1 = only relevance, lower = more diverse)
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.5"))
+MMR_POOL_FACTOR = int(os.getenv("MMR_POOL_FACTOR", "3"))
+# Indexing: embedding requests stay under EMBEDDING_BATCH_TOKENS (the provider's limit per request) and EMBEDDING_BATCH_SIZE texts,
+# up to EMBEDDING_MAX_IN_FLIGHT batches are embedded ahead while earlier ones are written to Chroma
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", "60000"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+EMBEDDING_MAX_IN_FLIGHT = int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", "2"))
+# In-memory cache of query embeddings and retrieval results (invalidated when a course gets new chunks)
+RETRIEVAL_CACHE_MAX_ITEMS = int(os.getenv("RETRIEVAL_CACHE_MAX_ITEMS", "512"))
+RETRIEVAL_CACHE_TTL_SECONDS = float(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", "600"))
+# Shared OpenRouter client for chat completions and embeddings (pooled connections, retries, rate limiting)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "16"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_REQUESTS_PER_SECOND = float(os.getenv("LLM_REQUESTS_PER_SECOND", "0")) or None  # 0 = only follow the server's rate limit headers
+LLM_HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "0")) or None  # 0 = no hedged requests
+# Token budget for the course material and example questions in a generation prompt
+PROMPT_CONTEXT_MAX_TOKENS = int(os.getenv("PROMPT_CONTEXT_MAX_TOKENS", "6000"))
+PROMPT_QUESTION_SHARE = float(os.getenv("PROMPT_QUESTION_SHARE", "0.3"))
+# Opt-in cache of generated exams: a pool of EXAM_CACHE_POOL_SIZE variants per (course, topics, n_questions), refilled in the background
+EXAM_CACHE_ENABLED = _env_bool("EXAM_CACHE_ENABLED", False)
+EXAM_CACHE_POOL_SIZE = int(os.getenv("EXAM_CACHE_POOL_SIZE", "3"))
+EXAM_CACHE_MAX_SERVES = int(os.getenv("EXAM_CACHE_MAX_SERVES", "1"))  # how often a variant is handed out without a seed
+EXAM_CACHE_MAX_CONCURRENT_REFILLS = int(os.getenv("EXAM_CACHE_MAX_CONCURRENT_REFILLS", "1"))
 
 # Quiet noisy third-party debug logs (PIL, pytesseract, httpx, openai) while keeping our debug output
 for noisy_logger in [
@@ -52,7 +144,8 @@ for noisy_logger in [
     "PIL.PngImagePlugin",
     "pytesseract",
     "httpx",
-    "openai",
+    "httpcore",
+    "hpack",
 ]:
     logging.getLogger(noisy_logger).setLevel(logging.WARNING)
 
@@ -66,15 +159,74 @@ file_processor = FileProcessor(
     ocr_psm=OCR_PSM,
     ocr_log_text=OCR_LOG_TEXT,
     ocr_lang=OCR_LANG,
+    ocr_workers=OCR_WORKERS,
+    pdf_backend=PDF_BACKEND,
+    ocr_triage=OCR_TRIAGE,
+    triage_min_image_coverage=OCR_TRIAGE_MIN_IMAGE_COVERAGE,
+    triage_probe_text_pages=OCR_TRIAGE_PROBE_TEXT_PAGES,
+    ocr_mode=OCR_MODE,
+    ocr_engine=OCR_ENGINE,
+    ocr_profile_sample_pages=OCR_PROFILE_SAMPLE_PAGES,
+    ocr_recheck_confidence=OCR_RECHECK_CONFIDENCE,
+    ocr_cache=OcrCache(db_path=OCR_CACHE_PATH, max_bytes=OCR_CACHE_MAX_MB * 1024 * 1024) if OCR_CACHE_ENABLED else None,
+)
+openrouter_client = OpenRouterClient(
+    api_key=os.environ.get("LLM_API_KEY"),
+    max_connections=LLM_MAX_CONNECTIONS,
+    max_in_flight=LLM_MAX_IN_FLIGHT,
+    requests_per_second=LLM_REQUESTS_PER_SECOND,
+    max_retries=LLM_MAX_RETRIES,
+    hedge_after=LLM_HEDGE_AFTER_SECONDS,
+)
+local_embedding_function = OnnxEmbeddingFunction(
+    model_name=LOCAL_EMBEDDING_MODEL,
+    model_dir=LOCAL_EMBEDDING_MODEL_DIR,
+    threads=LOCAL_EMBEDDING_THREADS,
+    batch_size=LOCAL_EMBEDDING_BATCH_SIZE,
+) if EMBEDDING_BACKEND == "local" else None
+vector_db = VectorDB(
+    embedding_function=local_embedding_function,
+    embedding_model_name=local_embedding_function.model_id if local_embedding_function else DEFAULT_EMBEDDING_MODEL,
+    embedding_cache=EmbeddingCache(db_path=EMBEDDING_CACHE_PATH, max_memory_items=EMBEDDING_CACHE_MEMORY_ITEMS),
+    retrieval_cache=RetrievalCache(max_items=RETRIEVAL_CACHE_MAX_ITEMS, ttl_seconds=RETRIEVAL_CACHE_TTL_SECONDS),
+    openrouter_client=openrouter_client,
+    indexing_pipeline=IndexingPipeline(max_batch_tokens=EMBEDDING_BATCH_TOKENS, max_batch_size=EMBEDDING_BATCH_SIZE, max_in_flight=EMBEDDING_MAX_IN_FLIGHT),
+    exam_vector_weights=EXAM_VECTOR_WEIGHTS,
+    hybrid_retrieval=HYBRID_RETRIEVAL,
+    rrf_k=RRF_K,
+    mmr_lambda=MMR_LAMBDA,
+    mmr_pool_factor=MMR_POOL_FACTOR,
+)
+question_generator = QuestionGenerator(
+    questions_per_shard=GENERATION_SHARD_SIZE,
+    max_concurrent_shards=GENERATION_MAX_CONCURRENT_SHARDS,
+    client=openrouter_client,
+    context_budgeter=ContextBudgeter(max_tokens=PROMPT_CONTEXT_MAX_TOKENS, question_share=PROMPT_QUESTION_SHARE),
 )
-vector_db = VectorDB()
-question_generator = QuestionGenerator()
 pdf_generator = PDFGenerator()
 course_service = CourseService()
 hash_db = HashDB()
+cpu_executor = BoundedExecutor(name="cpu", max_workers=CPU_EXECUTOR_WORKERS, max_queue=EXECUTOR_MAX_QUEUE)
+io_executor = BoundedExecutor(name="io", max_workers=IO_EXECUTOR_WORKERS, max_queue=EXECUTOR_MAX_QUEUE)
+job_store = JobStore()
+ingestion_service = IngestionService(file_processor=file_processor, vector_db=vector_db, hash_db=hash_db)
+ingestion_queue = IngestionJobQueue(job_store=job_store, ingestion_service=ingestion_service, upload_dir=UPLOAD_DIR, workers=INGEST_WORKERS)
+upload_spooler = UploadSpooler(spool_dir=UPLOAD_DIR, max_bytes=MAX_UPLOAD_MB * 1024 * 1024, chunk_size=UPLOAD_CHUNK_KB * 1024)
+exam_cache = ExamCache(pool_size=EXAM_CACHE_POOL_SIZE, max_serves=EXAM_CACHE_MAX_SERVES) if EXAM_CACHE_ENABLED else None
 ################################## (Also initializing these services here is kind of dirty, but I didn't care)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ingestion_queue.start()
+    yield
+    for task in list(exam_cache_refills.values()):
+        task.cancel()
+    ingestion_queue.shutdown(wait=True)
+    cpu_executor.shutdown(wait=False)
+    io_executor.shutdown(wait=False)
+    openrouter_client.close()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -83,15 +235,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Exam-Seed", "X-Exam-Cache"],
 )
 
 logger = logging.getLogger(__name__)
 
+@app.exception_handler(ExecutorSaturatedError)
+async def executor_saturated_handler(request, exc: ExecutorSaturatedError):
+    return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"detail": str(exc)})
+
 # POST Endpoint: Creates a new course with `name`
 @app.post("/courses", status_code=201)
 async def createCourse(course_create: CourseCreateDTO):
     try:
-        createdCourse = course_service.create_course(name=course_create.name)
+        createdCourse = await io_executor.run(course_service.create_course, name=course_create.name)
         return createdCourse
     except ValueError as e:
         # duplicate name or other validation issue
@@ -100,14 +257,14 @@ async def createCourse(course_create: CourseCreateDTO):
 # GET Endpoint: Returns a list of all courses
 @app.get("/courses", response_model=list[CourseModel])
 async def getAllCourses():
-    courses: list[Course] = course_service.get_course_list()
+    courses: list[Course] = await io_executor.run(course_service.get_course_list)
     return [CourseModel(**asdict(course)) for course in courses]
 
 # GET Endpoint: Returns the course with `course_id`
 @app.get("/courses/{course_id}", response_model=CourseModel)
 async def getCourse(course_id: int):
     try:
-        course = course_service.get_course(course_id=course_id)
+        course = await io_executor.run(course_service.get_course, course_id=course_id)
         return CourseModel(**asdict(course))
 
     except ValueError:
@@ -117,58 +274,97 @@ async def getCourse(course_id: int):
 @app.get("/courses/{course_id}/materials")
 async def getCourseMaterials(course_id: int):
     try:
-        course_service.get_course(course_id=course_id)  # Verify course exists
-        materials = hash_db.get_materials_for_course(course_id=course_id)
-        return [{"name": m.get("filename"), "type": m.get("type")} for m in materials]
+        await io_executor.run(course_service.get_course, course_id=course_id)  # Verify course exists
+        materials = await io_executor.run(hash_db.get_materials_for_course, course_id=course_id)
+        return [{"id": m.get("material_id"), "name": m.get("filename"), "type": m.get("type")} for m in materials]
     except ValueError:
         raise HTTPException(status_code=404, detail=f"Course with ID {course_id} not found")
 
+# DELETE Endpoint: Removes an uploaded material (its chunks and hashes) from a course, `material_id` is the "id" of GET /courses/{course_id}/materials
+@app.delete("/courses/{course_id}/materials/{material_id}")
+async def deleteCourseMaterial(course_id: int, material_id: str):
+    try:
+        await io_executor.run(course_service.get_course, course_id=course_id)  # Verify course exists
+    except ValueError:
+        raise HTTPException(status_code=404, detail=f"Course with ID {course_id} not found")
+
+    result = await io_executor.run(ingestion_service.remove_material, course_id=course_id, material_id=material_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Material with ID {material_id} not found in course {course_id}")
+    return result
+
 """
 POST Endpoint for saving new course material.
+The file is ingested by a background job, the endpoint returns the job right away.
+The progress of the job can be polled via GET /jobs/{job_id}.
 
 Input:
     course_id... The ID of the course that the uploaded course material belongs to
     material_type... The type of the uploaded material (e.g. slides, notes, exam)
     file... The uploaded PDF
+    replaces (Optional)... The material ID (the "id" of GET /courses/{course_id}/materials) of the document that the file is a revised version of.
+                           Only then the chunks of the old version are replaced, otherwise the file is added as a new document, even if another one has the same name
 """
-@app.post("/courses/{course_id}/upload/{material_type}", status_code=200)
-async def uploadFile(course_id: int, material_type: CourseMaterialType, file: UploadFile = File(...)):
-    file_hash = await hash_db.compute_file_hash(file)
-    saved_file_hash = hash_db.get_file_hash(course_id=course_id, hash=file_hash)
-    if saved_file_hash is not None:
-        message = get_conflict_message(material_type=saved_file_hash["type"])
-        return JSONResponse(status_code=status.HTTP_409_CONFLICT, content={"detail": message})
-
-    pdf_bytes = await file.read()
-    pdf_stream: BinaryIO = io.BytesIO(pdf_bytes)
-
+@app.post("/courses/{course_id}/upload/{material_type}", status_code=202)
+async def uploadFile(course_id: int, material_type: CourseMaterialType, file: UploadFile = File(...), replaces: str | None = Query(default=None)):
     try:
-        logger.info(f"Upload start course_id=%s material_type=%s size=%s bytes", course_id, material_type, len(pdf_bytes))
-
-        if material_type == CourseMaterialType.EXAM:
-            # 1) Extract text, chunk it, and enrich it with exam question metadata
-            exam_question_metadata, exam_question_chunks = file_processor.chunk_and_enrich(pdf_file=pdf_stream, material_type=material_type, course_id=course_id)
-
-            # 2) Save Exam Chunks in Vector DB
-            vector_db.index_old_exam_questions(exam_question_chunks, exam_question_metadata)
-        else:
-            # 1) Extract text, chunk it, and enrich it with course material metadata
-            course_material_metadata, course_material_chunks = file_processor.chunk_and_enrich(pdf_file=pdf_stream, material_type=material_type, course_id=course_id)
-
-            # 2) Save Course Material in Vector DB
-            vector_db.index_course_material(course_material_chunks, course_material_metadata)
+        await io_executor.run(course_service.get_course, course_id=course_id)  # Verify course exists
+    except ValueError:
+        raise HTTPException(status_code=404, detail=f"Course with id {course_id} not found")
 
-        logger.info("Upload complete course_id=%s material_type=%s chunks=%s", course_id, material_type, len(exam_question_chunks if material_type == CourseMaterialType.EXAM else course_material_chunks))
-        hash_db.add_file_hash(course_id=course_id, hash=file_hash, type=material_type, filename=file.filename)
+    if replaces is not None:
+        replaced = await io_executor.run(hash_db.get_material, course_id=course_id, material_id=replaces)
+        if replaced is None or replaced["type"] != material_type.value:
+            raise HTTPException(status_code=404, detail=f"{material_type.value} with ID {replaces} not found in course {course_id}")
 
-        return Response(status_code=200)
+    # write the upload to disk and hash it in one pass, the file is never held in memory as a whole
+    try:
+        upload = await upload_spooler.spool(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
 
-    except KeyError:
-        raise HTTPException(status_code=404, detail=f"Course with id {course_id} not found")
+    try:
+        saved_file_hash = await io_executor.run(hash_db.get_file_hash, course_id=course_id, hash=upload.sha256)
+        if saved_file_hash is not None:
+            upload_spooler.discard(upload.path)
+            message = get_conflict_message(material_type=saved_file_hash["type"])
+            return JSONResponse(status_code=status.HTTP_409_CONFLICT, content={"detail": message})
+
+        active_job = await io_executor.run(job_store.find_active_job, course_id=course_id, file_hash=upload.sha256)
+        if active_job is not None:
+            upload_spooler.discard(upload.path)
+            return JSONResponse(status_code=status.HTTP_409_CONFLICT, content={"detail": "This file is already being processed", "job_id": active_job.job_id})
+
+        logger.info(f"Upload start course_id=%s material_type=%s size=%s bytes", course_id, material_type, upload.size)
+        job = await io_executor.run(ingestion_queue.submit, course_id=course_id, material_type=material_type, file_hash=upload.sha256, pdf_path=upload.path, filename=file.filename, replaces=replaces)
+        return job_to_dict(job)
+
+    except ExecutorSaturatedError:
+        upload_spooler.discard(upload.path)
+        raise
     except Exception:
+        upload_spooler.discard(upload.path)
         logger.exception("Upload failed course_id=%s material_type=%s", course_id, material_type)
         raise HTTPException(status_code=500, detail=f"Failed to save {material_type} for course {course_id}")
 
+# GET Endpoint: Returns the state and progress of an ingestion job
+@app.get("/jobs/{job_id}")
+async def getJob(job_id: str):
+    job = await io_executor.run(job_store.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job with ID {job_id} not found")
+    return job_to_dict(job)
+
+# DELETE Endpoint: Cancels a queued or running ingestion job
+@app.delete("/jobs/{job_id}")
+async def cancelJob(job_id: str):
+    job = await io_executor.run(job_store.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job with ID {job_id} not found")
+    if not await io_executor.run(ingestion_queue.cancel, job_id):
+        raise HTTPException(status_code=409, detail=f"Job with ID {job_id} has already finished")
+    return job_to_dict(await io_executor.run(job_store.get_job, job_id))
+
 """
 POST Endpoint for new exam generation.
 
@@ -176,37 +372,170 @@ Input:
     course_id... the ID of the course for which the new exam should be generated
     n_questions (Optional)... The number of questions the new test should have
     topics (Optional)... The topics the new exam should focus on (e.g. Reinforcement Learning, Transformers, ...)
+    seed (Optional)... The seed of a previously generated exam (see the `X-Exam-Seed` response header), to get the same exam again.
+                       This only works with the exam cache and as long as the exam is still cached, the LLM doesn't give the same exam twice.
+                       Without the exam cache there is no `X-Exam-Seed` header and `seed` is ignored
+
+If the exam cache is enabled, a cached exam is returned when there is one and the pool is refilled in the background.
 """
 @app.post("/courses/{course_id}/generate", status_code=200)
-async def generateExam(course_id: int, n_questions: int = Query(20, ge=1, le=40), topics: str | None = Query(None, min_length=3, max_length=50)):
+async def generateExam(
+    course_id: int,
+    n_questions: int = Query(20, ge=1, le=40),
+    topics: str | None = Query(None, min_length=3, max_length=50),
+    seed: int | None = Query(None, ge=0, le=2**31 - 1)
+):
 
     try:
-        # 1) Query Vector DB for relevant course material and old exam questions
-        relevant_course_material: list[CourseMaterial] = vector_db.retrieve_course_material(course_id=course_id, query=topics)
-        old_exam_questions: list[Question] = vector_db.retrieve_old_exam_questions(course_id=course_id, query=topics)
-        
-        # 2) Query LLM for new exam questions
-        course = course_service.get_course(course_id)
-        new_questions: list[Question] = question_generator.generate_questions(
-            course_id=course_id,
-            relevant_course_material=relevant_course_material,
-            old_questions=old_exam_questions,
-            n_new_questions=n_questions,
-            course_name=course.name
-        )
-
-        # 3) Generate a new exam PDF based on the generated questions
-        new_exam_pdf: bytes = pdf_generator.generate_pdf(questions=new_questions, course_id=course_id, course_name=course.name)
-        bytes_hash = hash_db.compute_bytes_hash(new_exam_pdf)
-        hash_db.add_file_hash(course_id=course_id, hash=bytes_hash, generated=True)
+        course = await io_executor.run(course_service.get_course, course_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail=f"Course with id {course_id} not found")
 
-        return Response(content=new_exam_pdf, media_type="application/pdf", headers={"Content-Disposition": f'attachment; filename="new_exam_course_{course_id}.pdf"'})
+    try:
+        # 1) Serve a cached exam if there is one
+        key = None
+        if exam_cache is not None:
+            key = await io_executor.run(get_exam_cache_key, course_id, topics, n_questions)
+            await io_executor.run(exam_cache.record_request, course_id, topics, n_questions)
+            variant = await io_executor.run(exam_cache.take_variant, key, seed)
+            if variant is not None:
+                logger.info("Serving cached exam course_id=%s topics=%s n_questions=%s seed=%s", course_id, topics, n_questions, variant.seed)
+                schedule_exam_cache_refill(course_id, course.name, topics, n_questions, key)
+                return exam_pdf_response(course_id, variant.pdf, variant.seed, cache_status="hit")
+
+        # 2) Generate a new exam
+        if seed is None:
+            seed = random.randrange(2**31)
+        new_questions, new_exam_pdf = await generate_exam_variant(course_id, course.name, topics, n_questions, seed)
+        if key is None:
+            return exam_pdf_response(course_id, new_exam_pdf, None, cache_status="disabled")
+
+        await io_executor.run(exam_cache.put_variant, make_exam_variant(key, course_id, topics, n_questions, seed, new_questions, new_exam_pdf, served_count=1))
+        # the refill starts only once the missed exam is generated, so that it doesn't compete with this request for the LLM
+        schedule_exam_cache_refill(course_id, course.name, topics, n_questions, key)
+        return exam_pdf_response(course_id, new_exam_pdf, seed, cache_status="miss")
     
-    except KeyError:
-        raise HTTPException(status_code=404, detail=f"Course with id {course_id} not found")
+    except ExecutorSaturatedError:
+        raise
     except Exception:
+        logger.exception("Generate failed course_id=%s", course_id)
         raise HTTPException(status_code=500, detail=f"Failed to generate new exam for course {course_id}")
 
+"""
+POST Endpoint: Fills the exam cache ahead of time (e.g. by a cron job during off-peak hours).
+
+Input:
+    course_id... the ID of the course
+    topics (Optional)... pre-warm only this topic, otherwise the `top` most requested (topics, n_questions) of the course are pre-warmed
+    n_questions (Optional)... used together with `topics`
+    variants (Optional)... how many unserved variants every pool should have afterwards
+    top (Optional)... how many of the most requested topics are pre-warmed
+"""
+@app.post("/courses/{course_id}/generate/prewarm", status_code=202)
+async def prewarmExamCache(
+    course_id: int,
+    topics: str | None = Query(None, min_length=3, max_length=50),
+    n_questions: int = Query(20, ge=1, le=40),
+    variants: int = Query(EXAM_CACHE_POOL_SIZE, ge=1, le=20),
+    top: int = Query(5, ge=1, le=50)
+):
+    if exam_cache is None:
+        raise HTTPException(status_code=409, detail="The exam cache is disabled, set EXAM_CACHE_ENABLED=true to use it")
+    try:
+        course = await io_executor.run(course_service.get_course, course_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail=f"Course with id {course_id} not found")
+
+    if topics is not None:
+        targets = [{"topics": topics, "n_questions": n_questions}]
+    else:
+        targets = await io_executor.run(exam_cache.popular_requests, course_id, top)
+
+    scheduled = []
+    for target in targets:
+        key = await io_executor.run(get_exam_cache_key, course_id, target["topics"], target["n_questions"])
+        missing = await io_executor.run(exam_cache.missing_variants, key, variants)
+        if missing:
+            schedule_exam_cache_refill(course_id, course.name, target["topics"], target["n_questions"], key, pool_size=variants)
+        scheduled.append({"topics": target["topics"], "n_questions": target["n_questions"], "missing_variants": missing})
+    return {"course_id": course_id, "scheduled": scheduled}
+
+# generates one exam (questions + PDF) and registers its hash, so that it can't be uploaded as course material
+async def generate_exam_variant(course_id: int, course_name: str, topics: str | None, n_questions: int, seed: int) -> tuple[list[Question], bytes]:
+    # 1) Query Vector DB for relevant course material and old exam questions
+    relevant_course_material: list[CourseMaterial] = await io_executor.run(vector_db.retrieve_course_material, course_id=course_id, query=topics)
+    old_exam_questions: list[Question] = await io_executor.run(vector_db.retrieve_old_exam_questions, course_id=course_id, query=topics)
+
+    # 2) Query LLM for new exam questions
+    new_questions: list[Question] = await question_generator.generate_questions_sharded(
+        course_id=course_id,
+        relevant_course_material=relevant_course_material,
+        old_questions=old_exam_questions,
+        n_new_questions=n_questions,
+        course_name=course_name,
+        embed_texts=vector_db.embed_texts,
+        seed=seed
+    )
+
+    # 3) Generate a new exam PDF based on the generated questions
+    new_exam_pdf: bytes = await cpu_executor.run(pdf_generator.generate_pdf, questions=new_questions, course_id=course_id, course_name=course_name)
+    bytes_hash = hash_db.compute_bytes_hash(new_exam_pdf)
+    await io_executor.run(hash_db.add_file_hash, course_id=course_id, hash=bytes_hash, generated=True)
+    return new_questions, new_exam_pdf
+
+def get_exam_cache_key(course_id: int, topics: str | None, n_questions: int) -> str:
+    return ExamCache.make_key(course_id, topics, n_questions, hash_db.get_material_version(course_id), question_generator.model)
+
+def make_exam_variant(key: str, course_id: int, topics: str | None, n_questions: int, seed: int, questions: list[Question], pdf: bytes, served_count: int = 0) -> ExamVariant:
+    return ExamVariant(
+        key=key,
+        course_id=course_id,
+        topics=ExamCache.normalize_topics(topics),
+        n_questions=n_questions,
+        material_version=hash_db.get_material_version(course_id),
+        model=question_generator.model,
+        seed=seed,
+        questions=[question_to_dict(q) for q in questions],
+        pdf=pdf,
+        served_count=served_count,
+    )
+
+# key -> running refill task, so that every pool is refilled by at most one task
+exam_cache_refills: dict[str, asyncio.Task] = {}
+exam_cache_refill_slots = asyncio.Semaphore(max(1, EXAM_CACHE_MAX_CONCURRENT_REFILLS))
+
+# generates variants in the background until the pool of `key` has `pool_size` unserved variants again
+def schedule_exam_cache_refill(course_id: int, course_name: str, topics: str | None, n_questions: int, key: str, pool_size: int | None = None) -> None:
+    if exam_cache is None or key in exam_cache_refills:
+        return
+
+    async def refill():
+        try:
+            async with exam_cache_refill_slots:
+                while await io_executor.run(exam_cache.missing_variants, key, pool_size) > 0:
+                    seed = random.randrange(2**31)
+                    questions, pdf = await generate_exam_variant(course_id, course_name, topics, n_questions, seed)
+                    await io_executor.run(exam_cache.put_variant, make_exam_variant(key, course_id, topics, n_questions, seed, questions, pdf))
+                    logger.info("Exam cache refilled course_id=%s topics=%s n_questions=%s seed=%s", course_id, topics, n_questions, seed)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Exam cache refill failed course_id=%s topics=%s n_questions=%s", course_id, topics, n_questions)
+        finally:
+            exam_cache_refills.pop(key, None)
+
+    exam_cache_refills[key] = asyncio.create_task(refill())
+
+# `seed` is None when the exam can't be requested again (the exam cache is disabled), then there is no X-Exam-Seed header
+def exam_pdf_response(course_id: int, pdf: bytes, seed: int | None, cache_status: str) -> Response:
+    headers = {
+        "Content-Disposition": f'attachment; filename="new_exam_course_{course_id}.pdf"',
+        "X-Exam-Cache": cache_status,
+    }
+    if seed is not None:
+        headers["X-Exam-Seed"] = str(seed)
+    return Response(content=pdf, media_type="application/pdf", headers=headers)
+
 
 """
 DEBUG Endpoint: Inspect stored course material for a course.
@@ -215,7 +544,7 @@ Returns raw text chunks and metadata to aid debugging ingestion/embedding.
 @app.get("/debug/courses/{course_id}/material")
 async def debug_get_course_material(course_id: int, query: str | None = Query(None), n: int = Query(5, ge=1, le=50)):
     try:
-        materials: list[CourseMaterial] = vector_db.retrieve_course_material(course_id=course_id, query=query, n=n)
+        materials: list[CourseMaterial] = await io_executor.run(vector_db.retrieve_course_material, course_id=course_id, query=query, n=n)
         return [
             {
                 "text": m.text,
@@ -223,6 +552,8 @@ async def debug_get_course_material(course_id: int, query: str | None = Query(No
             }
             for m in materials
         ]
+    except ExecutorSaturatedError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve course material for course {course_id}: {e}")
 
@@ -234,7 +565,7 @@ Returns question text, type, answer keys, and metadata to aid debugging ingestio
 @app.get("/debug/courses/{course_id}/exams")
 async def debug_get_exam_questions(course_id: int, query: str | None = Query(None), n: int = Query(5, ge=1, le=50)):
     try:
-        questions: list[Question] = vector_db.retrieve_old_exam_questions(course_id=course_id, query=query, n=n)
+        questions: list[Question] = await io_executor.run(vector_db.retrieve_old_exam_questions, course_id=course_id, query=query, n=n)
         return [
             {
                 "question": q.question,
@@ -244,6 +575,8 @@ async def debug_get_exam_questions(course_id: int, query: str | None = Query(Non
             }
             for q in questions
         ]
+    except ExecutorSaturatedError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve exam questions for course {course_id}: {e}")
 
@@ -258,19 +591,20 @@ async def debug_generate_exam(course_id: int, n_questions: int = Query(5, ge=1,
         logger.info("Debug generate start course_id=%s n_questions=%s topics=%s", course_id, n_questions, topics)
 
         # 1) Query Vector DB for relevant course material and old exam questions
-        relevant_course_material: list[CourseMaterial] = vector_db.retrieve_course_material(course_id=course_id, query=topics)
-        old_exam_questions: list[Question] = vector_db.retrieve_old_exam_questions(course_id=course_id, query=topics)
+        relevant_course_material: list[CourseMaterial] = await io_executor.run(vector_db.retrieve_course_material, course_id=course_id, query=topics)
+        old_exam_questions: list[Question] = await io_executor.run(vector_db.retrieve_old_exam_questions, course_id=course_id, query=topics)
 
         logger.info("Debug generate retrieved material=%s old_questions=%s", len(relevant_course_material), len(old_exam_questions))
 
         # 2) Query LLM for new exam questions
-        course = course_service.get_course(course_id)
-        new_questions: list[Question] = question_generator.generate_questions(
+        course = await io_executor.run(course_service.get_course, course_id)
+        new_questions: list[Question] = await question_generator.generate_questions_sharded(
             course_id=course_id,
             relevant_course_material=relevant_course_material,
             old_questions=old_exam_questions,
             n_new_questions=n_questions,
-            course_name=course.name
+            course_name=course.name,
+            embed_texts=vector_db.embed_texts
         )
 
         logger.info("Debug generate complete course_id=%s generated=%s", course_id, len(new_questions))
@@ -299,10 +633,78 @@ async def debug_generate_exam(course_id: int, n_questions: int = Query(5, ge=1,
 
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except ExecutorSaturatedError:
+        raise
     except Exception as e:
         logger.exception("Debug generate failed course_id=%s", course_id)
         raise HTTPException(status_code=500, detail=f"Failed to generate exam for course {course_id}: {e}")
     
+"""
+DEBUG Endpoint: Generate exam questions and stream them as Server-Sent Events.
+Every question is sent as a `question` event as soon as the LLM finished writing it,
+followed by a `done` event (or an `error` event if generation failed).
+"""
+@app.get("/debug/courses/{course_id}/generate/stream")
+async def debug_generate_exam_stream(course_id: int, n_questions: int = Query(5, ge=1, le=40), topics: str | None = Query(None, min_length=3, max_length=50)):
+    try:
+        logger.info("Debug generate stream start course_id=%s n_questions=%s topics=%s", course_id, n_questions, topics)
+
+        # 1) Query Vector DB for relevant course material and old exam questions
+        relevant_course_material: list[CourseMaterial] = await io_executor.run(vector_db.retrieve_course_material, course_id=course_id, query=topics)
+        old_exam_questions: list[Question] = await io_executor.run(vector_db.retrieve_old_exam_questions, course_id=course_id, query=topics)
+        course = await io_executor.run(course_service.get_course, course_id)
+
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ExecutorSaturatedError:
+        raise
+    except Exception as e:
+        logger.exception("Debug generate stream failed course_id=%s", course_id)
+        raise HTTPException(status_code=500, detail=f"Failed to generate exam for course {course_id}: {e}")
+
+    # 2) Stream new exam questions from the LLM
+    def events():
+        n_generated = 0
+        try:
+            for question in question_generator.stream_questions(
+                course_id=course_id,
+                relevant_course_material=relevant_course_material,
+                old_questions=old_exam_questions,
+                n_new_questions=n_questions,
+                course_name=course.name
+            ):
+                n_generated += 1
+                yield format_sse_event("question", question_to_dict(question))
+            yield format_sse_event("done", {"course_id": course_id, "n_requested": n_questions, "n_generated": n_generated})
+        except Exception as e:
+            logger.exception("Debug generate stream failed course_id=%s", course_id)
+            yield format_sse_event("error", {"detail": f"Failed to generate exam for course {course_id}: {e}", "n_generated": n_generated})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+"""
+GET Endpoint: Returns queue depth, concurrency limits and timing metrics of the background executors.
+"""
+@app.get("/metrics/executors")
+async def getExecutorMetrics():
+    return {"cpu": cpu_executor.stats(), "io": io_executor.stats(), "ingestion_queue": {"queued": ingestion_queue.queue_depth(), "workers": ingestion_queue.workers}, "openrouter": openrouter_client.stats(), "ocr_cache": file_processor.ocr_cache.stats() if file_processor.ocr_cache else None}
+
+def job_to_dict(job: IngestionJob) -> dict:
+    job_dict = asdict(job)
+    job_dict["status"] = job.status.value
+    return job_dict
+
+def question_to_dict(question: Question) -> dict:
+    return {
+        "question": question.question,
+        "question_type": question.question_type.value,
+        "answer_keys": question.answer_keys,
+        "metadata": question.metadata,
+    }
+
+def format_sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 def get_conflict_message(material_type: str):
     match material_type:
         case "exam": message = "This past exam has already been uploaded"
@@ -0,0 +1,30 @@
+from dataclasses import dataclass, field
+
+"""
+This class represents one cached variant of a generated exam (the generated questions and the rendered PDF).
+All variants with the same `key` were generated for the same course, topics, number of questions, course material and LLM,
+they only differ in their `seed`.
+"""
+@dataclass
+class ExamVariant:
+    key: str # see `ExamCache.make_key`
+
+    course_id: int
+
+    topics: str | None # the normalized topics
+
+    n_questions: int
+
+    material_version: str # see `HashDB.get_material_version`
+
+    model: str # the LLM that generated the questions
+
+    seed: int # the sampling seed, a variant can be requested again with it
+
+    questions: list[dict] = field(default_factory=list) # the generated questions, see `question_to_dict` in main.py
+
+    pdf: bytes = b""
+
+    served_count: int = 0 # how often this variant was handed out
+
+    created_at: float = 0.0
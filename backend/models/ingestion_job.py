@@ -0,0 +1,42 @@
+from dataclasses import dataclass, field
+from enum import Enum
+
+class JobStatus(Enum):
+    QUEUED = "queued" # waiting for a free ingestion worker
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+"""
+This class represents a background job that ingests one uploaded file (parse -> OCR -> embed -> index).
+"""
+@dataclass
+class IngestionJob:
+    job_id: str
+
+    course_id: int
+
+    material_type: str # the value of the `CourseMaterialType` of the uploaded file
+
+    filename: str | None
+
+    file_hash: str # the sha256 of the uploaded file, it is stored in the HashDB once the job completes
+
+    replaces: str | None = None # the material ID of the document that the file is a revised version of, None for new documents
+
+    status: JobStatus = JobStatus.QUEUED
+
+    stage: str | None = None # the current pipeline stage e.g. 'parse', 'ocr', 'embed', 'index'
+
+    progress: dict = field(default_factory=dict) # progress within the current stage e.g. {'current': 3, 'total': 40}
+
+    error: str | None = None
+
+    result: dict = field(default_factory=dict) # e.g. {'chunks': 120}
+
+    attempts: int = 0 # how often a worker started this job (> 1 if it was resumed after a restart)
+
+    created_at: float = 0.0
+
+    updated_at: float = 0.0
@@ -0,0 +1,183 @@
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+
+import numpy as np
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+# "GRPO vs. PPO (CS-101)" -> ["grpo", "vs", "ppo", "cs", "101"]
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall(text.casefold())
+
+
+@dataclass
+class _CourseIndex:
+    # the documents of one course in one collection: chunk ID -> (term frequencies, length)
+    documents: dict[str, tuple[dict[str, int], int]] = field(default_factory=dict)
+    # compiled on the first query after a change: row of every chunk, postings as arrays of (rows, term frequencies)
+    ids: list[str] | None = None
+    postings: dict[str, tuple[np.ndarray, np.ndarray]] | None = None
+    length_norms: np.ndarray | None = None
+
+
+"""
+This class is a small inverted index with BM25 scoring, one per course and collection, for exact-term matches
+(course codes, algorithm names like GRPO) that embeddings tend to miss.
+
+Chunks are added and removed at index time, together with the Vector DB. The term frequencies of every chunk are stored in a
+SQLite file (next to the Chroma data), a course is only loaded into memory when it is queried for the first time.
+In memory, the postings of every term are NumPy arrays, so scoring a query takes a few microseconds per matching chunk.
+"""
+class BM25Index:
+
+    def __init__(self, db_path: str = "data/chroma/bm25.sqlite3", k1: float = 1.2, b: float = 0.75):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.db_path = db_path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger(__name__)
+        self._courses: dict[tuple[str, int], _CourseIndex] = {}
+
+        self._connection = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS bm25_documents ("
+            "collection TEXT NOT NULL, course_id INTEGER NOT NULL, id TEXT NOT NULL, terms TEXT NOT NULL, length INTEGER NOT NULL, "
+            "PRIMARY KEY (collection, course_id, id))"
+        )
+        self._connection.commit()
+
+    # adds (or replaces) chunks of a course
+    def add(self, collection: str, course_id: int, ids: list[str], texts: list[str]) -> None:
+        rows = []
+        documents = {}
+        for id, text in zip(ids, texts):
+            tokens = tokenize(text)
+            terms = dict(Counter(tokens))
+            documents[id] = (terms, len(tokens))
+            rows.append((collection, int(course_id), id, json.dumps(terms, ensure_ascii=False), len(tokens)))
+
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO bm25_documents (collection, course_id, id, terms, length) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._connection.commit()
+            index = self._courses.get((collection, int(course_id)))
+            if index is not None:
+                index.documents.update(documents)
+                index.postings = None
+
+    # removes chunks by their IDs (of any course)
+    def remove(self, collection: str, ids: list[str]) -> None:
+        if not ids:
+            return
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                self._connection.execute(
+                    f"DELETE FROM bm25_documents WHERE collection = ? AND id IN ({','.join('?' * len(batch))})", (collection, *batch)
+                )
+            self._connection.commit()
+            for (name, _), index in self._courses.items():
+                if name != collection:
+                    continue
+                removed = [index.documents.pop(id, None) for id in ids]
+                if any(document is not None for document in removed):
+                    index.postings = None
+
+    def has_course(self, collection: str, course_id: int) -> bool:
+        with self._lock:
+            index = self._courses.get((collection, int(course_id)))
+            if index is not None:
+                return bool(index.documents)
+            row = self._connection.execute(
+                "SELECT 1 FROM bm25_documents WHERE collection = ? AND course_id = ? LIMIT 1", (collection, int(course_id))
+            ).fetchone()
+            return row is not None
+
+    def remove_course(self, collection: str, course_id: int) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM bm25_documents WHERE collection = ? AND course_id = ?", (collection, int(course_id)))
+            self._connection.commit()
+            self._courses.pop((collection, int(course_id)), None)
+
+    def remove_collection(self, collection: str) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM bm25_documents WHERE collection = ?", (collection,))
+            self._connection.commit()
+            for key in [key for key in self._courses if key[0] == collection]:
+                del self._courses[key]
+
+    """
+    Ranks the chunks of a course by their BM25 score for the query.
+
+    Output:
+        list[tuple[str, float]]... (chunk ID, score) of the best `n` chunks that contain at least one query term, best first
+    """
+    def search(self, collection: str, course_id: int, query: str, n: int) -> list[tuple[str, float]]:
+        terms = set(tokenize(query))
+        if not terms or n <= 0:
+            return []
+
+        with self._lock:
+            index = self._compiled(collection, int(course_id))
+            if not index.ids:
+                return []
+            scores = np.zeros(len(index.ids), dtype=np.float32)
+            for term in terms:
+                posting = index.postings.get(term)
+                if posting is None:
+                    continue
+                rows, frequencies = posting
+                idf = math.log(1.0 + (len(index.ids) - len(rows) + 0.5) / (len(rows) + 0.5))
+                scores[rows] += idf * frequencies * (self.k1 + 1) / (frequencies + index.length_norms[rows])
+            ids = index.ids
+
+        matching = np.flatnonzero(scores > 0)
+        if len(matching) > n:
+            matching = matching[np.argpartition(-scores[matching], n - 1)[:n]]
+        best = matching[np.argsort(-scores[matching], kind="stable")]
+        return [(ids[row], float(scores[row])) for row in best]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    # must be called while holding self._lock
+    def _compiled(self, collection: str, course_id: int) -> _CourseIndex:
+        index = self._courses.get((collection, course_id))
+        if index is None:
+            index = _CourseIndex()
+            for id, terms, length in self._connection.execute(
+                "SELECT id, terms, length FROM bm25_documents WHERE collection = ? AND course_id = ?", (collection, course_id)
+            ):
+                index.documents[id] = (json.loads(terms), length)
+            self._courses[(collection, course_id)] = index
+
+        if index.postings is None:
+            index.ids = list(index.documents)
+            lengths = np.array([length for _, length in index.documents.values()], dtype=np.float32)
+            average_length = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+            index.length_norms = self.k1 * (1 - self.b + self.b * lengths / average_length)
+            postings: dict[str, tuple[list[int], list[int]]] = {}
+            for row, (terms, _) in enumerate(index.documents.values()):
+                for term, frequency in terms.items():
+                    rows, frequencies = postings.setdefault(term, ([], []))
+                    rows.append(row)
+                    frequencies.append(frequency)
+            index.postings = {
+                term: (np.array(rows, dtype=np.int64), np.array(frequencies, dtype=np.float32)) for term, (rows, frequencies) in postings.items()
+            }
+        return index
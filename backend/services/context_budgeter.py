@@ -0,0 +1,189 @@
+import logging
+import math
+from dataclasses import dataclass, field, replace
+
+from models.course_material import CourseMaterial
+from models.question import Question
+
+try:  # exact token counts need the optional `tiktoken` package
+    import tiktoken
+except Exception:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# metadata that only matters for ingestion/retrieval, it just costs tokens in the prompt
+DEFAULT_DROPPED_METADATA_KEYS = frozenset({
+    "course_id",
+    "chunk_ind",
+    "char_len",
+    "page_start",
+    "page_end",
+    "has_images",
+    "has_choices",
+    "ocr_used",
+    "ocr_language",
+    "ocr_languages_used",
+    "ocr_decision",
+    "image_coverage",
+    "question_number",
+    "question_type",  # already part of the prompt as "Type: ..."
+    "relevancy_score",
+    "file_hash",
+    "material_id",
+})
+
+
+@dataclass
+class PackedContext:
+    course_material: list[CourseMaterial] = field(default_factory=list)
+    old_questions: list[Question] = field(default_factory=list)
+    tokens_before: int = 0 # tokens of all given items (with their full metadata)
+    tokens_after: int = 0 # tokens of the packed items
+    n_dropped: int = 0 # items that were duplicates or didn't fit into the budget
+
+
+"""
+This class decides which course material and example questions end up in the prompt of the QuestionGenerator.
+
+It removes metadata that is useless for the LLM, cuts the text that two course material chunks share
+because of the chunk overlap, and then packs the most relevant items into a token budget.
+Tokens are counted with tiktoken if it's installed, otherwise they are estimated (~4 characters per token).
+"""
+class ContextBudgeter:
+
+    # max_tokens... token budget for course material + example questions together
+    # question_share... part of the budget reserved for example questions, material can use whatever they leave over
+    # min_overlap/max_overlap... shared text between two chunks shorter/longer than this isn't treated as chunk overlap
+    def __init__(
+        self,
+        max_tokens: int = 6000,
+        question_share: float = 0.3,
+        dropped_metadata_keys: frozenset[str] = DEFAULT_DROPPED_METADATA_KEYS,
+        min_overlap: int = 30,
+        max_overlap: int = 400,
+        encoding_name: str = "cl100k_base",
+    ):
+        self.max_tokens = max(0, max_tokens)
+        self.question_share = min(1.0, max(0.0, question_share))
+        self.dropped_metadata_keys = dropped_metadata_keys
+        self.min_overlap = max(1, min_overlap)
+        self.max_overlap = max(self.min_overlap, max_overlap)
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding_name)
+            except Exception as e:  # e.g. the encoding can't be downloaded
+                logger.warning(f"Could not load tiktoken encoding {encoding_name}, estimating token counts instead: {e}")
+
+    def count_tokens(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return math.ceil(len(text) / 4)
+
+    def clean_metadata(self, metadata: dict | None) -> dict:
+        if not metadata:
+            return {}
+        return {
+            key: value for key, value in metadata.items()
+            if key not in self.dropped_metadata_keys and value not in (None, "", "unknown")
+        }
+
+    def format_material(self, index: int, material: CourseMaterial) -> str:
+        text = f"\n--- Course Material {index} ---\n{material.text}\n"
+        if material.metadata:
+            text += f"Metadata: {material.metadata}\n"
+        return text
+
+    def format_question(self, index: int, question: Question) -> str:
+        text = f"\n--- Example Question {index} ---\n"
+        text += f"Type: {question.question_type.value}\n"
+        text += f"Question: {question.question}\n"
+        if question.answer_keys:
+            text += f"Answer Options: {', '.join(question.answer_keys)}\n"
+        if question.metadata:
+            text += f"Metadata: {question.metadata}\n"
+        return text
+
+    """
+    Selects the course material and example questions for a prompt.
+
+    Input:
+        course_material... retrieved course material, ideally sorted by relevance
+        old_questions... retrieved old exam questions, ideally sorted by relevance
+
+    Output:
+        PackedContext... cleaned copies of the items that fit into the budget (the inputs aren't modified), in order of relevance
+    """
+    def pack(self, course_material: list[CourseMaterial], old_questions: list[Question]) -> PackedContext:
+        tokens_before = sum(self.count_tokens(self.format_material(i, m)) for i, m in enumerate(course_material, 1))
+        tokens_before += sum(self.count_tokens(self.format_question(i, q)) for i, q in enumerate(old_questions, 1))
+
+        questions = [replace(q, metadata=self.clean_metadata(q.metadata)) for q in self._by_relevance(old_questions)]
+        questions, question_tokens = self._fill(
+            questions, int(self.max_tokens * self.question_share), self.format_question
+        )
+
+        materials = self._remove_overlaps(self._by_relevance(course_material))
+        materials = [replace(m, metadata=self.clean_metadata(m.metadata)) for m in materials]
+        materials, material_tokens = self._fill(
+            materials, self.max_tokens - question_tokens, self.format_material
+        )
+
+        return PackedContext(
+            course_material=materials,
+            old_questions=questions,
+            tokens_before=tokens_before,
+            tokens_after=question_tokens + material_tokens,
+            n_dropped=len(old_questions) - len(questions) + len(course_material) - len(materials),
+        )
+
+    def _by_relevance(self, items: list) -> list:
+        # stable sort, so items without a score keep the order of the retrieval
+        return sorted(items, key=lambda item: -(item.metadata or {}).get("relevancy_score", 0.0))
+
+    def _fill(self, items: list, budget: int, format_item) -> tuple[list, int]:
+        """Greedily takes items in the given order as long as they fit, items that are too large are skipped."""
+        selected, used = [], 0
+        for item in items:
+            tokens = self.count_tokens(format_item(len(selected) + 1, item))
+            if used + tokens > budget:
+                continue
+            selected.append(item)
+            used += tokens
+        return selected, used
+
+    def _remove_overlaps(self, materials: list[CourseMaterial]) -> list[CourseMaterial]:
+        """Drops chunks that are contained in another chunk and cuts text that a chunk shares with a chunk before it."""
+        kept: list[CourseMaterial] = []
+        for material in materials:
+            text = material.text.strip()
+            if not text or any(text in other.text for other in kept):
+                continue
+            for other in kept:
+                # `other` is the chunk before `material`: the start of `material` repeats the end of `other`
+                text = text[self._overlap(other.text, text):]
+                # `other` is the chunk after `material`: the end of `material` repeats the start of `other`
+                cut = self._overlap(text, other.text)
+                if cut:
+                    text = text[:-cut]
+            text = text.strip()
+            if text:
+                kept.append(replace(material, text=text))
+        return kept
+
+    def _overlap(self, first: str, second: str) -> int:
+        """Length of the longest suffix of `first` that is a prefix of `second` (0 if it's shorter than min_overlap)."""
+        longest = min(len(first), len(second), self.max_overlap)
+        if longest < self.min_overlap:
+            return 0
+        probe = second[:self.min_overlap]
+        tail_start = len(first) - longest
+        position = first.find(probe, tail_start)
+        while position != -1:
+            if second.startswith(first[position:]):
+                return len(first) - position
+            position = first.find(probe, position + 1)
+        return 0
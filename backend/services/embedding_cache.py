@@ -0,0 +1,227 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+"""
+This class is a persistent, content-addressed cache for embeddings.
+
+Embeddings are keyed by (model name, sha256 of the normalized text) and stored as float32 blobs in a SQLite file.
+An in-memory LRU sits on top of it, so frequently used embeddings don't even touch the disk.
+"""
+class EmbeddingCache:
+
+    def __init__(self, db_path: str = "data/embedding_cache.sqlite3", max_memory_items: int = 5000):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.db_path = db_path
+        self.max_memory_items = max(0, max_memory_items)
+        self._memory: OrderedDict[tuple[str, str], np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger(__name__)
+
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, text_hash))"
+            )
+            self._connection.commit()
+
+        # counters since startup
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def text_key(text: str) -> str:
+        normalized = unicodedata.normalize("NFC", text).strip()
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    """
+    Looks up the embeddings of `texts`.
+
+    Output:
+        list[np.ndarray | None]... the cached embedding for every text, None for cache misses
+    """
+    def get_many(self, model: str, texts: list[str]) -> list[np.ndarray | None]:
+        keys = [self.text_key(text) for text in texts]
+        results: list[np.ndarray | None] = [None] * len(texts)
+        missing_from_memory: dict[str, list[int]] = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get((model, key))
+                if vector is not None:
+                    self._memory.move_to_end((model, key))
+                    results[i] = vector
+                    self.memory_hits += 1
+                else:
+                    missing_from_memory.setdefault(key, []).append(i)
+
+            if missing_from_memory:
+                hashes = list(missing_from_memory)
+                for start in range(0, len(hashes), 500):  # stay below SQLite's max number of query parameters
+                    batch = hashes[start:start + 500]
+                    rows = self._connection.execute(
+                        f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                        [model, *batch],
+                    ).fetchall()
+                    for text_hash, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        self._remember(model, text_hash, vector)
+                        for i in missing_from_memory[text_hash]:
+                            results[i] = vector
+                            self.disk_hits += 1
+
+            self.misses += sum(1 for vector in results if vector is None)
+        return results
+
+    def put_many(self, model: str, texts: list[str], vectors: list) -> None:
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self.text_key(text)
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(model, key, vector)
+                rows.append((model, key, vector.tobytes()))
+            self._connection.executemany("INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)", rows)
+            self._connection.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_items": len(self._memory),
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    # must be called while holding self._lock
+    def _remember(self, model: str, key: str, vector: np.ndarray) -> None:
+        if self.max_memory_items == 0:
+            return
+        self._memory[(model, key)] = vector
+        self._memory.move_to_end((model, key))
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+
+"""
+This class wraps an embedding function (e.g. the OpenRouter `text-embedding-3-small` one) with an `EmbeddingCache`.
+Only texts that are not in the cache are sent to the wrapped function.
+
+For Chroma it is an embedding function of its own ("cached"), its config names the wrapped function and its config.
+It can't really be rebuilt from that config (it needs the cache and e.g. the shared OpenRouter client), so the function
+Chroma rebuilds (to read the distance space) fails when it is called; the VectorDB always passes the real one to its collections.
+"""
+class CachedEmbeddingFunction(EmbeddingFunction[Documents]):
+
+    def __init__(self, embedding_function, cache: EmbeddingCache | None, model_name: str):
+        self.embedding_function = embedding_function
+        self.cache = cache
+        self.model_name = model_name
+        self._logger = logging.getLogger(__name__)
+        # some models embed queries differently than documents, their query embeddings get their own cache namespace
+        self._separate_query_embeddings = "embed_query" in type(embedding_function).__dict__
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return self._embed(list(input), self.model_name, self.embedding_function)
+
+    def embed_query(self, input: Documents) -> Embeddings:
+        if self._separate_query_embeddings:
+            return self._embed(list(input), f"{self.model_name}#query", self.embedding_function.embed_query)
+        return self._embed(list(input), self.model_name, self.embedding_function)
+
+    def _embed(self, texts: list[str], model: str, embed) -> Embeddings:
+        if self.cache is None:  # rebuilt by Chroma from the config, see build_from_config
+            return embed(texts)
+        vectors = self.cache.get_many(model, texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+
+        if missing:
+            # embed each distinct missing text only once
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            embedded = dict(zip(unique_texts, embed(unique_texts)))
+            self.cache.put_many(model, unique_texts, [embedded[text] for text in unique_texts])
+            for i in missing:
+                vectors[i] = np.asarray(embedded[texts[i]], dtype=np.float32)
+
+        stats = self.cache.stats()
+        self._logger.info(
+            "Embedding cache model=%s texts=%s hits=%s misses=%s (total memory_hits=%s disk_hits=%s misses=%s)",
+            model,
+            len(texts),
+            len(texts) - len(missing),
+            len(missing),
+            stats["memory_hits"],
+            stats["disk_hits"],
+            stats["misses"],
+        )
+        return vectors
+
+    # Chroma calls this on the class (to register it), so it can't return the name of the wrapped function
+    @staticmethod
+    def name() -> str:
+        return "cached"
+
+    def get_config(self) -> dict[str, Any]:
+        return {
+            "model_name": self.model_name,
+            "embedding_function": self.embedding_function.name(),
+            "config": self.embedding_function.get_config(),
+        }
+
+    # Chroma rebuilds the function of a collection on every write just to read its space, so this must not load models or raise
+    @staticmethod
+    def build_from_config(config: dict[str, Any]) -> "CachedEmbeddingFunction":
+        return CachedEmbeddingFunction(_UnavailableEmbeddingFunction(config), cache=None, model_name=config.get("model_name", ""))
+
+    def is_legacy(self) -> bool:
+        return self.embedding_function.is_legacy()
+
+    def default_space(self):
+        return self.embedding_function.default_space()
+
+    def supported_spaces(self):
+        return self.embedding_function.supported_spaces()
+
+
+# stands in for the wrapped function of a CachedEmbeddingFunction that Chroma rebuilt from its config
+class _UnavailableEmbeddingFunction:
+
+    def __init__(self, config: dict[str, Any]):
+        self.config = config
+
+    def __call__(self, input: Documents) -> Embeddings:
+        raise ValueError("CachedEmbeddingFunction needs an EmbeddingCache and the wrapped embedding function, pass it to the collection explicitly")
+
+    def name(self) -> str:
+        return self.config.get("embedding_function", "unknown")
+
+    def get_config(self) -> dict[str, Any]:
+        return self.config.get("config", {})
+
+    def is_legacy(self) -> bool:
+        return False
+
+    def default_space(self) -> str:
+        return "cosine"
+
+    def supported_spaces(self) -> list[str]:
+        return ["cosine", "l2", "ip"]
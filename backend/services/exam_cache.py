@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import time
+from pymongo import ASCENDING, DESCENDING, MongoClient, ReturnDocument, errors
+from models.exam_variant import ExamVariant
+
+"""
+This class caches generated exams in Mongo, so that `POST /courses/{course_id}/generate` doesn't need an LLM call
+and a PDF render every time.
+
+For every (course, topics, n_questions, material version, model) there is a pool of variants that only differ in their seed.
+A variant is handed out at most `max_serves` times (so students still get different exams), after that it is only
+returned when it is requested by its seed again (deterministic replay). Variants of an outdated material version are never
+returned, since the key changes whenever course material is uploaded.
+
+It also counts how often every topic is requested, so that the pools of popular topics can be filled ahead of time.
+"""
+class ExamCache:
+
+    def __init__(self, mongo_url: str | None = None, client: MongoClient | None = None, pool_size: int = 3, max_serves: int = 1):
+        mongo_url = mongo_url or os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+        self.client = client or MongoClient(mongo_url)
+        self.db = self.client["hash_db"]
+        self.collection = self.db["exam_cache"]
+        self.requests = self.db["exam_cache_requests"]
+        self.pool_size = max(1, pool_size) # how many unserved variants should be ready per key
+        self.max_serves = max(1, max_serves)
+        try:
+            self.collection.create_index([("key", ASCENDING), ("seed", ASCENDING)], unique=True)
+            self.collection.create_index([("key", ASCENDING), ("served_count", ASCENDING)])
+            self.requests.create_index([("course_id", ASCENDING), ("count", DESCENDING)])
+        except errors.PyMongoError:
+            # best-effort, lookups still work without the index
+            pass
+
+    # e.g. " Transformers,  PPO " -> "ppo, transformers"
+    @staticmethod
+    def normalize_topics(topics: str | None) -> str | None:
+        if not topics:
+            return None
+        parts = sorted({" ".join(part.split()).casefold() for part in topics.split(",")} - {""})
+        return ", ".join(parts) or None
+
+    @staticmethod
+    def make_key(course_id: int, topics: str | None, n_questions: int, material_version: str, model: str) -> str:
+        raw = json.dumps([course_id, ExamCache.normalize_topics(topics), n_questions, material_version, model])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    """
+    Hands out a cached variant and counts it as served.
+
+    Input:
+        key... see `make_key`
+        seed (Optional)... if given, exactly the variant with this seed is returned (no matter how often it was served)
+
+    Output:
+        ExamVariant | None... the least served variant that can still be handed out, None if the pool is empty
+    """
+    def take_variant(self, key: str, seed: int | None = None) -> ExamVariant | None:
+        if seed is not None:
+            query = {"key": key, "seed": seed}
+        else:
+            query = {"key": key, "served_count": {"$lt": self.max_serves}}
+        document = self.collection.find_one_and_update(
+            query,
+            {"$inc": {"served_count": 1}},
+            sort=[("served_count", ASCENDING), ("created_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+        return self._from_document(document) if document else None
+
+    # stores a new variant. Variants of the same course & topics but an older material version are removed
+    def put_variant(self, variant: ExamVariant) -> None:
+        variant.created_at = variant.created_at or time.time()
+        document = self._to_document(variant)
+        self.collection.replace_one({"key": variant.key, "seed": variant.seed}, document, upsert=True)
+        self.collection.delete_many({
+            "course_id": variant.course_id,
+            "material_version": {"$ne": variant.material_version},
+        })
+
+    # number of variants that can still be handed out without a seed
+    def count_available(self, key: str) -> int:
+        return self.collection.count_documents({"key": key, "served_count": {"$lt": self.max_serves}})
+
+    # how many variants have to be generated until the pool of `key` is full again
+    def missing_variants(self, key: str, pool_size: int | None = None) -> int:
+        return max(0, (pool_size or self.pool_size) - self.count_available(key))
+
+    def record_request(self, course_id: int, topics: str | None, n_questions: int) -> None:
+        self.requests.update_one(
+            {"course_id": course_id, "topics": self.normalize_topics(topics), "n_questions": n_questions},
+            {"$inc": {"count": 1}, "$set": {"last_requested_at": time.time()}},
+            upsert=True,
+        )
+
+    # returns the most requested (topics, n_questions) of a course, e.g. [{"topics": "ppo", "n_questions": 20, "count": 12}]
+    def popular_requests(self, course_id: int, limit: int = 5) -> list[dict]:
+        documents = self.requests.find({"course_id": course_id}, {"_id": 0}).sort("count", DESCENDING).limit(limit)
+        return [{"topics": d.get("topics"), "n_questions": d["n_questions"], "count": d["count"]} for d in documents]
+
+    def invalidate_course(self, course_id: int) -> int:
+        return self.collection.delete_many({"course_id": course_id}).deleted_count
+
+    def _to_document(self, variant: ExamVariant) -> dict:
+        return dict(variant.__dict__)
+
+    def _from_document(self, document: dict) -> ExamVariant:
+        fields = {key: value for key, value in document.items() if key in ExamVariant.__dataclass_fields__}
+        fields["pdf"] = bytes(fields.get("pdf") or b"")
+        return ExamVariant(**fields)
@@ -1,22 +1,25 @@
 from __future__ import annotations
 
+import hashlib
 import os
 import re
+import tempfile
 import time
-from typing import Any, BinaryIO, Iterable
-from io import BytesIO
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Callable, Iterable
 import logging
 
-from pypdf import PdfReader
+import numpy as np
 
 try:  # Optional OCR dependencies
     import pytesseract
-    from PIL import Image, ImageOps, ImageFilter
+    from PIL import Image
 except Exception:  # pragma: no cover - optional dependency
     pytesseract = None
     Image = None
-    ImageOps = None
-    ImageFilter = None
 
 try:
     import fitz  # PyMuPDF
@@ -27,6 +30,55 @@ from models.course_material_type import CourseMaterialType
 from models.exam_question_chunk import ExamQuestionChunk
 from models.course_material_chunk import CourseMaterialChunk
 from models.question_type import QuestionType
+from services.ocr_cache import OcrCache, OcrResult
+from services.ocr_engines import create_ocr_engine
+from services.ocr_preprocessing import pixmap_to_gray, prepare_for_ocr
+from services.pdf_backends import PdfDocument, open_pdf, resolve_pdf_backend
+
+# bump this whenever the rendering or preprocessing of pages changes, so old OCR results are no longer served from the cache
+OCR_PIPELINE_VERSION = 3
+
+
+class ProcessingCancelled(Exception):
+    """Raised when chunk_and_enrich is cancelled via its cancel_event."""
+
+
+# progress_callback(stage, current, total), e.g. ("ocr", 3, 40)
+ProgressCallback = Callable[[str, int, int], None]
+
+
+@dataclass
+class _PageExtraction:
+    text: str # native text, with OCR text appended if OCR ran
+    has_images: bool
+    ocr_text: str = ""
+    ocr_lang: str | None = None
+    ocr_decision: str = "" # result of the page triage e.g. "ocr:no_text_layer", "skip:text_layer"
+    image_coverage: float = 0.0 # fraction of the page covered by images
+
+
+# Orientation and language of the scanned pages of a document, settled once on a few sample pages (see FileProcessor._build_ocr_profile)
+@dataclass
+class _OcrProfile:
+    rotation: int
+    lang: str
+    sampled_pages: int
+
+
+# State of an OCR worker process (see FileProcessor._run_ocr_pool)
+_worker_processor: "FileProcessor | None" = None
+_worker_doc: Any = None
+
+
+def _init_ocr_worker(processor: "FileProcessor", pdf_path: str) -> None:
+    global _worker_processor, _worker_doc
+    _worker_processor = processor
+    _worker_doc = fitz.open(pdf_path)
+
+
+def _ocr_page_in_worker(page_index: int, native_text: str, profile: _OcrProfile | None) -> OcrResult:
+    return _worker_processor._extract_ocr_from_page(_worker_doc, page_index, native_text=native_text, profile=profile)
+
 
 """
 This class extracts text from PDFs and enriches it with metadata.
@@ -45,6 +97,19 @@ class FileProcessor:
         ocr_log_text: bool = False,
         ocr_dpi: int = 300,
         ocr_lang: str = "eng+deu",
+        ocr_workers: int = 1,
+        pdf_backend: str = "pymupdf",
+        ocr_triage: bool = True,
+        triage_min_image_coverage: float = 0.15,
+        triage_dense_text_chars: int = 600,
+        triage_probe_dpi: int = 72,
+        triage_probe_min_new_words: int = 5,
+        triage_probe_text_pages: bool = False,
+        ocr_mode: str = "page",
+        ocr_cache: OcrCache | None = None,
+        ocr_engine: str = "pytesseract",
+        ocr_profile_sample_pages: int = 3,
+        ocr_recheck_confidence: float = 60.0,
     ) -> None:
         """Configure chunk sizes.
 
@@ -52,23 +117,45 @@ class FileProcessor:
             text_chunk_size: Maximum characters per course-material chunk.
             text_chunk_overlap: Overlap between consecutive chunks to preserve context.
             use_ocr: Enable rendered-page OCR via PyMuPDF + Tesseract if available.
-            max_images_per_page: Legacy cap for image-based OCR (kept for backward compatibility).
+            max_images_per_page: In ocr_mode "regions", at most this many images (the largest ones) are OCR'd per page (0 = no limit).
             min_text_len_for_ocr: If extracted text already meets this length, skip OCR to save time.
             ocr_max_dim: Resize images so longest edge is at most this many pixels (faster OCR).
             ocr_min_dim: If images are very small, upscale so the longest edge is at least this many pixels.
             ocr_psm: Tesseract page segmentation mode to use (string for pytesseract config).
             ocr_log_text: If True, log extracted OCR text per page (can be verbose).
             ocr_lang: Preferred Tesseract languages (comma/plus-separated, e.g., "eng", "deu", or "eng+deu").
+            ocr_workers: Number of worker processes that OCR pages in parallel (1 = OCR in-process, one page after another).
+            pdf_backend: Library that parses the PDF: "pymupdf" (one document for text, images and rendering) or "pypdf".
+            ocr_triage: Decide cheaply per page whether OCR can add anything (see _triage_page). Pages without a usable
+                text layer whose images cover little of the page are only OCR'd if a thumbnail probe finds text on them;
+                if False, every page without a usable text layer is OCR'd.
+            triage_min_image_coverage: Pages whose images cover at least this much of the page are OCR'd without a probe
+                (no usable text layer) or probed (usable text layer, with triage_probe_text_pages).
+            triage_dense_text_chars: Pages with at least this much native text are not probed unless images cover half of the page.
+            triage_probe_dpi: Resolution of the thumbnail that is OCR'd to check whether a full OCR pass would find new text.
+            triage_probe_min_new_words: Words the probe has to find that aren't in the text layer, for the page to be OCR'd.
+            triage_probe_text_pages: Also probe image-heavy pages that have a usable text layer, and OCR them if the probe
+                finds words the text layer doesn't have (text in screenshots/diagrams). This adds OCR work on born-digital
+                decks, so it is off by default; ocr_mode "regions" always does it, reading those images is what it is for.
+            ocr_mode: "page" renders and OCRs the whole page. "regions" only OCRs the images of pages that have a usable
+                text layer (at their native resolution, in reading order); pages without one are still OCR'd as a whole.
+            ocr_cache: Persistent cache of OCR results, checked before a page is rendered (None = no caching).
+            ocr_engine: "pytesseract" (one tesseract process per call) or "tesserocr" (tesseract stays loaded in-process, if installed).
+            ocr_profile_sample_pages: Orientation and language of scanned pages are detected on this many pages per document
+                and reused for the others (0 = detect them on every page).
+            ocr_recheck_confidence: Pages whose mean word confidence is below this get their own orientation/language detection.
         """
         if text_chunk_size <= 0:
             raise ValueError("text_chunk_size must be positive")
         if text_chunk_overlap < 0 or text_chunk_overlap >= text_chunk_size:
             raise ValueError("text_chunk_overlap must be non-negative and smaller than text_chunk_size")
+        if ocr_mode not in ("page", "regions"):
+            raise ValueError("ocr_mode must be 'page' or 'regions'")
 
         self.text_chunk_size = text_chunk_size
         self.text_chunk_overlap = text_chunk_overlap
         self.use_ocr = use_ocr and pytesseract is not None and Image is not None and fitz is not None
-        self.max_images_per_page = max_images_per_page
+        self.max_images_per_page = max(0, max_images_per_page)
         self.min_text_len_for_ocr = max(min_text_len_for_ocr, 0)
         self.ocr_max_dim = max(ocr_max_dim, 100)
         self.ocr_min_dim = max(ocr_min_dim, 32)
@@ -76,6 +163,19 @@ class FileProcessor:
         self.ocr_log_text = ocr_log_text
         self.ocr_dpi = max(72, ocr_dpi)
         self.ocr_lang = ocr_lang or "eng"
+        self.ocr_workers = max(1, ocr_workers)
+        self.pdf_backend = resolve_pdf_backend(pdf_backend)
+        self.ocr_triage = ocr_triage
+        self.triage_min_image_coverage = triage_min_image_coverage
+        self.triage_dense_text_chars = max(0, triage_dense_text_chars)
+        self.triage_probe_dpi = max(24, triage_probe_dpi)
+        self.triage_probe_min_new_words = max(1, triage_probe_min_new_words)
+        self.triage_probe_text_pages = triage_probe_text_pages or ocr_mode == "regions"
+        self.ocr_mode = ocr_mode
+        self.ocr_cache = ocr_cache
+        self.ocr_engine = create_ocr_engine(ocr_engine)
+        self.ocr_profile_sample_pages = max(0, ocr_profile_sample_pages)
+        self.ocr_recheck_confidence = ocr_recheck_confidence
         self._ocr_checked = False
         self._logger = logging.getLogger(__name__)
 
@@ -97,10 +197,10 @@ class FileProcessor:
             return False
 
         try:
-            version = pytesseract.get_tesseract_version()
-            self._logger.info("Tesseract version detected: %s", version)
+            version = self.ocr_engine.version()
+            self._logger.info("Tesseract version detected: %s engine=%s", version, self.ocr_engine.name)
             try:
-                langs = pytesseract.get_languages(config="")
+                langs = self.ocr_engine.languages()
                 self._logger.info("Tesseract languages available: %s", langs)
                 for required in ("eng", "deu"):
                     if required not in langs:
@@ -135,9 +235,13 @@ class FileProcessor:
 
 
     Input:
-        pdf_file... The uploaded PDF file
+        pdf_file... The uploaded PDF, either as a file object or as a path. A path is opened without reading the whole file into memory
         material_type... The type of the PDF file (Notes, Slides, Exam, ...)
         course_id... The ID of the course that the material belong to
+        cancel_event (Optional)... A `threading.Event`; once it is set, processing stops and `ProcessingCancelled` is raised
+        progress_callback (Optional)... Called as progress_callback(stage, current, total) for the 'parse' and 'ocr' stages
+        material_key (Optional)... Identifies the uploaded document within the course (e.g. its filename). Chunk IDs are derived from it
+                                   and the chunk text, so a revised version of the document keeps the IDs of its unchanged chunks
 
     Output:
         A tuple with the following entries:
@@ -147,49 +251,54 @@ class FileProcessor:
     """
     def chunk_and_enrich(
         self,
-        pdf_file: BinaryIO,
+        pdf_file: BinaryIO | str | os.PathLike,
         material_type: CourseMaterialType,
         course_id: int,
+        cancel_event: Any | None = None,
+        progress_callback: ProgressCallback | None = None,
+        material_key: str | None = None,
     ) -> tuple[list[dict], list[CourseMaterialChunk] | list[ExamQuestionChunk]]:
-        pdf_file.seek(0)
-        pdf_bytes = pdf_file.read()
-        reader = PdfReader(BytesIO(pdf_bytes))
-
-        render_doc = None
-        if self._ensure_ocr_ready():
-            try:
-                render_doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-            except Exception:
-                self._logger.exception("Failed to open PDF with PyMuPDF; disabling OCR for this file")
-                render_doc = None
+        if isinstance(pdf_file, (str, os.PathLike)):
+            source = os.fspath(pdf_file)
+        else:
+            pdf_file.seek(0)
+            source = pdf_file.read()
+        try:
+            document = open_pdf(source, self.pdf_backend)
+        except Exception as e:
+            raise ValueError("Provided PDF is empty or unreadable") from e
 
-        if len(reader.pages) == 0:
-            raise ValueError("Provided PDF is empty or unreadable")
+        try:
+            if document.page_count == 0:
+                raise ValueError("Provided PDF is empty or unreadable")
 
-        self._logger.info(
-            "Chunking start material_type=%s course_id=%s pages=%s use_ocr=%s max_images_per_page=%s",
-            material_type,
-            course_id,
-            len(reader.pages),
-            self.use_ocr,
-            self.max_images_per_page,
-        )
-        start_time = time.time()
+            self._logger.info(
+                "Chunking start material_type=%s course_id=%s pages=%s use_ocr=%s ocr_mode=%s max_images_per_page=%s ocr_workers=%s pdf_backend=%s",
+                material_type,
+                course_id,
+                document.page_count,
+                self.use_ocr,
+                self.ocr_mode,
+                self.max_images_per_page,
+                self.ocr_workers,
+                self.pdf_backend,
+            )
+            start_time = time.time()
 
-        try:
             if material_type == CourseMaterialType.EXAM:
-                metadata, chunks = self._process_exam(reader, render_doc, course_id)
+                pages = self._extract_pages(document, "exam", cancel_event, progress_callback)
+                metadata, chunks = self._process_exam(pages, course_id, material_key)
             elif material_type in (CourseMaterialType.SLIDES, CourseMaterialType.NOTES):
-                metadata, chunks = self._process_course_material(reader, render_doc, course_id, material_type)
+                pages = self._extract_pages(document, "materials", cancel_event, progress_callback)
+                metadata, chunks = self._process_course_material(pages, course_id, material_type, material_key)
 
             else:
                 raise ValueError(f"Unsupported material type: {material_type}")
         finally:
-            if render_doc is not None:
-                try:
-                    render_doc.close()
-                except Exception:
-                    self._logger.debug("PyMuPDF document close failed", exc_info=True)
+            try:
+                document.close()
+            except Exception:
+                self._logger.debug("PDF document close failed", exc_info=True)
 
         self._logger.info(
             "Chunking complete material_type=%s course_id=%s chunks=%s duration=%.2fs",
@@ -202,64 +311,303 @@ class FileProcessor:
 
     # ------------------------------------------------------------------
     # Internal helpers
-    def _process_course_material(
+    def _extract_pages(
         self,
-        reader: PdfReader,
-        render_doc: Any | None,
-        course_id: int,
-        material_type: CourseMaterialType,
-    ) -> tuple[list[dict], list[CourseMaterialChunk]]:
-        metadata: list[dict] = []
-        chunks: list[CourseMaterialChunk] = []
-
-        chunk_ind = 0
-        for page_index, page in enumerate(reader.pages):
-            page_start = time.time()
-            text = page.extract_text() or ""
-            ocr_text = ""
-            ocr_lang_used: str | None = None
-            has_images = self._page_has_images(page)
+        document: PdfDocument,
+        label: str,
+        cancel_event: Any | None = None,
+        progress_callback: ProgressCallback | None = None,
+    ) -> list[_PageExtraction]:
+        """Extract native text for every page and OCR the pages that need it (in page order)."""
+        pages: list[_PageExtraction] = []
+        ocr_jobs: list[tuple[int, str]] = []
+        render_doc = document.render_doc if self._ensure_ocr_ready() else None
+        for page_index in range(document.page_count):
+            self._raise_if_cancelled(cancel_event)
+            text = document.page_text(page_index)
+            has_images = document.page_has_images(page_index)
             self._logger.debug(
-                "Page %s/%s materials has_images=%s initial_text_len=%s",
+                "Page %s/%s (%s) has_images=%s initial_text_len=%s",
                 page_index + 1,
-                len(reader.pages),
+                document.page_count,
+                label,
                 has_images,
                 len(text),
             )
-            run_ocr = render_doc is not None and self.use_ocr and self._needs_ocr(text)
-            if not run_ocr:
+            image_coverage = document.page_image_coverage(page_index) if has_images else 0.0
+            if render_doc is None or not self.use_ocr:
+                run_ocr, decision = False, "skip:ocr_disabled"
+            elif self.ocr_triage:
+                run_ocr, decision = self._triage_page(render_doc, page_index, text, image_coverage)
+            else:
+                run_ocr = self._needs_ocr(text)
+                decision = "ocr:no_text_layer" if run_ocr else "skip:text_layer"
+            if run_ocr:
+                ocr_jobs.append((page_index, text))
+            else:
                 self._logger.debug(
-                    "OCR skipped page %s native_len=%s threshold=%s",
+                    "OCR skipped page %s (%s) native_len=%s image_coverage=%.2f decision=%s",
                     page_index + 1,
+                    label,
                     len(text),
-                    self.min_text_len_for_ocr,
+                    image_coverage,
+                    decision,
                 )
-            if run_ocr:
-                self._logger.debug("OCR: start page %s (materials)", page_index + 1)
-                ocr_start = time.time()
-                ocr_text, ocr_lang_used = self._extract_ocr_from_page(render_doc, page_index, native_text=text)
-                self._logger.debug(
-                    "OCR: end page %s (materials) ocr_chars=%s lang=%s duration=%.2fs",
+            pages.append(_PageExtraction(text=text, has_images=has_images, ocr_decision=decision, image_coverage=image_coverage))
+            if progress_callback:
+                progress_callback("parse", page_index + 1, document.page_count)
+
+        if render_doc is not None and self.use_ocr:
+            decisions: dict[str, int] = {}
+            for page in pages:
+                decisions[page.ocr_decision] = decisions.get(page.ocr_decision, 0) + 1
+            self._logger.info("OCR triage (%s) pages=%s ocr=%s decisions=%s", label, len(pages), len(ocr_jobs), decisions)
+
+        ocr_results = self._run_ocr(document, render_doc, ocr_jobs, label, cancel_event, progress_callback)
+
+        for page_index, result in ocr_results.items():
+            ocr_text, ocr_lang_used = result.text, result.lang
+            page = pages[page_index]
+            page.ocr_text = ocr_text
+            page.ocr_lang = ocr_lang_used
+            if self.ocr_log_text and ocr_text:
+                self._logger.info(
+                    "OCR TEXT page %s (%s) chars=%s lang=%s\n%s",
                     page_index + 1,
+                    label,
                     len(ocr_text),
                     ocr_lang_used,
-                    time.time() - ocr_start,
+                    ocr_text,
                 )
-                if self.ocr_log_text and ocr_text:
-                    self._logger.info(
-                        "OCR TEXT page %s (materials) chars=%s lang=%s\n%s",
-                        page_index + 1,
-                        len(ocr_text),
-                        ocr_lang_used,
-                        ocr_text,
-                    )
-                if ocr_text:
-                    text = (text + "\n" + ocr_text).strip()
-                else:
-                    self._logger.debug("OCR: no text extracted on page %s", page_index + 1)
+            if ocr_text:
+                page.text = (page.text + "\n" + ocr_text).strip()
+            else:
+                self._logger.debug("OCR: no text extracted on page %s (%s)", page_index + 1, label)
+
+        return pages
+
+    def _run_ocr(
+        self,
+        document: PdfDocument,
+        render_doc: Any | None,
+        ocr_jobs: list[tuple[int, str]],
+        label: str,
+        cancel_event: Any | None = None,
+        progress_callback: ProgressCallback | None = None,
+    ) -> dict[int, OcrResult]:
+        """OCR the given (page_index, native_text) jobs, either in-process or in a worker pool. Cached pages aren't rendered at all."""
+        if not ocr_jobs:
+            return {}
+
+        start_time = time.time()
+        # the profile is sampled from all OCR pages (not only the uncached ones), so it is the same on every run and can be part of the cache key
+        profile = self._build_ocr_profile(render_doc, ocr_jobs, label)
+        results: dict[int, OcrResult] = {}
+        cache_keys: dict[int, str] = {}
+        if self.ocr_cache is not None:
+            for page_index, native_text in ocr_jobs:
+                key = self._ocr_cache_key(render_doc, page_index, native_text, profile)
+                if key is None:
+                    continue
+                cache_keys[page_index] = key
+                cached = self.ocr_cache.get(key)
+                if cached is not None:
+                    results[page_index] = cached
+            if results and progress_callback:
+                progress_callback("ocr", len(results), len(ocr_jobs))
+        cached_pages = len(results)
+        missing_jobs = [(page_index, native_text) for page_index, native_text in ocr_jobs if page_index not in results]
+        ocr_start_time = time.time()
+
+        workers = min(self.ocr_workers, len(missing_jobs))
+        if workers > 1:
+            try:
+                results.update(self._run_ocr_pool(document, missing_jobs, workers, cancel_event, progress_callback, len(ocr_jobs), profile))
+            except BrokenProcessPool:
+                self._logger.exception("OCR worker pool crashed; finishing remaining pages in-process")
+
+        for page_index, native_text in missing_jobs:
+            if page_index in results:
+                continue
+            self._raise_if_cancelled(cancel_event)
+            ocr_start = time.time()
+            results[page_index] = self._extract_ocr_from_page(render_doc, page_index, native_text=native_text, profile=profile)
+            self._logger.debug(
+                "OCR: page %s (%s) ocr_chars=%s lang=%s confidence=%.0f duration=%.2fs",
+                page_index + 1,
+                label,
+                len(results[page_index].text),
+                results[page_index].lang,
+                results[page_index].confidence,
+                time.time() - ocr_start,
+            )
+            if progress_callback:
+                progress_callback("ocr", len(results), len(ocr_jobs))
+
+        if self.ocr_cache is not None:
+            for page_index, _ in missing_jobs:
+                result = results.get(page_index)
+                if result is not None and not result.failed and page_index in cache_keys:
+                    self.ocr_cache.put(cache_keys[page_index], result)
+
+        ocr_duration = time.time() - ocr_start_time
+        used_workers = max(workers, 1)
+        tesseract_calls = sum(results[page_index].tesseract_calls for page_index, _ in missing_jobs if page_index in results)
+        self._logger.info(
+            "OCR complete (%s) pages=%s cached=%s workers=%s engine=%s duration=%.2fs pages_per_second=%.2f "
+            "pages_per_core_second=%.2f tesseract_calls_per_page=%.2f",
+            label,
+            len(ocr_jobs),
+            cached_pages,
+            used_workers if missing_jobs else 0,
+            self.ocr_engine.name,
+            time.time() - start_time,
+            len(missing_jobs) / ocr_duration if missing_jobs and ocr_duration > 0 else 0.0,
+            len(missing_jobs) / (ocr_duration * used_workers) if missing_jobs and ocr_duration > 0 else 0.0,
+            tesseract_calls / len(missing_jobs) if missing_jobs else 0.0,
+        )
+        return results
+
+    def _build_ocr_profile(self, render_doc: Any, ocr_jobs: list[tuple[int, str]], label: str) -> _OcrProfile | None:
+        """
+        Detects orientation and language on up to `ocr_profile_sample_pages` evenly spread pages that are OCR'd as a whole,
+        so the other pages don't need a preview and OSD of their own. Returns None if there is nothing to sample.
+        """
+        full_page_jobs = [job for job in ocr_jobs if self.ocr_mode == "page" or self._needs_ocr(job[1])]
+        if self.ocr_profile_sample_pages == 0 or len(full_page_jobs) <= 1 or render_doc is None:
+            return None
+
+        n_samples = min(self.ocr_profile_sample_pages, len(full_page_jobs))
+        sample_jobs = [full_page_jobs[i * len(full_page_jobs) // n_samples] for i in range(n_samples)]
+        calls_before = self.ocr_engine.calls
+        rotations: Counter = Counter()
+        langs: Counter = Counter()
+        for page_index, native_text in sample_jobs:
+            try:
+                preview = self._render_preview(render_doc.load_page(page_index))
+            except Exception:
+                self._logger.debug("OCR profile: could not render page %s", page_index + 1, exc_info=True)
+                continue
+            rotation, lang = self._detect_page_layout(preview, native_text)
+            rotations[rotation] += 1
+            langs[lang] += 1
+        if not rotations:
+            return None
+
+        profile = _OcrProfile(rotation=rotations.most_common(1)[0][0], lang=langs.most_common(1)[0][0], sampled_pages=sum(rotations.values()))
+        self._logger.info(
+            "OCR profile (%s) rotation=%s lang=%s sampled_pages=%s tesseract_calls=%s",
+            label,
+            profile.rotation,
+            profile.lang,
+            profile.sampled_pages,
+            self.ocr_engine.calls - calls_before,
+        )
+        return profile
+
+    def _ocr_cache_key(self, render_doc: Any, page_index: int, native_text: str, profile: _OcrProfile | None = None) -> str | None:
+        """Hash of everything that the OCR result of a page depends on: its content, the OCR engine and settings, and the document's OCR profile."""
+        try:
+            page = render_doc.load_page(page_index)
+            doc = page.parent
+            hasher = hashlib.sha256()
+            hasher.update(f"{page.rect}|{page.rotation}".encode())
+            hasher.update(page.read_contents())
+            # the content stream only references images and forms by name, their data has to go into the hash as well
+            for xref in sorted({image[0] for image in page.get_images(full=True)} | {form[0] for form in page.get_xobjects()}):
+                if xref > 0:
+                    hasher.update(doc.xref_stream_raw(xref) or b"")
+        except Exception:
+            self._logger.debug("OCR cache: could not hash page %s", page_index + 1, exc_info=True)
+            return None
+
+        settings = (
+            OCR_PIPELINE_VERSION,
+            self.ocr_mode,
+            self._needs_ocr(native_text),
+            self.ocr_dpi,
+            self.ocr_psm,
+            self.ocr_lang,
+            self.ocr_min_dim,
+            self.ocr_max_dim,
+            self.max_images_per_page,
+            self.ocr_engine.name,
+            (profile.rotation, profile.lang) if profile is not None else None,
+        )
+        hasher.update(repr(settings).encode())
+        return hasher.hexdigest()
+
+    def _run_ocr_pool(
+        self,
+        document: PdfDocument,
+        ocr_jobs: list[tuple[int, str]],
+        workers: int,
+        cancel_event: Any | None = None,
+        progress_callback: ProgressCallback | None = None,
+        total_pages: int | None = None,
+        profile: _OcrProfile | None = None,
+    ) -> dict[int, OcrResult]:
+        """Render + OCR pages in `workers` processes. Every worker opens the PDF once from its path (or a temp file)."""
+        results: dict[int, OcrResult] = {}
+        already_done = (total_pages or len(ocr_jobs)) - len(ocr_jobs)
+        temp_path = None
+        pdf_path = document.path
+        if pdf_path is None:
+            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+                tmp.write(document.data)
+                pdf_path = temp_path = tmp.name
+
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_ocr_worker,
+            initargs=(self, pdf_path),
+        )
+        cancelled = False
+        try:
+            futures = {
+                pool.submit(_ocr_page_in_worker, page_index, native_text, profile): page_index
+                for page_index, native_text in ocr_jobs
+            }
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[futures[future]] = future.result()
+                if done and progress_callback:
+                    progress_callback("ocr", already_done + len(results), already_done + len(ocr_jobs))
+                if cancel_event is not None and cancel_event.is_set():
+                    cancelled = True
+                    break
+        finally:
+            pool.shutdown(wait=not cancelled, cancel_futures=True)
+            if temp_path is not None:
+                try:
+                    os.unlink(temp_path)
+                except OSError:
+                    self._logger.debug("Could not remove OCR temp file %s", temp_path, exc_info=True)
+
+        self._raise_if_cancelled(cancel_event)
+        return results
+
+    def _raise_if_cancelled(self, cancel_event: Any | None) -> None:
+        if cancel_event is not None and cancel_event.is_set():
+            raise ProcessingCancelled("PDF processing was cancelled")
+
+    def _process_course_material(
+        self,
+        pages: list[_PageExtraction],
+        course_id: int,
+        material_type: CourseMaterialType,
+        material_key: str | None = None,
+    ) -> tuple[list[dict], list[CourseMaterialChunk]]:
+        metadata: list[dict] = []
+        chunks: list[CourseMaterialChunk] = []
+        seen: Counter = Counter()
 
-            for chunk_text in self._split_text(text, self.text_chunk_size, self.text_chunk_overlap):
-                chunk_id = f"{course_id}-{material_type.value}-{chunk_ind}"
+        chunk_ind = 0
+        for page_index, page in enumerate(pages):
+            for chunk_text in self._split_text(page.text, self.text_chunk_size, self.text_chunk_overlap):
+                chunk_id = self._chunk_id(course_id, material_type, material_key, chunk_text, seen)
                 chunks.append(
                     CourseMaterialChunk(
                         id=chunk_id,
@@ -273,9 +621,11 @@ class FileProcessor:
                     {
                         "page_start": page_index + 1,
                         "page_end": page_index + 1,
-                        "has_images": has_images,
-                        "ocr_used": bool(ocr_text),
-                        "ocr_language": ocr_lang_used or "",
+                        "has_images": page.has_images,
+                        "ocr_used": bool(page.ocr_text),
+                        "ocr_language": page.ocr_lang or "",
+                        "ocr_decision": page.ocr_decision,
+                        "image_coverage": round(page.image_coverage, 3),
                         "char_len": len(chunk_text),
                         "material_type": material_type.value,
                         "topic": "unknown",
@@ -283,78 +633,17 @@ class FileProcessor:
                 )
                 chunk_ind += 1
 
-            self._logger.debug(
-                "Page %s/%s done chunks_on_page=%s duration=%.2fs",
-                page_index + 1,
-                len(reader.pages),
-                chunk_ind,
-                time.time() - page_start,
-            )
-
         return metadata, chunks
 
     def _process_exam(
         self,
-        reader: PdfReader,
-        render_doc: Any | None,
+        pages: list[_PageExtraction],
         course_id: int,
+        material_key: str | None = None,
     ) -> tuple[list[dict], list[ExamQuestionChunk]]:
-        page_texts: list[str] = []
-        page_ocr_flags: list[bool] = []
-        page_ocr_langs: list[str | None] = []
-        for page_index, page in enumerate(reader.pages):
-            page_start = time.time()
-            text = page.extract_text() or ""
-            ocr_text = ""
-            ocr_lang_used: str | None = None
-            has_images = self._page_has_images(page)
-            self._logger.debug(
-                "Exam page %s/%s has_images=%s initial_text_len=%s",
-                page_index + 1,
-                len(reader.pages),
-                has_images,
-                len(text),
-            )
-            run_ocr = render_doc is not None and self.use_ocr and self._needs_ocr(text)
-            if not run_ocr:
-                self._logger.debug(
-                    "OCR skipped exam page %s native_len=%s threshold=%s",
-                    page_index + 1,
-                    len(text),
-                    self.min_text_len_for_ocr,
-                )
-            if run_ocr:
-                self._logger.debug("OCR: start exam page %s", page_index + 1)
-                ocr_start = time.time()
-                ocr_text, ocr_lang_used = self._extract_ocr_from_page(render_doc, page_index, native_text=text)
-                self._logger.debug(
-                    "OCR: end exam page %s ocr_chars=%s lang=%s duration=%.2fs",
-                    page_index + 1,
-                    len(ocr_text),
-                    ocr_lang_used,
-                    time.time() - ocr_start,
-                )
-                if self.ocr_log_text and ocr_text:
-                    self._logger.info(
-                        "OCR TEXT page %s (exam) chars=%s lang=%s\n%s",
-                        page_index + 1,
-                        len(ocr_text),
-                        ocr_lang_used,
-                        ocr_text,
-                    )
-                if ocr_text:
-                    text = (text + "\n" + ocr_text).strip()
-                else:
-                    self._logger.debug("OCR: exam page %s OCR returned empty", page_index + 1)
-            page_texts.append(text)
-            page_ocr_flags.append(bool(ocr_text))
-            page_ocr_langs.append(ocr_lang_used)
-            self._logger.debug(
-                "Exam page %s/%s done duration=%.2fs",
-                page_index + 1,
-                len(reader.pages),
-                time.time() - page_start,
-            )
+        page_texts = [page.text for page in pages]
+        page_ocr_flags = [bool(page.ocr_text) for page in pages]
+        page_ocr_langs = [page.ocr_lang for page in pages]
 
         full_text = "\n".join(page_texts)
         if not full_text.strip():
@@ -363,9 +652,12 @@ class FileProcessor:
         question_blocks = self._split_questions(full_text)
         metadata: list[dict] = []
         chunks: list[ExamQuestionChunk] = []
+        seen: Counter = Counter()
 
         for idx, block in enumerate(question_blocks):
             question_text, answer_keys = self._extract_question_and_answers(block)
+            page_number = self._find_page_for_text(page_texts, block)
+            page = pages[page_number - 1] if page_number else None
 
             # Build chunk text respecting separator convention
             if answer_keys:
@@ -375,7 +667,7 @@ class FileProcessor:
                 chunk_text = question_text
 
             question_type = self._infer_question_type(question_text, answer_keys)
-            chunk_id = f"{course_id}-{CourseMaterialType.EXAM.value}-{idx}"
+            chunk_id = self._chunk_id(course_id, CourseMaterialType.EXAM, material_key, chunk_text, seen)
 
             chunks.append(
                 ExamQuestionChunk(
@@ -390,8 +682,8 @@ class FileProcessor:
             metadata.append(
                 {
                     "question_number": idx + 1,
-                    "page_start": self._find_page_for_text(page_texts, block),
-                    "page_end": self._find_page_for_text(page_texts, block),
+                    "page_start": page_number,
+                    "page_end": page_number,
                     "ocr_used": any(page_ocr_flags),
                     "has_choices": bool(answer_keys),
                     "char_len": len(chunk_text),
@@ -399,11 +691,20 @@ class FileProcessor:
                     "topic": "unknown",
                     "difficulty": "unknown",
                     "ocr_languages_used": ",".join(lang for lang in page_ocr_langs if lang),
+                    "ocr_decision": page.ocr_decision if page else "",
                 }
             )
 
         return metadata, chunks
 
+    # Content-addressed chunk ID: the same text in the same document always gets the same ID, no matter where it moved to.
+    # `seen` counts the texts of the document so far, so a repeated text (e.g. two identical slides) still gets its own ID
+    def _chunk_id(self, course_id: int, material_type: CourseMaterialType, material_key: str | None, text: str, seen: Counter) -> str:
+        occurrence = seen[text]
+        seen[text] += 1
+        digest = hashlib.sha256(f"{material_key or ''}\0{occurrence}\0{text}".encode("utf-8")).hexdigest()[:32]
+        return f"{course_id}-{material_type.value}-{digest}"
+
     def _split_text(self, text: str, chunk_size: int, overlap: int) -> Iterable[str]:
         text = text.strip()
         if not text:
@@ -420,21 +721,45 @@ class FileProcessor:
             start = max(end - overlap, end) if overlap >= chunk_size else end - overlap
         return chunks
 
-    def _page_has_images(self, page) -> bool:
+    def _triage_page(self, render_doc: Any, page_index: int, native_text: str, image_coverage: float) -> tuple[bool, str]:
+        """
+        Decide cheaply whether OCR can add anything to a page. Returns (run_ocr, decision).
+        Only pages without a usable text layer are OCR'd (like without triage), unless triage_probe_text_pages is set.
+        """
+        text = (native_text or "").strip()
+        if self._needs_ocr(text):
+            if image_coverage >= self.triage_min_image_coverage and image_coverage > 0:
+                return True, "ocr:no_text_layer"
+            # blank page, a short title slide with a logo, or text drawn as vector paths -> ask the probe
+            if self._probe_new_words(render_doc, page_index, text) >= self.triage_probe_min_new_words:
+                return True, "ocr:probe_found_text"
+            return False, "skip:blank" if image_coverage == 0 else "skip:probe_no_new_text"
+
+        if not self.triage_probe_text_pages or image_coverage < self.triage_min_image_coverage:
+            return False, "skip:text_layer"
+        if len(text) >= self.triage_dense_text_chars and image_coverage < 0.5:
+            return False, "skip:text_dense"
+        if self._probe_new_words(render_doc, page_index, text) >= self.triage_probe_min_new_words:
+            return True, "ocr:probe_found_text"
+        return False, "skip:probe_no_new_text"
+
+    def _probe_new_words(self, render_doc: Any, page_index: int, native_text: str) -> int:
+        """OCR a low resolution thumbnail of the page and count the words that the native text doesn't contain."""
+        if not (pytesseract and Image and fitz):
+            return 0
         try:
-            resources = page.get("/Resources") or {}
-            x_objects = resources.get("/XObject")
-            if not x_objects:
-                return False
-            x_objects = x_objects.get_object()
-            for obj in x_objects.values():
-                obj_type = obj.get("/Subtype")
-                if obj_type == "/Image":
-                    return True
+            page = render_doc.load_page(page_index)
+            zoom = self.triage_probe_dpi / 72.0
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+            probe_text = self.ocr_engine.quick_text(pixmap_to_gray(pix, copy=True), self.ocr_lang, "11")
         except Exception:
-            # Best-effort; if detection fails, assume no images
-            return False
-        return False
+            # if the probe fails we can't tell, so OCR the page to be safe
+            self._logger.debug("OCR probe failed on page %s", page_index + 1, exc_info=True)
+            return self.triage_probe_min_new_words
+
+        known_words = set(re.findall(r"\w{3,}", native_text.casefold()))
+        new_words = [word for word in re.findall(r"\w{3,}", probe_text.casefold()) if word not in known_words]
+        return len(new_words)
 
     def _needs_ocr(self, native_text: str) -> bool:
         text = (native_text or "").strip()
@@ -451,101 +776,220 @@ class FileProcessor:
         ratio = alnum / max(len(text), 1)
         return ratio < 0.45
 
-    def _extract_ocr_from_page(self, render_doc: Any, page_index: int, native_text: str = "") -> tuple[str, str | None]:
-        """Render the full page to an image and run Tesseract OCR."""
+    def _extract_ocr_from_page(self, render_doc: Any, page_index: int, native_text: str = "", profile: _OcrProfile | None = None) -> OcrResult:
+        """Run Tesseract OCR on a page: on its images (ocr_mode "regions") or on the full rendered page."""
         if not (pytesseract and Image and fitz):
-            return "", None
+            return OcrResult("", None, failed=True)
 
         try:
             page = render_doc.load_page(page_index)
         except Exception:
             self._logger.exception("OCR: failed to load page %s for rendering", page_index + 1)
-            return "", None
-
+            return OcrResult("", None, failed=True)
+
+        calls_before = self.ocr_engine.calls
+        # the images are all that OCR can add to a page with a usable text layer
+        result = None
+        if self.ocr_mode == "regions" and not self._needs_ocr(native_text):
+            regions = self._image_regions(page)
+            if regions:
+                result = self._extract_ocr_from_regions(page, page_index, regions, native_text)
+        if result is None:
+            result = self._extract_ocr_from_full_page(page, page_index, native_text, profile)
+        result.tesseract_calls = self.ocr_engine.calls - calls_before
+        return result
+
+    def _extract_ocr_from_full_page(self, page: Any, page_index: int, native_text: str = "", profile: _OcrProfile | None = None) -> OcrResult:
+        """
+        Render the full page to an image and run Tesseract OCR.
+        With a document `profile`, its orientation and language are used; the page only gets its own detection if the
+        OCR confidence is below `ocr_recheck_confidence`.
+        """
         try:
-            zoom = self.ocr_dpi / 72.0
-            matrix = fitz.Matrix(zoom, zoom)
-            pix = page.get_pixmap(matrix=matrix, alpha=False)
-            image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+            preview = None if profile else self._render_preview(page)
+            # the page itself is rendered at exactly the size the OCR gets, in grayscale
+            zoom = self._render_zoom(page.rect)
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+            # a view on the pixmap's samples, `pix` has to stay alive until the OCR is done
+            image = pixmap_to_gray(pix)
         except Exception:
             self._logger.exception("OCR: failed to render page %s to image", page_index + 1)
-            return "", None
+            return OcrResult("", None, failed=True)
+
+        dpi = round(zoom * 72)
+        if profile is None:
+            rotation, lang = self._detect_page_layout(preview, native_text)
+        else:
+            rotation = profile.rotation
+            lang = profile.lang if self._needs_preview_language(native_text) else self._decide_ocr_language(native_text, None)
+        self._logger.debug("OCR: page %s rendered=%sx%s zoom=%.2f rot=%s", page_index + 1, image.shape[1], image.shape[0], zoom, rotation)
+        recognized = self._ocr_image(self._rotate(image, rotation), lang, dpi, page_index)
+
+        if profile is not None and recognized is not None and recognized[1] < self.ocr_recheck_confidence:
+            # the page may be turned or in another language than the rest of the document
+            try:
+                page_rotation, page_lang = self._detect_page_layout(self._render_preview(page), native_text)
+            except Exception:
+                self._logger.debug("OCR: recheck of page %s failed", page_index + 1, exc_info=True)
+                page_rotation, page_lang = rotation, lang
+            if (page_rotation, page_lang) != (rotation, lang):
+                retry = self._ocr_image(self._rotate(image, page_rotation), page_lang, dpi, page_index)
+                self._logger.debug(
+                    "OCR: page %s confidence=%.0f, recheck rot=%s lang=%s confidence=%s",
+                    page_index + 1,
+                    recognized[1],
+                    page_rotation,
+                    page_lang,
+                    f"{retry[1]:.0f}" if retry else None,
+                )
+                if retry is not None and retry[1] > recognized[1]:
+                    recognized, rotation, lang = retry, page_rotation, page_lang
+        del image, pix
+
+        if recognized is None:
+            return OcrResult("", lang, rotation=rotation, failed=True)
+        return OcrResult(recognized[0], lang, rotation=rotation, confidence=recognized[1])
+
+    def _render_preview(self, page: Any):
+        """One small grayscale render (longest edge at most 1000 px) for the orientation and language detection."""
+        zoom = self._render_zoom(page.rect, max_dim=1000)
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+        return Image.fromarray(pixmap_to_gray(pix, copy=True))
+
+    def _detect_page_layout(self, preview, native_text: str) -> tuple[int, str]:
+        """Returns the rotation (clockwise degrees) and the OCR language of a page, detected on its preview."""
+        rotation = self._detect_rotation(preview)
+        if rotation:
+            preview = preview.rotate(-rotation, expand=True)
+        lang = self._decide_ocr_language(native_text, preview if self._needs_preview_language(native_text) else None)
+        return rotation, lang
+
+    def _needs_preview_language(self, native_text: str) -> bool:
+        return (not (native_text or "").strip()) or self._looks_like_garbage(native_text)
+
+    def _rotate(self, image: np.ndarray, rotation: int) -> np.ndarray:
+        # a view, nothing is copied
+        return np.rot90(image, k=-(rotation // 90)) if rotation else image
+
+    def _image_regions(self, page: Any) -> list[dict]:
+        """The image placements of a page that are worth OCR'ing, the largest `max_images_per_page` ones in reading order."""
+        page_rect = page.rect
+        regions = []
+        seen = set()
+        for info in page.get_image_info(xrefs=True):
+            bbox = fitz.Rect(info["bbox"]) & page_rect
+            # skip invisible images and hairlines/bullets that can't contain readable text
+            if bbox.is_empty or min(bbox.width, bbox.height) < 8:
+                continue
+            key = (info.get("xref", 0), tuple(round(v) for v in bbox))
+            if key in seen:
+                continue
+            seen.add(key)
+            regions.append({**info, "bbox": bbox})
+
+        if self.max_images_per_page and len(regions) > self.max_images_per_page:
+            regions = sorted(regions, key=lambda region: region["bbox"].get_area(), reverse=True)[: self.max_images_per_page]
+        return sorted(regions, key=lambda region: (round(region["bbox"].y0), region["bbox"].x0))
+
+    def _extract_ocr_from_regions(self, page: Any, page_index: int, regions: list[dict], native_text: str) -> OcrResult:
+        """OCR every image region of a page and join the texts in reading order."""
+        lang = self._decide_ocr_language(native_text, None)
+        texts = []
+        confidences = []
+        failed = False
+        for region in regions:
+            try:
+                image, dpi = self._region_image(page, region)
+            except Exception:
+                self._logger.exception("OCR: failed to extract image region %s on page %s", tuple(region["bbox"]), page_index + 1)
+                failed = True
+                continue
+            recognized = self._ocr_image(image, lang, dpi, page_index)
+            failed = failed or recognized is None
+            if recognized and recognized[0]:
+                texts.append(recognized[0])
+                confidences.append(recognized[1])
+        self._logger.debug("OCR: page %s regions=%s regions_with_text=%s", page_index + 1, len(regions), len(texts))
+        return OcrResult("\n".join(texts), lang, failed=failed, confidence=min(confidences, default=-1.0))
+
+    def _region_image(self, page: Any, region: dict) -> tuple[np.ndarray, int]:
+        """Returns the grayscale image of a region and its resolution in dpi."""
+        bbox = region["bbox"]
+        a, b, c, d = (region.get("transform") or (1, 0, 0, 1))[:4]
+        upright = a > 0 and d > 0 and abs(b) < 1e-6 and abs(c) < 1e-6
+        # the embedded image at its native resolution, without rendering anything. Rotated or masked images and
+        # inline images (xref 0) are rendered instead, so the OCR sees them the way they appear on the page.
+        if region.get("xref") and upright and not region.get("has-mask"):
+            try:
+                pix = fitz.Pixmap(page.parent, region["xref"])
+                if pix.colorspace is None or pix.colorspace.n != 1:
+                    pix = fitz.Pixmap(fitz.csGRAY, pix)
+                return pixmap_to_gray(pix, copy=True), max(72, round(pix.width * 72 / max(bbox.width, 1)))
+            except Exception:
+                self._logger.debug("OCR: could not extract image xref=%s, rendering it", region["xref"], exc_info=True)
 
-        image, rotation = self._maybe_fix_rotation(image)
-        use_preview = (not (native_text or "").strip()) or self._looks_like_garbage(native_text)
-        lang = self._decide_ocr_language(native_text, image if use_preview else None)
+        zoom = self._render_zoom(bbox)
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=bbox, colorspace=fitz.csGRAY, alpha=False)
+        return pixmap_to_gray(pix, copy=True), round(zoom * 72)
 
+    def _render_zoom(self, rect: Any, max_dim: int | None = None) -> float:
+        """
+        The zoom to render `rect` (in PDF points) with: `ocr_dpi`, unless the longest edge of the render would end up outside
+        ocr_min_dim..ocr_max_dim (or larger than `max_dim`). Then it is rendered at exactly that limit instead of being resized afterwards.
+        """
+        long_edge = max(rect.width, rect.height, 1.0)
+        zoom = self.ocr_dpi / 72.0
+        if max_dim is not None:
+            return min(zoom, max_dim / long_edge)
+        if long_edge * zoom > self.ocr_max_dim:
+            # floor the size, so rounding can't make the render one pixel larger than the limit
+            return int(self.ocr_max_dim) / long_edge * (1 - 1e-6)
+        if long_edge * zoom < self.ocr_min_dim:
+            return self.ocr_min_dim / long_edge
+        return zoom
+
+    def _ocr_image(self, image: np.ndarray, lang: str, dpi: int, page_index: int) -> tuple[str, float] | None:
+        """Preprocess a grayscale image and run Tesseract on it. Returns (text, mean word confidence), None if Tesseract failed."""
         try:
             prepared = self._prepare_image_for_ocr(image)
             t0 = time.time()
-            config = f"--oem 1 --psm {self.ocr_psm} -c preserve_interword_spaces=1 -c user_defined_dpi={self.ocr_dpi}"
-            text = pytesseract.image_to_string(
-                prepared,
-                lang=lang,
-                config=config,
-            )
+            text, confidence = self.ocr_engine.recognize(prepared, lang, self.ocr_psm, dpi)
             duration = time.time() - t0
             self._logger.debug(
-                "OCR: page %s rendered=%sx%s prep=%sx%s rot=%s lang=%s duration=%.2fs",
+                "OCR: page %s image=%sx%s prep=%sx%s dpi=%s lang=%s confidence=%.0f duration=%.2fs",
                 page_index + 1,
-                image.width,
-                image.height,
-                prepared.width,
-                prepared.height,
-                rotation,
+                image.shape[1],
+                image.shape[0],
+                prepared.shape[1],
+                prepared.shape[0],
+                dpi,
                 lang,
+                confidence,
                 duration,
             )
-            return (text.strip() if text else "", lang)
+            return (text.strip() if text else "", confidence)
         except Exception:
             self._logger.exception("OCR: tesseract failed on page %s", page_index + 1)
-            return "", lang
+            return None
 
-    def _prepare_image_for_ocr(self, image):
-        """Stronger preprocessing: grayscale, denoise, resize, binarize."""
+    def _prepare_image_for_ocr(self, image: np.ndarray) -> np.ndarray:
+        """Resize, autocontrast, denoise and binarize a grayscale image (see services/ocr_preprocessing.py)."""
         try:
-            img = image.convert("L")
-            if ImageOps:
-                img = ImageOps.autocontrast(img)
-            if ImageFilter:
-                img = img.filter(ImageFilter.MedianFilter(size=3))
-
-            long_edge = max(img.width, img.height)
-            resample = Image.Resampling.LANCZOS if hasattr(Image, "Resampling") else Image.LANCZOS
-            if long_edge < self.ocr_min_dim:
-                scale = self.ocr_min_dim / float(long_edge)
-                new_size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
-                img = img.resize(new_size, resample=resample)
-            elif long_edge > self.ocr_max_dim:
-                scale = self.ocr_max_dim / float(long_edge)
-                new_size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
-                img = img.resize(new_size, resample=resample)
-
-            threshold = self._otsu_threshold(img)
-            binary = img.point(lambda p: 255 if p > threshold else 0, mode="1")
-            return binary.convert("L")
+            return prepare_for_ocr(image, self.ocr_min_dim, self.ocr_max_dim)
         except Exception:
             self._logger.debug("OCR preprocessing failed; using original image", exc_info=True)
-            return image.convert("L") if hasattr(image, "convert") else image
+            return image
 
-    def _maybe_fix_rotation(self, image):
-        """Detect page orientation via OSD on a downscaled preview and rotate if needed."""
+    def _detect_rotation(self, preview) -> int:
+        """Detect the page orientation via OSD on a downscaled preview. Returns the clockwise rotation (degrees) that fixes it."""
         if not pytesseract:
-            return image, 0
+            return 0
         try:
-            preview = image.copy()
-            preview.thumbnail((1000, 1000))
-            preview = preview.convert("L")
-            osd = pytesseract.image_to_osd(preview, config="--psm 0")
-            match = re.search(r"Rotate:\s*(\d+)", osd)
-            if match:
-                rotation = int(match.group(1)) % 360
-                if rotation:
-                    return image.rotate(-rotation, expand=True), rotation
+            return self.ocr_engine.detect_rotation(preview)
         except Exception as e:
             # OSD often fails on pages with too few characters; this is expected
             self._logger.debug("OCR orientation detection skipped: %s", str(e).split('\n')[0])
-        return image, 0
+        return 0
 
     def _decide_ocr_language(self, native_text: str, preview_image) -> str:
         # If caller explicitly requests combined languages, honor it.
@@ -563,7 +1007,7 @@ class FileProcessor:
                 preview = preview_image.copy()
                 preview.thumbnail((800, 800))
                 preview = preview.convert("L")
-                preview_text = pytesseract.image_to_string(preview, lang="eng+deu", config="--oem 1 --psm 6")
+                preview_text = self.ocr_engine.quick_text(preview, "eng+deu", "6")
                 if any(ch in preview_text for ch in "äöüÄÖÜß"):
                     return "deu"
             except Exception:
@@ -571,32 +1015,6 @@ class FileProcessor:
 
         return self.ocr_lang or "eng"
 
-    def _otsu_threshold(self, img) -> int:
-        # img must be grayscale
-        hist = img.histogram()
-        total = sum(hist)
-        sum_total = sum(i * hist[i] for i in range(256))
-        sumB = 0
-        wB = 0
-        var_max = 0.0
-        threshold = 0
-
-        for t in range(256):
-            wB += hist[t]
-            if wB == 0:
-                continue
-            wF = total - wB
-            if wF == 0:
-                break
-            sumB += t * hist[t]
-            mB = sumB / wB
-            mF = (sum_total - sumB) / wF
-            var_between = wB * wF * (mB - mF) ** 2
-            if var_between > var_max:
-                var_max = var_between
-                threshold = t
-        return threshold
-
     def _split_questions(self, text: str) -> list[str]:
         # Improved regex to handle:
         # 1. Keyword based: "Question 1", "Frage 1", "## Frage 1" (Markdown), "Problem 1" (Punctuation optional)
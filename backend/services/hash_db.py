@@ -1,5 +1,6 @@
-from pymongo import MongoClient
+from pymongo import ASCENDING, MongoClient, ReturnDocument, errors
 import os
+import uuid
 import hashlib
 from models.course_material_type import CourseMaterialType
 
@@ -12,8 +13,22 @@ class HashDB:
         self.client = client or MongoClient(mongo_url)
         self.db = self.client["hash_db"]
         self.collection = self.db["hashes"]
+        # one manifest per uploaded document: the IDs of the chunks that are currently indexed for it
+        self.manifests = self.db["chunk_manifests"]
+        # one version per course, it changes whenever material is uploaded or removed (see get_material_version)
+        self.versions = self.db["material_versions"]
+        try:
+            self.manifests.create_index([("course_id", ASCENDING), ("type", ASCENDING), ("material", ASCENDING)], unique=True)
+            self.collection.create_index([("course_id", ASCENDING), ("material_id", ASCENDING)])
+            self.collection.create_index([("course_id", ASCENDING), ("hash", ASCENDING)])
+            self.versions.create_index("course_id", unique=True)
+        except errors.PyMongoError:
+            # best-effort, lookups still work without the index
+            pass
+        self._backfill_material_ids()
 
-    def add_file_hash(self, course_id: int, hash: str, type: CourseMaterialType = None, generated: bool = False, filename: str = None):
+    # `material` identifies the document that the file is a version of (see `material_key`), it defaults to the filename for old callers
+    def add_file_hash(self, course_id: int, hash: str, type: CourseMaterialType = None, generated: bool = False, filename: str = None, material: str = None):
         if generated:
             insert_type = "generated"
         else:
@@ -21,21 +36,98 @@ class HashDB:
         hash_entry = {"course_id": course_id, "hash": hash, "type": insert_type}
         if filename:
             hash_entry["filename"] = filename
+        if not generated:
+            hash_entry["material"] = material or filename or hash
+            hash_entry["material_id"] = self.material_id(type, hash_entry["material"])
         self.collection.insert_one(hash_entry)
+        if not generated:
+            self._bump_material_version(course_id)
+
+    # the ID of an uploaded document within a course, it stays the same for all versions of the document (same type and material key)
+    @staticmethod
+    def material_id(type: CourseMaterialType | str, material: str) -> str:
+        type_value = type.value if isinstance(type, CourseMaterialType) else type
+        return hashlib.sha256(f"{type_value}\0{material}".encode("utf-8")).hexdigest()[:16]
 
     def get_materials_for_course(self, course_id: int) -> list[dict]:
-        """Returns list of materials (filename, type) for a course, excluding generated exams."""
+        """Returns list of materials (filename, type, material_id) for a course, excluding generated exams."""
         materials = self.collection.find(
             {"course_id": course_id, "type": {"$ne": "generated"}},
-            {"_id": 0, "filename": 1, "type": 1}
+            {"_id": 0, "filename": 1, "type": 1, "material_id": 1}
         )
         return [m for m in materials if m.get("filename")]
 
+    # returns {course_id, hash, type, filename, material, material_id} of the current version of a document, or None
+    def get_material(self, course_id: int, material_id: str):
+        return self.collection.find_one({"course_id": course_id, "material_id": material_id, "type": {"$ne": "generated"}}, {"_id": 0})
+
+    # forgets a document: its hashes (so it can be uploaded again) and its chunk manifest
+    def remove_material(self, course_id: int, material_id: str) -> None:
+        entry = self.get_material(course_id, material_id)
+        if entry is None:
+            return
+        self.collection.delete_many({"course_id": course_id, "material_id": material_id, "type": entry["type"]})
+        self.manifests.delete_one({"course_id": course_id, "type": entry["type"], "material": self.material_key(entry)})
+        self._bump_material_version(course_id)
+
+    # the key that chunk IDs and the chunk manifest of a document are derived from.
+    # New uploads use their file hash, entries written before that used the filename
+    @staticmethod
+    def material_key(entry: dict) -> str:
+        return entry.get("material") or entry.get("filename") or entry["hash"]
+
+    # entries written before material IDs (and keys) existed get theirs stored once, so materials can be looked up by ID
+    def _backfill_material_ids(self) -> None:
+        legacy = {"type": {"$ne": "generated"}, "$or": [{"material_id": {"$exists": False}}, {"material": {"$exists": False}}]}
+        for entry in self.collection.find(legacy, {"_id": 1, "type": 1, "filename": 1, "hash": 1, "material": 1}):
+            material = self.material_key(entry)
+            self.collection.update_one({"_id": entry["_id"]}, {"$set": {"material": material, "material_id": self.material_id(entry["type"], material)}})
+
+    # returns a token for the uploaded materials of a course, it changes whenever material is uploaded (or removed)
+    def get_material_version(self, course_id: int) -> str:
+        try:
+            document = self.versions.find_one_and_update(
+                {"course_id": course_id},
+                {"$setOnInsert": {"version": uuid.uuid4().hex}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except errors.DuplicateKeyError:
+            # another request created it at the same time
+            document = self.versions.find_one({"course_id": course_id})
+        return document["version"]
+
+    def _bump_material_version(self, course_id: int) -> None:
+        self.versions.update_one({"course_id": course_id}, {"$set": {"version": uuid.uuid4().hex}}, upsert=True)
+
     # returns {course_id, hash, type} or None if the hash doesn't exist yet for this course
     def get_file_hash(self, course_id: int, hash: str):
         file_hash = self.collection.find_one({"course_id": course_id, "hash": hash})
         return file_hash
 
+    def remove_file_hash(self, course_id: int, hash: str) -> None:
+        if self.collection.delete_many({"course_id": course_id, "hash": hash}).deleted_count:
+            self._bump_material_version(course_id)
+
+    # returns {course_id, type, material, file_hash, chunk_ids} of the last ingested version of a document, or None
+    def get_chunk_manifest(self, course_id: int, type: CourseMaterialType, material: str):
+        return self.manifests.find_one({"course_id": course_id, "type": type.value, "material": material}, {"_id": 0})
+
+    # replaces the manifest of a document, `chunk_ids` are the IDs of all chunks that are indexed for its current version
+    def save_chunk_manifest(self, course_id: int, type: CourseMaterialType, material: str, file_hash: str, chunk_ids: list[str]) -> None:
+        self.manifests.replace_one(
+            {"course_id": course_id, "type": type.value, "material": material},
+            {
+                "course_id": course_id,
+                "type": type.value,
+                "material": material,
+                "material_id": self.material_id(type, material),
+                "file_hash": file_hash,
+                "chunk_ids": list(chunk_ids),
+            },
+            upsert=True,
+        )
+
     # we call this function for the uploaded files, since they might be 50MB large, therefore doing the hash in chunks seems better
     async def compute_file_hash(self, file):
         hasher = hashlib.sha256()
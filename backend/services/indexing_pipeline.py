@@ -0,0 +1,129 @@
+import logging
+import math
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+from services.openrouter_client import OpenRouterError
+
+# status codes an embedding provider answers with when a request has too many tokens or inputs
+BATCH_TOO_LARGE_STATUS_CODES = {400, 413}
+
+
+"""
+This class writes chunks into a Chroma collection in two overlapping stages: embedding (network) and storing (disk).
+
+While batch i is written to the collection, batch i+1 (up to `max_in_flight` batches) is already being embedded in a
+background thread, and the embeddings are passed to Chroma with `embeddings=`, so Chroma doesn't embed anything itself.
+Indexing then takes about as long as the slower of the two stages instead of their sum.
+
+Batches are cut so they stay under `max_batch_tokens` (the provider's limit per request) and `max_batch_size` texts.
+If the provider still rejects a batch as too large, it is split in half and the token budget of the following batches is lowered.
+"""
+class IndexingPipeline:
+
+    def __init__(
+        self,
+        max_batch_tokens: int = 60_000,
+        max_batch_size: int = 256,
+        max_in_flight: int = 2,
+        count_tokens: Callable[[str], int] | None = None,
+    ):
+        self.max_batch_tokens = max(1, max_batch_tokens)
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_in_flight = max(1, max_in_flight)
+        # a conservative estimate without a tokenizer (~3 characters per token, English is closer to 4)
+        self.count_tokens = count_tokens or (lambda text: math.ceil(len(text) / 3))
+        self._logger = logging.getLogger(__name__)
+
+    """
+    Embeds the documents with `embed` and upserts them into `collection`.
+
+    Input:
+        collection... The Chroma collection
+        ids, documents, metadatas... The chunks, like for `collection.upsert`
+        embed... Embeds a list of texts (e.g. the embedding function of the VectorDB)
+        progress_callback (Optional)... Called as progress_callback("embed", stored_chunks, total_chunks) after every stored batch
+
+    Output:
+        dict... e.g. {'chunks': 300, 'batches': 3, 'embed_seconds': 2.1, 'write_seconds': 1.4, 'seconds': 2.4}
+    """
+    def run(self, collection, ids: list[str], documents: list[str], metadatas: list[dict], embed: Callable[[list[str]], list], progress_callback=None) -> dict:
+        start_time = time.time()
+        stats = {"chunks": len(ids), "batches": 0, "embed_seconds": 0.0, "write_seconds": 0.0}
+        if not ids:
+            stats["seconds"] = 0.0
+            return stats
+
+        batches = self._batches(documents)
+        pending: list[tuple[tuple[int, int], Future]] = []
+        stored = 0
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed") as executor:
+            try:
+                while True:
+                    # keep the embedding stage busy, up to `max_in_flight` batches ahead of the writes
+                    while len(pending) < self.max_in_flight:
+                        batch = next(batches, None)
+                        if batch is None:
+                            break
+                        pending.append((batch, executor.submit(self._embed_batch, embed, documents[batch[0]:batch[1]], stats)))
+                    if not pending:
+                        break
+
+                    (begin, end), future = pending.pop(0)
+                    embeddings = future.result()
+                    write_start = time.time()
+                    collection.upsert(
+                        ids=ids[begin:end],
+                        embeddings=embeddings,
+                        documents=documents[begin:end],
+                        metadatas=metadatas[begin:end],
+                    )
+                    stats["write_seconds"] += time.time() - write_start
+                    stats["batches"] += 1
+                    stored += end - begin
+                    self._logger.debug("Indexed batch collection=%s size=%s offset=%s", collection.name, end - begin, begin)
+                    if progress_callback:
+                        progress_callback("embed", stored, len(ids))
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+        stats["seconds"] = time.time() - start_time
+        return stats
+
+    # yields (begin, end) of the next batch, cut at the current token budget (which can shrink while batches are embedded)
+    def _batches(self, documents: list[str]):
+        begin = 0
+        while begin < len(documents):
+            end = begin
+            tokens = 0
+            while end < len(documents) and end - begin < self.max_batch_size:
+                text_tokens = self.count_tokens(documents[end])
+                if end > begin and tokens + text_tokens > self.max_batch_tokens:
+                    break
+                tokens += text_tokens
+                end += 1
+            yield begin, end
+            begin = end
+
+    # runs in the embedding thread
+    def _embed_batch(self, embed: Callable[[list[str]], list], texts: list[str], stats: dict) -> list:
+        embed_start = time.time()
+        try:
+            return self._embed_or_split(embed, texts)
+        finally:
+            stats["embed_seconds"] += time.time() - embed_start
+
+    # batches the provider rejects as too large are split in half
+    def _embed_or_split(self, embed: Callable[[list[str]], list], texts: list[str]) -> list:
+        try:
+            return list(embed(texts))
+        except OpenRouterError as e:
+            if e.status_code not in BATCH_TOO_LARGE_STATUS_CODES or len(texts) == 1:
+                raise
+            tokens = sum(self.count_tokens(text) for text in texts)
+            self.max_batch_tokens = max(1, min(self.max_batch_tokens, tokens // 2))
+            self._logger.warning("Embedding batch of %s texts was rejected (status %s), splitting it. max_batch_tokens=%s", len(texts), e.status_code, self.max_batch_tokens)
+            middle = len(texts) // 2
+            return self._embed_or_split(embed, texts[:middle]) + self._embed_or_split(embed, texts[middle:])
@@ -0,0 +1,148 @@
+import logging
+import time
+from typing import Any, Callable
+
+from models.course_material_type import CourseMaterialType
+from services.file_processor import FileProcessor, ProcessingCancelled
+from services.hash_db import HashDB
+from services.vector_db import VectorDB
+
+"""
+This class runs the ingestion pipeline for one uploaded file:
+extract text (+ OCR) -> chunk and enrich -> embed and index in the Vector DB -> remember the file hash.
+
+Chunk IDs are content-addressed (see FileProcessor._chunk_id) and the HashDB keeps a manifest of the chunk IDs of every document.
+Every upload is a new document, unless the client marks it as a revised version of an existing one (`replaces`). Then only its
+new chunks are embedded and indexed, chunks that are gone are deleted, and the unchanged ones only get their metadata updated (e.g. new page numbers).
+Two different files with the same name never replace each other.
+"""
+class IngestionService:
+
+    def __init__(self, file_processor: FileProcessor, vector_db: VectorDB, hash_db: HashDB):
+        self.file_processor = file_processor
+        self.vector_db = vector_db
+        self.hash_db = hash_db
+        self._logger = logging.getLogger(__name__)
+
+    """
+    Ingests the PDF at `pdf_path`.
+
+    Input:
+        course_id... The ID of the course that the uploaded material belongs to
+        material_type... The type of the uploaded material
+        pdf_path... Path to the uploaded PDF on disk
+        file_hash... The sha256 of the PDF
+        filename (Optional)... The original name of the uploaded file
+        progress_callback (Optional)... Called as progress_callback(stage, current, total)
+        cancel_event (Optional)... A `threading.Event`, processing stops with `ProcessingCancelled` once it is set
+        replaces (Optional)... The material ID of the document that this file is a revised version of (same course and type)
+
+    Output:
+        dict... A summary of the ingestion e.g. {'chunks': 120, 'embedded': 6, 'deleted': 4, 'unchanged': 114}
+    """
+    def ingest(
+        self,
+        course_id: int,
+        material_type: CourseMaterialType,
+        pdf_path: str,
+        file_hash: str,
+        filename: str | None = None,
+        progress_callback: Callable[[str, int, int], None] | None = None,
+        cancel_event: Any | None = None,
+        replaces: str | None = None,
+    ) -> dict:
+        start_time = time.time()
+        self._logger.info("Ingestion start course_id=%s material_type=%s file=%s replaces=%s", course_id, material_type, filename, replaces)
+
+        # a new document is keyed by its own hash, a revised one keeps the key (and so the chunk IDs and manifest) of the replaced document
+        previous = None
+        material = file_hash
+        if replaces is not None:
+            previous = self.hash_db.get_material(course_id, replaces)
+            if previous is None or previous["type"] != material_type.value:
+                raise ValueError(f"Material with ID {replaces} not found in course {course_id}")
+            material = self.hash_db.material_key(previous)
+
+        # 1) Extract text, chunk it, and enrich it with metadata
+        metadata, chunks = self.file_processor.chunk_and_enrich(
+            pdf_file=pdf_path,
+            material_type=material_type,
+            course_id=course_id,
+            cancel_event=cancel_event,
+            progress_callback=progress_callback,
+            material_key=material,
+        )
+        if cancel_event is not None and cancel_event.is_set():
+            raise ProcessingCancelled("Ingestion was cancelled before indexing")
+
+        # every chunk records the document (and the version of it) that it came from
+        material_id = self.hash_db.material_id(material_type, material)
+        for entry in metadata:
+            entry["file_hash"] = file_hash
+            entry["material_id"] = material_id
+
+        # 2) Diff the chunks against the last ingested version of the document
+        manifest = self.hash_db.get_chunk_manifest(course_id=course_id, type=material_type, material=material)
+        previous_ids = set(manifest["chunk_ids"]) if manifest else set()
+        current_ids = {chunk.id for chunk in chunks}
+        # the manifest could list chunks that are no longer stored (e.g. after `delete_course_data`), those are indexed again
+        stored_ids = self.vector_db.existing_chunk_ids(material_type, sorted(previous_ids & current_ids)) if previous_ids else set()
+
+        new = [(chunk, entry) for chunk, entry in zip(chunks, metadata) if chunk.id not in stored_ids]
+        unchanged = [(chunk, entry) for chunk, entry in zip(chunks, metadata) if chunk.id in stored_ids]
+        removed_ids = sorted(previous_ids - current_ids)
+
+        # 3) Save the new chunks in the Vector DB, delete the removed ones
+        new_chunks = [chunk for chunk, _ in new]
+        new_metadata = [entry for _, entry in new]
+        if material_type == CourseMaterialType.EXAM:
+            self.vector_db.index_old_exam_questions(new_chunks, new_metadata, progress_callback=progress_callback)
+        else:
+            self.vector_db.index_course_material(new_chunks, new_metadata, progress_callback=progress_callback)
+        self.vector_db.update_chunk_metadata(material_type, [chunk for chunk, _ in unchanged], [entry for _, entry in unchanged])
+        self.vector_db.delete_chunks(material_type, course_id, removed_ids)
+
+        # 4) Remember the file, so it can't be uploaded twice. The hash of the replaced version is forgotten
+        if progress_callback:
+            progress_callback("index", 1, 1)
+        self.hash_db.save_chunk_manifest(course_id=course_id, type=material_type, material=material, file_hash=file_hash, chunk_ids=[chunk.id for chunk in chunks])
+        replaced_hashes = {previous["hash"]} if previous is not None else set()
+        if manifest:
+            replaced_hashes.add(manifest["file_hash"])
+        for replaced_hash in sorted(replaced_hashes - {file_hash}):
+            self.hash_db.remove_file_hash(course_id=course_id, hash=replaced_hash)
+        self.hash_db.add_file_hash(course_id=course_id, hash=file_hash, type=material_type, filename=filename, material=material)
+
+        self._logger.info(
+            "Ingestion complete course_id=%s material_type=%s chunks=%s embedded=%s deleted=%s unchanged=%s duration=%.2fs",
+            course_id,
+            material_type,
+            len(chunks),
+            len(new_chunks),
+            len(removed_ids),
+            len(unchanged),
+            time.time() - start_time,
+        )
+        return {"chunks": len(chunks), "embedded": len(new_chunks), "deleted": len(removed_ids), "unchanged": len(unchanged)}
+
+    """
+    Removes an uploaded document from a course: its chunks from the Vector DB, then its hashes and chunk manifest from the HashDB.
+
+    Input:
+        course_id... The ID of the course
+        material_id... The ID of the document (see `HashDB.material_id`)
+
+    Output:
+        dict | None... A summary e.g. {'filename': 'rl.pdf', 'type': 'slides', 'deleted': 120}, None if the document doesn't exist
+    """
+    def remove_material(self, course_id: int, material_id: str) -> dict | None:
+        material = self.hash_db.get_material(course_id, material_id)
+        if material is None:
+            return None
+
+        material_type = CourseMaterialType(material["type"])
+        deleted = self.vector_db.delete_material(material_type, course_id, material_id)
+        self.hash_db.remove_material(course_id, material_id)
+
+        self._logger.info("Removed material course_id=%s material_id=%s file=%s chunks=%s", course_id, material_id, material.get("filename"), deleted)
+        return {"filename": material.get("filename"), "type": material_type.value, "deleted": deleted}
@@ -0,0 +1,196 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+from models.course_material_type import CourseMaterialType
+from models.ingestion_job import IngestionJob, JobStatus
+from services.file_processor import ProcessingCancelled
+from services.ingestion_service import IngestionService
+from services.job_store import JobStore
+
+"""
+This class runs ingestion jobs in background worker threads.
+
+An upload is stored in `upload_dir` and a job is created in the `JobStore`, then the HTTP request can return right away.
+The workers report the progress of their job (stage + current/total) to the `JobStore`, where it can be polled.
+The number of workers is independent of the API executors, so ingestion throughput can be scaled separately from API latency.
+"""
+class IngestionJobQueue:
+
+    def __init__(
+        self,
+        job_store: JobStore,
+        ingestion_service: IngestionService,
+        upload_dir: str = "data/uploads",
+        workers: int = 2,
+        progress_interval: float = 0.5,
+    ):
+        if workers <= 0:
+            raise ValueError("workers must be positive")
+
+        self.job_store = job_store
+        self.ingestion_service = ingestion_service
+        self.upload_dir = upload_dir
+        self.workers = workers
+        self.progress_interval = progress_interval  # min. seconds between two progress writes of the same stage
+        self._queue: queue.Queue[str | None] = queue.Queue()
+        self._cancel_events: dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._threads: list[threading.Thread] = []
+        self._stopping = False
+        self._logger = logging.getLogger(__name__)
+        os.makedirs(self.upload_dir, exist_ok=True)
+
+    # starts the worker threads and re-queues jobs that didn't finish before the last shutdown
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stopping = False
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"ingestion-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self.resume_unfinished_jobs()
+
+    # stops the workers. Running jobs are interrupted and queued again, so that they are resumed after the next start
+    def shutdown(self, wait: bool = True) -> None:
+        self._stopping = True
+        with self._lock:
+            for event in self._cancel_events.values():
+                event.set()
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+    """
+    Queues a new ingestion job for an uploaded PDF.
+
+    Input:
+        pdf_path... the spooled upload (see `UploadSpooler`). It is moved into `upload_dir`, not copied,
+                    so it should be on the same file system (ideally in `upload_dir` already)
+        replaces (Optional)... the material ID of the document that the upload is a revised version of
+
+    Output:
+        IngestionJob... the queued job, its `job_id` can be used to poll the progress
+    """
+    def submit(self, course_id: int, material_type: CourseMaterialType, file_hash: str, pdf_path: str, filename: str | None = None, replaces: str | None = None) -> IngestionJob:
+        job = self.job_store.create_job(course_id=course_id, material_type=material_type.value, file_hash=file_hash, filename=filename, replaces=replaces)
+        try:
+            os.replace(pdf_path, self._upload_path(job.job_id))
+        except OSError as e:
+            self.job_store.mark_failed(job.job_id, f"Could not store the uploaded file: {e}")
+            raise
+
+        self._queue.put(job.job_id)
+        self._logger.info("Queued ingestion job %s course_id=%s material_type=%s file=%s", job.job_id, course_id, material_type, filename)
+        return job
+
+    # cancels a queued or running job, returns False if the job already finished
+    def cancel(self, job_id: str) -> bool:
+        cancelled = self.job_store.mark_cancelled(job_id)
+        with self._lock:
+            event = self._cancel_events.get(job_id)
+        if event is not None:
+            event.set()
+        return cancelled
+
+    # queues all unfinished jobs again. Jobs whose uploaded file is gone are marked as failed
+    def resume_unfinished_jobs(self) -> int:
+        resumed = 0
+        for job in self.job_store.find_unfinished_jobs():
+            if not os.path.exists(self._upload_path(job.job_id)):
+                self.job_store.mark_failed(job.job_id, "The uploaded file was lost during a restart, please upload it again")
+                continue
+            self.job_store.mark_queued(job.job_id)
+            self._queue.put(job.job_id)
+            resumed += 1
+
+        if resumed:
+            self._logger.info("Resumed %s unfinished ingestion jobs", resumed)
+        return resumed
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _worker_loop(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                break
+            try:
+                self._run_job(job_id)
+            except Exception:
+                self._logger.exception("Ingestion worker crashed on job %s", job_id)
+
+    def _run_job(self, job_id: str) -> None:
+        job = self.job_store.mark_running(job_id)
+        if job is None:
+            # cancelled while it was queued
+            self._remove_upload(job_id)
+            return
+
+        cancel_event = threading.Event()
+        with self._lock:
+            self._cancel_events[job_id] = cancel_event
+
+        keep_upload = False
+        try:
+            result = self.ingestion_service.ingest(
+                course_id=job.course_id,
+                material_type=CourseMaterialType(job.material_type),
+                pdf_path=self._upload_path(job_id),
+                file_hash=job.file_hash,
+                filename=job.filename,
+                progress_callback=self._progress_reporter(job_id),
+                cancel_event=cancel_event,
+                replaces=job.replaces,
+            )
+            if not self.job_store.mark_completed(job_id, result=result):
+                # the indexing can't be interrupted, a cancel that arrived during it only shows up here
+                self._logger.info("Ingestion job %s was cancelled while its chunks were indexed", job_id)
+        except ProcessingCancelled:
+            # jobs cancelled by a user are already marked as cancelled, only jobs interrupted by a shutdown are still running
+            current = self.job_store.get_job(job_id)
+            if self._stopping and current is not None and current.status == JobStatus.RUNNING:
+                self._logger.info("Ingestion job %s interrupted by shutdown, it will be resumed", job_id)
+                self.job_store.mark_queued(job_id)
+                keep_upload = True
+            else:
+                self._logger.info("Ingestion job %s cancelled", job_id)
+                self.job_store.mark_cancelled(job_id)
+        except Exception as e:
+            self._logger.exception("Ingestion job %s failed", job_id)
+            self.job_store.mark_failed(job_id, str(e) or type(e).__name__)
+        finally:
+            with self._lock:
+                self._cancel_events.pop(job_id, None)
+            if not keep_upload:
+                self._remove_upload(job_id)
+
+    # returns a progress_callback that writes to the JobStore, but at most every `progress_interval` seconds per stage
+    def _progress_reporter(self, job_id: str):
+        last = {"stage": None, "time": 0.0}
+
+        def report(stage: str, current: int, total: int) -> None:
+            now = time.monotonic()
+            if stage == last["stage"] and current < total and now - last["time"] < self.progress_interval:
+                return
+            last["stage"] = stage
+            last["time"] = now
+            self.job_store.update_progress(job_id, stage, current, total)
+
+        return report
+
+    def _upload_path(self, job_id: str) -> str:
+        return os.path.join(self.upload_dir, f"{job_id}.pdf")
+
+    def _remove_upload(self, job_id: str) -> None:
+        try:
+            os.remove(self._upload_path(job_id))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,109 @@
+import os
+import time
+import uuid
+from pymongo import MongoClient, ReturnDocument, errors
+from models.ingestion_job import IngestionJob, JobStatus
+
+ACTIVE_STATUSES = [JobStatus.QUEUED.value, JobStatus.RUNNING.value]
+
+"""
+This class persists the state of ingestion jobs in Mongo (next to the HashDB hashes),
+so that a restarted backend can resume unfinished jobs or at least report what happened to them.
+"""
+class JobStore:
+
+    def __init__(self, mongo_url: str | None = None, client: MongoClient | None = None):
+        mongo_url = mongo_url or os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+        self.client = client or MongoClient(mongo_url)
+        self.db = self.client["hash_db"]
+        self.collection = self.db["jobs"]
+        try:
+            self.collection.create_index("job_id", unique=True)
+            self.collection.create_index("status")
+        except errors.PyMongoError:
+            # best-effort, lookups still work without the index
+            pass
+
+    # creates a new queued job and returns it
+    def create_job(self, course_id: int, material_type: str, file_hash: str, filename: str | None = None, replaces: str | None = None) -> IngestionJob:
+        now = time.time()
+        job = IngestionJob(
+            job_id=uuid.uuid4().hex,
+            course_id=course_id,
+            material_type=material_type,
+            filename=filename,
+            file_hash=file_hash,
+            replaces=replaces,
+            created_at=now,
+            updated_at=now,
+        )
+        self.collection.insert_one(self._to_document(job))
+        return job
+
+    # returns the job with `job_id` or None if it doesn't exist
+    def get_job(self, job_id: str) -> IngestionJob | None:
+        document = self.collection.find_one({"job_id": job_id})
+        return self._from_document(document) if document else None
+
+    # returns a queued/running job for the same file in the same course, so that we don't ingest a file twice in parallel
+    def find_active_job(self, course_id: int, file_hash: str) -> IngestionJob | None:
+        document = self.collection.find_one({"course_id": course_id, "file_hash": file_hash, "status": {"$in": ACTIVE_STATUSES}})
+        return self._from_document(document) if document else None
+
+    # returns all jobs that were queued or running, e.g. when the backend was stopped in the middle of an upload
+    def find_unfinished_jobs(self) -> list[IngestionJob]:
+        documents = self.collection.find({"status": {"$in": ACTIVE_STATUSES}}).sort("created_at", 1)
+        return [self._from_document(document) for document in documents]
+
+    # marks the job as running, increments its attempts and returns the updated job
+    def mark_running(self, job_id: str) -> IngestionJob | None:
+        document = self.collection.find_one_and_update(
+            {"job_id": job_id, "status": {"$in": ACTIVE_STATUSES}},
+            {"$set": {"status": JobStatus.RUNNING.value, "error": None, "updated_at": time.time()}, "$inc": {"attempts": 1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        return self._from_document(document) if document else None
+
+    def update_progress(self, job_id: str, stage: str, current: int, total: int) -> None:
+        self.collection.update_one(
+            {"job_id": job_id},
+            {"$set": {"stage": stage, "progress": {"current": current, "total": total}, "updated_at": time.time()}},
+        )
+
+    def mark_queued(self, job_id: str) -> None:
+        self._set_status(job_id, JobStatus.QUEUED)
+
+    # completes a running job. Returns False if it was cancelled in the meantime, the cancel is kept then
+    def mark_completed(self, job_id: str, result: dict) -> bool:
+        update = self.collection.update_one(
+            {"job_id": job_id, "status": JobStatus.RUNNING.value},
+            {"$set": {"status": JobStatus.COMPLETED.value, "result": result, "updated_at": time.time()}},
+        )
+        return update.modified_count > 0
+
+    def mark_failed(self, job_id: str, error: str) -> None:
+        self._set_status(job_id, JobStatus.FAILED, error=error)
+
+    # cancels a job, unless it already finished. Returns whether the job was cancelled
+    def mark_cancelled(self, job_id: str) -> bool:
+        result = self.collection.update_one(
+            {"job_id": job_id, "status": {"$in": ACTIVE_STATUSES}},
+            {"$set": {"status": JobStatus.CANCELLED.value, "updated_at": time.time()}},
+        )
+        return result.modified_count > 0
+
+    def _set_status(self, job_id: str, status: JobStatus, **fields) -> None:
+        self.collection.update_one(
+            {"job_id": job_id},
+            {"$set": {"status": status.value, "updated_at": time.time(), **fields}},
+        )
+
+    def _to_document(self, job: IngestionJob) -> dict:
+        document = dict(job.__dict__)
+        document["status"] = job.status.value
+        return document
+
+    def _from_document(self, document: dict) -> IngestionJob:
+        fields = {key: value for key, value in document.items() if key in IngestionJob.__dataclass_fields__}
+        fields["status"] = JobStatus(fields["status"])
+        return IngestionJob(**fields)
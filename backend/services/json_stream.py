@@ -0,0 +1,88 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+"""
+This class parses a JSON array of objects incrementally, e.g. while an LLM reply is streamed in.
+
+Text is passed to `feed()` piece by piece; every object of the top-level array is returned as soon as its closing brace arrived.
+Anything before the opening `[` (like a markdown code fence) is ignored.
+"""
+class IncrementalJSONArrayParser:
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0 # next position in the buffer that hasn't been scanned yet
+        self._started = False # whether the opening `[` of the array was found
+        self._depth = 0 # nesting depth of {} and [] inside the top-level array
+        self._in_string = False
+        self._escape = False
+        self._object_start: int | None = None
+        self.finished = False # whether the closing `]` of the array was found
+        self.n_invalid = 0 # number of skipped objects that weren't valid JSON
+
+    """
+    Adds `text` to the parsed input.
+
+    Output:
+        list[dict]... all objects of the array that were completed by `text`
+    """
+    def feed(self, text: str) -> list[dict]:
+        if self.finished or not text:
+            return []
+
+        self._buffer += text
+        completed: list[dict] = []
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer):
+            ch = buffer[i]
+            if not self._started:
+                if ch == "[":
+                    self._started = True
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._depth == 0 and ch == "{":
+                    self._object_start = i
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 0:
+                    # closing bracket of the top-level array
+                    self.finished = True
+                    break
+                self._depth -= 1
+                if self._depth == 0 and self._object_start is not None:
+                    completed_object = self._load(buffer[self._object_start:i + 1])
+                    if completed_object is not None:
+                        completed.append(completed_object)
+                    self._object_start = None
+            i += 1
+
+        # drop text that we don't need anymore, but keep an unfinished object
+        keep_from = self._object_start if self._object_start is not None else i
+        self._buffer = buffer[keep_from:]
+        self._pos = i - keep_from
+        if self._object_start is not None:
+            self._object_start = 0
+        return completed
+
+    def _load(self, text: str) -> dict | None:
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError as e:
+            self.n_invalid += 1
+            logger.warning(f"Skipping invalid JSON object in streamed response: {e}")
+            return None
+        if not isinstance(value, dict):
+            self.n_invalid += 1
+            return None
+        return value
@@ -0,0 +1,165 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+try:  # the local embedding backend needs the optional `onnxruntime` and `tokenizers` packages
+    import onnxruntime
+except Exception:  # pragma: no cover - optional dependency
+    onnxruntime = None
+
+try:
+    from tokenizers import Tokenizer
+except Exception:  # pragma: no cover - optional dependency
+    Tokenizer = None
+
+# int8 (dynamically quantized) exports first, the fp32 export is only used if there is no quantized one
+MODEL_FILES_QUANTIZED = ("onnx/model_quantized.onnx", "onnx/model_int8.onnx", "model_quantized.onnx", "model_int8.onnx")
+MODEL_FILES_FP32 = ("onnx/model.onnx", "model.onnx")
+
+
+"""
+Embeds texts on the CPU with a small sentence-embedding model (e.g. all-MiniLM-L6-v2) in ONNX Runtime, without any network calls.
+
+The model directory needs a `tokenizer.json` and an ONNX export of the model, preferably the int8 quantized one
+(the `Xenova/...` repos on the Hugging Face Hub ship both). Without `model_dir`, `model_name` is downloaded from the Hub once.
+
+Texts are sorted by length and split into batches of `batch_size`, every batch is only padded to its own longest text
+(dynamic padding), and the batches run on `threads` threads (ONNX Runtime releases the GIL).
+The token embeddings are mean pooled and normalized, so cosine similarity works like with the remote embeddings.
+"""
+class OnnxEmbeddingFunction(EmbeddingFunction[Documents]):
+
+    def __init__(
+        self,
+        model_name: str = "Xenova/all-MiniLM-L6-v2",
+        model_dir: str | None = None,
+        quantized: bool = True,
+        max_length: int = 256,
+        batch_size: int = 32,
+        threads: int | None = None,
+        session: Any | None = None,
+        tokenizer: Any | None = None,
+    ):
+        self.model_name = model_name
+        self.quantized = quantized
+        self.max_length = max(1, max_length)
+        self.batch_size = max(1, batch_size)
+        self.threads = max(1, threads or min(4, os.cpu_count() or 1))
+        self._logger = logging.getLogger(__name__)
+
+        if session is None or tokenizer is None:
+            if onnxruntime is None or Tokenizer is None:
+                raise RuntimeError("The local embedding backend needs the onnxruntime and tokenizers packages")
+            model_dir = model_dir or self._download(model_name)
+            model_path = self._model_path(model_dir, quantized)
+            if session is None:
+                options = onnxruntime.SessionOptions()
+                # the parallelism comes from the batches that run side by side, one thread per batch
+                options.intra_op_num_threads = 1
+                options.inter_op_num_threads = 1
+                session = onnxruntime.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+            if tokenizer is None:
+                tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+            self._logger.info("Loaded local embedding model %s from %s threads=%s", model_name, model_path, self.threads)
+
+        tokenizer.no_padding()
+        tokenizer.enable_truncation(max_length=self.max_length)
+        self.session = session
+        self.tokenizer = tokenizer
+        self._input_names = {model_input.name for model_input in session.get_inputs()}
+        self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="local-embed")
+
+    # the name the embeddings are stored under (collections, embedding cache), quantized and fp32 vectors are not mixed
+    @property
+    def model_id(self) -> str:
+        return f"{self.model_name.rsplit('/', 1)[-1]}{'-int8' if self.quantized else ''}"
+
+    def __call__(self, input: Documents) -> Embeddings:
+        texts = list(input)
+        if not texts:
+            return []
+
+        encodings = self.tokenizer.encode_batch(texts)
+        # similar lengths end up in the same batch, so there is little padding
+        order = sorted(range(len(texts)), key=lambda i: len(encodings[i].ids))
+        batches = [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+
+        vectors: list[np.ndarray | None] = [None] * len(texts)
+        for batch, embeddings in zip(batches, self._executor.map(lambda batch: self._embed_batch([encodings[i] for i in batch]), batches)):
+            for i, embedding in zip(batch, embeddings):
+                vectors[i] = embedding
+        return vectors
+
+    def _embed_batch(self, encodings: list) -> np.ndarray:
+        length = max(1, max(len(encoding.ids) for encoding in encodings))
+        input_ids = np.zeros((len(encodings), length), dtype=np.int64)
+        attention_mask = np.zeros((len(encodings), length), dtype=np.int64)
+        for row, encoding in enumerate(encodings):
+            input_ids[row, : len(encoding.ids)] = encoding.ids
+            attention_mask[row, : len(encoding.ids)] = 1
+
+        feed = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feed["token_type_ids"] = np.zeros_like(input_ids)
+        output = np.asarray(self.session.run(None, {name: value for name, value in feed.items() if name in self._input_names})[0], dtype=np.float32)
+
+        if output.ndim == 3:
+            # mean pooling over the real tokens (last_hidden_state), some exports already return the sentence embedding
+            mask = attention_mask[:, :, None].astype(np.float32)
+            output = (output * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        return output / np.maximum(norms, 1e-12)
+
+    def _download(self, model_name: str) -> str:
+        try:
+            from huggingface_hub import snapshot_download
+        except Exception as e:  # pragma: no cover - optional dependency
+            raise RuntimeError("Set LOCAL_EMBEDDING_MODEL_DIR or install huggingface_hub to download the local embedding model") from e
+        patterns = ["tokenizer.json", "config.json", *(MODEL_FILES_QUANTIZED if self.quantized else ()), *MODEL_FILES_FP32]
+        return snapshot_download(model_name, allow_patterns=patterns)
+
+    def _model_path(self, model_dir: str, quantized: bool) -> str:
+        candidates = (MODEL_FILES_QUANTIZED if quantized else ()) + MODEL_FILES_FP32
+        for candidate in candidates:
+            path = os.path.join(model_dir, candidate)
+            if os.path.exists(path):
+                if quantized and candidate in MODEL_FILES_FP32:
+                    return self._quantize(path)
+                return path
+        raise FileNotFoundError(f"No ONNX model found in {model_dir} (looked for {', '.join(candidates)})")
+
+    # int8 dynamic quantization of an fp32 export, done once and stored next to it
+    def _quantize(self, path: str) -> str:
+        quantized_path = path[: -len(".onnx")] + "_int8.onnx"
+        if not os.path.exists(quantized_path):
+            try:
+                from onnxruntime.quantization import QuantType, quantize_dynamic
+            except Exception as e:  # pragma: no cover - optional dependency
+                raise RuntimeError(f"{path} is not quantized and onnxruntime can't quantize it here, use an int8 export") from e
+            self._logger.info("Quantizing %s to int8", path)
+            quantize_dynamic(path, quantized_path, weight_type=QuantType.QInt8)
+        return quantized_path
+
+    @staticmethod
+    def name() -> str:
+        return "local-onnx"
+
+    def get_config(self) -> dict[str, Any]:
+        return {"model_name": self.model_name, "quantized": self.quantized, "max_length": self.max_length}
+
+    @staticmethod
+    def build_from_config(config: dict[str, Any]) -> "OnnxEmbeddingFunction":
+        return OnnxEmbeddingFunction(model_name=config["model_name"], quantized=config.get("quantized", True), max_length=config.get("max_length", 256))
+
+    def is_legacy(self) -> bool:
+        return False
+
+    def default_space(self) -> str:
+        return "cosine"
+
+    def supported_spaces(self) -> list[str]:
+        return ["cosine", "l2", "ip"]
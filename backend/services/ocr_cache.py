@@ -0,0 +1,147 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+
+@dataclass
+class OcrResult:
+    text: str
+    lang: str | None
+    rotation: int = 0 # degrees the page was rotated by before the OCR (0 for region OCR)
+    failed: bool = False # rendering or Tesseract failed, such results are not cached
+    confidence: float = -1.0 # mean word confidence of Tesseract (0..100, -1 if unknown)
+    tesseract_calls: int = 0 # calls to Tesseract that this result took (0 for cached results)
+
+
+"""
+This class is a persistent cache for OCR results, so a page that was OCR'd once (e.g. the same lecture PDF uploaded to
+another course, or re-ingested after its course data was deleted) never goes through Tesseract again.
+
+Results are keyed by a hash of the page content and the OCR settings (see FileProcessor._ocr_cache_key) and stored in a SQLite file.
+If the stored texts grow larger than `max_bytes`, the least recently used entries are evicted. The total size is kept in a meta row
+that every put and eviction updates in the same transaction, so it stays right when several processes write to the file.
+The cache can be used from several threads. It is copied into the OCR worker processes together with the FileProcessor,
+so every process opens its own connection.
+"""
+class OcrCache:
+
+    def __init__(self, db_path: str = "data/ocr_cache.sqlite3", max_bytes: int = 512 * 1024 * 1024):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.db_path = db_path
+        self.max_bytes = max(0, max_bytes)
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger(__name__)
+        self._connection = None
+        self._pid = None
+
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_results ("
+                "key TEXT PRIMARY KEY, text TEXT NOT NULL, lang TEXT, rotation INTEGER NOT NULL, "
+                "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS ocr_results_last_used ON ocr_results (last_used)")
+            connection.execute("CREATE TABLE IF NOT EXISTS ocr_cache_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            # recounted once at startup, also fills it in for caches that were written before the meta row existed
+            connection.execute(
+                "INSERT OR REPLACE INTO ocr_cache_meta (name, value) VALUES ('total_size', (SELECT COALESCE(SUM(size), 0) FROM ocr_results))"
+            )
+            connection.commit()
+
+        # counters since startup (of this process)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> OcrResult | None:
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute("SELECT text, lang, rotation FROM ocr_results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            connection.execute("UPDATE ocr_results SET last_used = ? WHERE key = ?", (time.time(), key))
+            connection.commit()
+        return OcrResult(text=row[0], lang=row[1], rotation=row[2])
+
+    def put(self, key: str, result: OcrResult) -> None:
+        size = len(result.text.encode("utf-8")) + len(key)
+        with self._lock:
+            connection = self._connect()
+            # the write lock is taken right away, so no other process changes the entry (or the total) in between
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                replaced = connection.execute("SELECT size FROM ocr_results WHERE key = ?", (key,)).fetchone()
+                connection.execute(
+                    "INSERT OR REPLACE INTO ocr_results (key, text, lang, rotation, size, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, result.text, result.lang, result.rotation, size, time.time()),
+                )
+                self._add_to_total(connection, size - (replaced[0] if replaced else 0))
+                self._evict(connection)
+                connection.commit()
+            except BaseException:
+                connection.rollback()
+                raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            connection = self._connect()
+            count = connection.execute("SELECT COUNT(*) FROM ocr_results").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "entries": count, "bytes": self._total_size(connection)}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    # the OCR workers get a copy of the FileProcessor (and this cache), they have to open their own connection
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        state["_pid"] = None
+        state["_lock"] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    # must be called while holding self._lock
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None or self._pid != os.getpid():
+            # a connection inherited from the parent process (fork) must not be used
+            self._connection = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._pid = os.getpid()
+        return self._connection
+
+    def _total_size(self, connection: sqlite3.Connection) -> int:
+        row = connection.execute("SELECT value FROM ocr_cache_meta WHERE name = 'total_size'").fetchone()
+        return row[0] if row else 0
+
+    def _add_to_total(self, connection: sqlite3.Connection, delta: int) -> None:
+        connection.execute("UPDATE ocr_cache_meta SET value = value + ? WHERE name = 'total_size'", (delta,))
+
+    # must be called while holding self._lock, inside the transaction of the put
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        total = self._total_size(connection)
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        evicted = []
+        for key, size in connection.execute("SELECT key, size FROM ocr_results ORDER BY last_used"):
+            evicted.append((key,))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+        connection.executemany("DELETE FROM ocr_results WHERE key = ?", evicted)
+        self._add_to_total(connection, -freed)
+        self._logger.debug("OCR cache evicted entries=%s bytes=%s", len(evicted), freed)
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import logging
+import re
+import threading
+from abc import ABC, abstractmethod
+from typing import Any
+
+try:
+    import pytesseract
+except Exception:  # pragma: no cover - optional dependency
+    pytesseract = None
+
+try:
+    import tesserocr
+except Exception:  # pragma: no cover - optional dependency
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+
+"""
+The way the FileProcessor talks to Tesseract. Images are PIL images or 2D uint8 arrays (grayscale).
+
+`calls` counts the Tesseract calls of this process, so the logs can show how many calls a page needed.
+"""
+class OcrEngine(ABC):
+
+    name: str = ""
+
+    def __init__(self):
+        self.calls = 0
+
+    @abstractmethod
+    def version(self) -> str:
+        ...
+
+    @abstractmethod
+    def languages(self) -> list[str]:
+        ...
+
+    # Returns the text and the mean word confidence (0..100, -1 if there are no words)
+    @abstractmethod
+    def recognize(self, image: Any, lang: str, psm: str, dpi: int | None = None) -> tuple[str, float]:
+        ...
+
+    # Returns the text only (previews and probes, where the layout and confidence don't matter)
+    @abstractmethod
+    def quick_text(self, image: Any, lang: str, psm: str) -> str:
+        ...
+
+    # Returns the clockwise rotation in degrees (0, 90, 180, 270) that makes the text upright
+    @abstractmethod
+    def detect_rotation(self, image: Any) -> int:
+        ...
+
+
+"""
+Runs the tesseract binary through pytesseract: every call starts a new tesseract process (and loads the language models again).
+"""
+class PytesseractEngine(OcrEngine):
+
+    name = "pytesseract"
+
+    def version(self) -> str:
+        return str(pytesseract.get_tesseract_version())
+
+    def languages(self) -> list[str]:
+        return pytesseract.get_languages(config="")
+
+    def recognize(self, image: Any, lang: str, psm: str, dpi: int | None = None) -> tuple[str, float]:
+        self.calls += 1
+        config = f"--oem 1 --psm {psm} -c preserve_interword_spaces=1"
+        if dpi:
+            config += f" -c user_defined_dpi={dpi}"
+        data = pytesseract.image_to_data(image, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+        return _text_from_data(data), _mean_confidence(data["conf"], data["text"])
+
+    def quick_text(self, image: Any, lang: str, psm: str) -> str:
+        self.calls += 1
+        return pytesseract.image_to_string(image, lang=lang, config=f"--oem 1 --psm {psm}")
+
+    def detect_rotation(self, image: Any) -> int:
+        self.calls += 1
+        osd = pytesseract.image_to_osd(image, config="--psm 0")
+        match = re.search(r"Rotate:\s*(\d+)", osd)
+        return int(match.group(1)) % 360 if match else 0
+
+
+"""
+Keeps tesseract loaded in-process through tesserocr: one API handle per thread and (language, page segmentation mode),
+so no process is started and no language model is loaded per call.
+"""
+class TesserocrEngine(OcrEngine):
+
+    name = "tesserocr"
+
+    def __init__(self):
+        super().__init__()
+        self._local = threading.local()
+
+    def version(self) -> str:
+        return tesserocr.tesseract_version().splitlines()[0]
+
+    def languages(self) -> list[str]:
+        return list(tesserocr.get_languages()[1])
+
+    def recognize(self, image: Any, lang: str, psm: str, dpi: int | None = None) -> tuple[str, float]:
+        self.calls += 1
+        api = self._api(lang, psm)
+        api.SetImage(_to_pil(image))
+        if dpi:
+            api.SetSourceResolution(dpi)
+        text = api.GetUTF8Text()
+        confidences = api.AllWordConfidences()
+        return text.strip(), (sum(confidences) / len(confidences)) if confidences else -1.0
+
+    def quick_text(self, image: Any, lang: str, psm: str) -> str:
+        self.calls += 1
+        api = self._api(lang, psm)
+        api.SetImage(_to_pil(image))
+        return api.GetUTF8Text()
+
+    def detect_rotation(self, image: Any) -> int:
+        self.calls += 1
+        api = self._api("osd", "0")
+        api.SetImage(_to_pil(image))
+        result = api.DetectOrientationScript()
+        # orient_deg is tesseract's "Orientation in degrees", the rotation that fixes it is the "Rotate" of image_to_osd
+        return (360 - int(result["orient_deg"])) % 360 if result else 0
+
+    def _api(self, lang: str, psm: str):
+        handles = getattr(self._local, "handles", None)
+        if handles is None:
+            handles = self._local.handles = {}
+        api = handles.get((lang, psm))
+        if api is None:
+            api = tesserocr.PyTessBaseAPI(lang=lang, psm=int(psm), oem=tesserocr.OEM.LSTM_ONLY)
+            handles[(lang, psm)] = api
+        return api
+
+    # the handles belong to the process that created them, a copy (e.g. for an OCR worker) creates its own
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+
+def _to_pil(image: Any) -> Any:
+    from PIL import Image
+
+    return image if isinstance(image, Image.Image) else Image.fromarray(image)
+
+
+# rebuilds the text of an image_to_data result: words of a line joined by spaces, lines by newlines, blocks by blank lines
+def _text_from_data(data: dict) -> str:
+    lines: list[str] = []
+    current_key = None
+    current_block = None
+    words: list[str] = []
+    for i, word in enumerate(data["text"]):
+        if not word or not word.strip():
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        if key != current_key:
+            if words:
+                lines.append(" ".join(words))
+            if current_block is not None and data["block_num"][i] != current_block:
+                lines.append("")
+            current_key, current_block, words = key, data["block_num"][i], []
+        words.append(word)
+    if words:
+        lines.append(" ".join(words))
+    return "\n".join(lines).strip()
+
+
+def _mean_confidence(confidences: list, words: list) -> float:
+    values = [float(conf) for conf, word in zip(confidences, words) if word and word.strip() and float(conf) >= 0]
+    return sum(values) / len(values) if values else -1.0
+
+
+OCR_ENGINES = {
+    "pytesseract": PytesseractEngine,
+    "tesserocr": TesserocrEngine,
+}
+
+
+"""
+Returns the engine for `requested` ("pytesseract" or "tesserocr").
+tesserocr is optional, if it isn't installed pytesseract is used.
+"""
+def create_ocr_engine(requested: str | None) -> OcrEngine:
+    name = (requested or "pytesseract").strip().lower()
+    if name not in OCR_ENGINES:
+        raise ValueError(f"Unknown OCR engine '{requested}', use one of {sorted(OCR_ENGINES)}")
+    if name == "tesserocr" and tesserocr is None:
+        logger.warning("tesserocr is not installed, falling back to the pytesseract OCR engine")
+        name = "pytesseract"
+    return OCR_ENGINES[name]()
@@ -0,0 +1,120 @@
+"""
+NumPy versions of the image preprocessing that runs before Tesseract (see FileProcessor._prepare_image_for_ocr).
+Pages are kept as 2D uint8 arrays (grayscale) the whole way, PIL is only used for resizing.
+"""
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+
+try:
+    from PIL import Image
+except Exception:  # pragma: no cover - optional dependency
+    Image = None
+
+
+# Returns the samples of a PyMuPDF pixmap as an (height, width) grayscale array.
+# Gray pixmaps without alpha are returned as a view on the pixmap's buffer (no copy), so the array is only valid as long as
+# the pixmap is alive. Pass copy=True if the array has to outlive the pixmap.
+def pixmap_to_gray(pix: Any, copy: bool = False) -> np.ndarray:
+    samples = np.frombuffer(pix.samples_mv, dtype=np.uint8)
+    samples = samples.reshape(pix.height, pix.stride)[:, : pix.width * pix.n].reshape(pix.height, pix.width, pix.n)
+    if pix.alpha:
+        samples = samples[:, :, :-1]
+    if samples.shape[2] == 1:
+        gray = samples[:, :, 0]
+        return gray.copy() if copy else gray
+    return rgb_to_gray(samples)
+
+
+# ITU-R 601-2 luma, with the same integer weights (and rounding) as PIL's convert("L")
+def rgb_to_gray(rgb: np.ndarray) -> np.ndarray:
+    rgb = rgb.astype(np.uint32)
+    gray = (rgb[:, :, 0] * 19595 + rgb[:, :, 1] * 38470 + rgb[:, :, 2] * 7471 + 0x8000) >> 16
+    return gray.astype(np.uint8)
+
+
+# LUT that stretches the gray values of an image with histogram `hist` to 0..255 (like PIL's ImageOps.autocontrast without cutoff)
+def autocontrast_lut(hist: np.ndarray) -> np.ndarray:
+    identity = np.arange(256, dtype=np.uint8)
+    present = np.flatnonzero(hist)
+    if len(present) == 0 or present[-1] <= present[0]:
+        return identity
+    lo, hi = present[0], present[-1]
+    return np.clip((identity.astype(np.float64) - lo) * (255.0 / (hi - lo)) + 0.5, 0, 255).astype(np.uint8)
+
+
+# resizes the image so its longest edge is between min_dim and max_dim
+def fit_to_size(gray: np.ndarray, min_dim: int, max_dim: int) -> np.ndarray:
+    height, width = gray.shape
+    long_edge = max(height, width)
+    if min_dim <= long_edge <= max_dim or long_edge == 0:
+        return gray
+    scale = (min_dim if long_edge < min_dim else max_dim) / float(long_edge)
+    size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    resampling = Image.Resampling if hasattr(Image, "Resampling") else Image
+    # area averaging (BOX) is enough to shrink text before it is binarized, and a lot cheaper than LANCZOS
+    resample = resampling.BOX if scale < 1 else resampling.LANCZOS
+    return np.asarray(Image.fromarray(np.ascontiguousarray(gray)).resize(size, resample=resample))
+
+
+# Otsu's threshold of a 256-bin histogram: the gray value that maximizes the variance between the two classes
+def otsu_threshold(hist: np.ndarray) -> int:
+    hist = np.asarray(hist, dtype=np.float64)
+    total = hist.sum()
+    if total == 0:
+        return 0
+    levels = np.arange(256, dtype=np.float64)
+    weight_background = np.cumsum(hist)
+    sum_background = np.cumsum(hist * levels)
+    weight_foreground = total - weight_background
+    valid = (weight_background > 0) & (weight_foreground > 0)
+    if not valid.any():
+        return 0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_background = sum_background / weight_background
+        mean_foreground = (sum_background[-1] - sum_background) / weight_foreground
+        variance = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+    variance[~valid] = 0.0
+    # argmax returns the first maximum, like the strict `>` comparison of the classic loop
+    threshold = int(np.argmax(variance))
+    return threshold if variance[threshold] > 0 else 0
+
+
+# 3x3 median filter of a binary (bool) image: a pixel is set if at least 5 of the 9 pixels around it are set
+def majority_filter(binary: np.ndarray) -> np.ndarray:
+    padded = np.pad(binary.astype(np.uint8), 1, mode="edge")
+    height, width = binary.shape
+    votes = np.zeros((height, width), dtype=np.uint8)
+    for dy in range(3):
+        for dx in range(3):
+            votes += padded[dy:dy + height, dx:dx + width]
+    return votes >= 5
+
+
+"""
+The full preprocessing of a page (or region) before OCR: resize, autocontrast, binarize with Otsu's threshold and denoise.
+
+Autocontrast and the median filter never touch the pixels. The contrast stretch is monotonic, so it is applied to the
+histogram and the threshold is mapped back to the original gray values. A median filter commutes with a threshold, so the
+binarized image is denoised with a 3x3 majority vote instead (the threshold is computed before the denoising).
+
+Input:
+    gray... (height, width) uint8 array
+    min_dim, max_dim... the longest edge of the result is between these (small images are upscaled, large ones downscaled)
+
+Output:
+    np.ndarray... the binarized (0/255) uint8 image
+"""
+def prepare_for_ocr(gray: np.ndarray, min_dim: int, max_dim: int) -> np.ndarray:
+    gray = fit_to_size(gray, min_dim, max_dim)
+    hist = np.bincount(gray.ravel(), minlength=256)
+    lut = autocontrast_lut(hist)
+    stretched_hist = np.bincount(lut, weights=hist, minlength=256)
+    threshold = otsu_threshold(stretched_hist)
+    # lut[p] > threshold  <=>  p > original_threshold, because the lut is non-decreasing
+    original_threshold = int(np.searchsorted(lut, threshold, side="right")) - 1
+    binary = majority_filter(gray > original_threshold)
+    return np.where(binary, np.uint8(255), np.uint8(0))
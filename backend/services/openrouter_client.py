@@ -0,0 +1,383 @@
+import asyncio
+import json
+import logging
+import queue
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future
+from email.utils import parsedate_to_datetime
+from typing import Any, Coroutine, Iterator
+
+import httpx
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+try:  # HTTP/2 needs the optional `h2` package (pip install httpx[http2])
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except Exception:  # pragma: no cover - optional dependency
+    HTTP2_AVAILABLE = False
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+_DURATION_PART = re.compile(r"([\d.]+)(ms|s|m|h)")
+
+
+class OpenRouterError(Exception):
+    """Raised when OpenRouter answers with an error status that we don't (or no longer) retry."""
+
+    def __init__(self, status_code: int, body: str):
+        super().__init__(f"OpenRouter request failed with status {status_code}: {body[:500]}")
+        self.status_code = status_code
+        self.body = body
+
+
+"""
+Token bucket that limits how many requests we start per second.
+The rate limit headers of every response adjust it, so we slow down before OpenRouter starts answering with 429.
+"""
+class _TokenBucket:
+
+    def __init__(self, requests_per_second: float | None = None, burst: int = 10):
+        self.rate = requests_per_second # None = no client side limit until the server tells us one
+        self.capacity = float(max(1, burst))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0 # set when the server asks us to wait (Retry-After, remaining == 0)
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            if self.rate is None:
+                return
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + max(0.0, seconds))
+
+    def update_from_headers(self, headers: httpx.Headers) -> None:
+        limit = _first_number(headers, "x-ratelimit-limit-requests", "x-ratelimit-limit")
+        remaining = _first_number(headers, "x-ratelimit-remaining-requests", "x-ratelimit-remaining")
+        reset_in = _reset_seconds(headers)
+
+        if limit and reset_in:
+            # e.g. 200 requests per 10s window
+            self.rate = max(limit / max(reset_in, 1.0), 0.1)
+            self.capacity = max(1.0, min(limit, self.capacity))
+        if remaining is not None and remaining <= 0 and reset_in:
+            self.pause(reset_in)
+
+
+def _first_number(headers: httpx.Headers, *names: str) -> float | None:
+    for name in names:
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return float(value)
+        except ValueError:
+            continue
+    return None
+
+
+def _reset_seconds(headers: httpx.Headers) -> float | None:
+    """Parses the reset header, which is either an epoch timestamp in ms (OpenRouter) or a duration like '1s' / '6m0s' / '250ms' (OpenAI)."""
+    value = headers.get("x-ratelimit-reset-requests") or headers.get("x-ratelimit-reset")
+    if not value:
+        return None
+    try:
+        number = float(value)
+        if number > 1e11:  # epoch in milliseconds
+            return max(0.0, number / 1000.0 - time.time())
+        if number > 1e9:  # epoch in seconds
+            return max(0.0, number - time.time())
+        return number
+    except ValueError:
+        pass
+
+    seconds = 0.0
+    for amount, unit in _DURATION_PART.findall(value):
+        seconds += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return seconds or None
+
+
+def _retry_after_seconds(headers: httpx.Headers) -> float | None:
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+
+"""
+This class is the shared client for all requests to OpenRouter (chat completions and embeddings).
+
+All requests run on one event loop in a background thread and share one pooled httpx client
+(HTTP/2 if available, keep-alive connections), so TLS handshakes are paid once, not per request.
+It bounds the number of requests in flight, follows the server's rate limit headers with a token bucket,
+retries 429/5xx/network errors with exponential backoff and jitter, and can hedge slow requests:
+if a request takes longer than `hedge_after` seconds, a second identical request is started and the faster one wins.
+
+It can be used from sync code (`chat_completion`, `embeddings`, `stream_chat_completion`)
+and from async code running on any other event loop (`achat_completion`, `aembeddings`).
+"""
+class OpenRouterClient:
+
+    def __init__(
+        self,
+        api_key: str | None,
+        base_url: str = "https://openrouter.ai/api/v1",
+        max_connections: int = 20,
+        max_in_flight: int = 16,
+        requests_per_second: float | None = None,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+        hedge_after: float | None = None,
+        timeout: float = 120.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self._logger = logging.getLogger(__name__)
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="openrouter-client", daemon=True)
+        self._thread.start()
+
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+
+        async def setup():
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                http2=HTTP2_AVAILABLE,
+                timeout=httpx.Timeout(timeout, connect=10.0),
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            )
+            self._in_flight = asyncio.Semaphore(max(1, max_in_flight))
+            self._bucket = _TokenBucket(requests_per_second=requests_per_second, burst=max_in_flight)
+
+        self._submit(setup()).result()
+
+        # metrics
+        self.requests = 0
+        self.retries = 0
+        self.hedged = 0
+
+    # ------------------------------------------------------------------
+    # Public API
+
+    # POST /chat/completions, returns the parsed JSON response
+    def chat_completion(self, payload: dict) -> dict:
+        return self._submit(self._post_json("/chat/completions", payload, hedge=True)).result()
+
+    async def achat_completion(self, payload: dict) -> dict:
+        return await asyncio.wrap_future(self._submit(self._post_json("/chat/completions", payload, hedge=True)))
+
+    # POST /embeddings, returns one embedding per input text
+    def embeddings(self, model: str, texts: list[str]) -> list[list[float]]:
+        return self._submit(self._embeddings(model, texts)).result()
+
+    async def aembeddings(self, model: str, texts: list[str]) -> list[list[float]]:
+        return await asyncio.wrap_future(self._submit(self._embeddings(model, texts)))
+
+    """
+    POST /chat/completions with stream=True. Yields the parsed chunks of the Server-Sent Events stream.
+    Errors before the first chunk are retried like other requests.
+    """
+    def stream_chat_completion(self, payload: dict) -> Iterator[dict]:
+        chunks: queue.Queue = queue.Queue()
+        done = object()
+
+        async def produce():
+            try:
+                async for chunk in self._stream("/chat/completions", {**payload, "stream": True}):
+                    chunks.put(chunk)
+            except BaseException as e:  # handed to the consumer thread
+                chunks.put(e)
+                return
+            chunks.put(done)
+
+        future = self._submit(produce())
+        try:
+            while True:
+                item = chunks.get()
+                if item is done:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "retries": self.retries, "hedged": self.hedged, "http2": HTTP2_AVAILABLE}
+
+    def close(self) -> None:
+        if self._loop.is_closed():
+            return
+        self._submit(self._client.aclose()).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    # ------------------------------------------------------------------
+    # Internal helpers (coroutines run on self._loop)
+
+    def _submit(self, coro: Coroutine) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def _embeddings(self, model: str, texts: list[str]) -> list[list[float]]:
+        response = await self._post_json("/embeddings", {"model": model, "input": texts}, hedge=True)
+        data = sorted(response["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data]
+
+    async def _post_json(self, path: str, payload: dict, hedge: bool = False) -> dict:
+        for attempt in range(self.max_retries + 1):
+            try:
+                if hedge and self.hedge_after is not None:
+                    response = await self._send_hedged(path, payload)
+                else:
+                    response = await self._send_once(path, payload)
+            except httpx.TransportError as e:
+                if attempt >= self.max_retries:
+                    raise
+                await self._backoff(attempt, None, f"{type(e).__name__}: {e}")
+                continue
+
+            if response.status_code < 400:
+                return response.json()
+            if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                raise OpenRouterError(response.status_code, response.text)
+            await self._backoff(attempt, response, f"status {response.status_code}")
+
+        raise AssertionError("unreachable")
+
+    async def _stream(self, path: str, payload: dict):
+        yielded = False  # once the consumer has chunks, a retry would stream the whole completion a second time
+        for attempt in range(self.max_retries + 1):
+            await self._bucket.acquire()
+            async with self._in_flight:
+                self.requests += 1
+                try:
+                    async with self._client.stream("POST", path, json=payload) as response:
+                        self._bucket.update_from_headers(response.headers)
+                        if response.status_code >= 400:
+                            body = (await response.aread()).decode("utf-8", errors="replace")
+                            if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                                raise OpenRouterError(response.status_code, body)
+                            retry_response = response
+                        else:
+                            async for line in response.aiter_lines():
+                                if not line.startswith("data:"):
+                                    continue  # comments like ": OPENROUTER PROCESSING" and empty lines
+                                data = line[len("data:"):].strip()
+                                if data == "[DONE]":
+                                    return
+                                yielded = True
+                                yield json.loads(data)
+                            return
+                except httpx.TransportError as e:
+                    if yielded or attempt >= self.max_retries:
+                        raise
+                    retry_response = None
+                    reason = f"{type(e).__name__}: {e}"
+                else:
+                    reason = f"status {retry_response.status_code}"
+            await self._backoff(attempt, retry_response, reason)
+
+    async def _send_once(self, path: str, payload: dict) -> httpx.Response:
+        await self._bucket.acquire()
+        async with self._in_flight:
+            self.requests += 1
+            response = await self._client.post(path, json=payload)
+        self._bucket.update_from_headers(response.headers)
+        return response
+
+    async def _send_hedged(self, path: str, payload: dict) -> httpx.Response:
+        primary = asyncio.ensure_future(self._send_once(path, payload))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+        if done:
+            return primary.result()
+
+        self.hedged += 1
+        self._logger.debug("Hedging request to %s after %.2fs", path, self.hedge_after)
+        backup = asyncio.ensure_future(self._send_once(path, payload))
+        pending = {primary, backup}
+        first_error: BaseException | None = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result().status_code < 500:
+                        return task.result()
+                    if task.exception() is not None:
+                        first_error = first_error or task.exception()
+                    elif not pending:
+                        return task.result()
+            raise first_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _backoff(self, attempt: int, response: httpx.Response | None, reason: str) -> None:
+        self.retries += 1
+        retry_after = _retry_after_seconds(response.headers) if response is not None else None
+        if retry_after is not None:
+            delay = retry_after
+            self._bucket.pause(retry_after)
+        else:
+            # exponential backoff with full jitter
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        self._logger.warning("OpenRouter request failed (%s), retry %s/%s in %.2fs", reason, attempt + 1, self.max_retries, delay)
+        await asyncio.sleep(delay)
+
+
+"""
+Chroma embedding function that embeds texts via the shared `OpenRouterClient`.
+"""
+class OpenRouterEmbeddingFunction(EmbeddingFunction[Documents]):
+
+    def __init__(self, client: OpenRouterClient, model_name: str = "text-embedding-3-small"):
+        self.client = client
+        self.model_name = model_name
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return self.client.embeddings(self.model_name, list(input))
+
+    @staticmethod
+    def name() -> str:
+        return "openrouter"
+
+    def get_config(self) -> dict[str, Any]:
+        return {"model_name": self.model_name}
+
+    @staticmethod
+    def build_from_config(config: dict[str, Any]) -> "OpenRouterEmbeddingFunction":
+        raise ValueError("OpenRouterEmbeddingFunction needs a shared OpenRouterClient, pass it to the collection explicitly")
+
+    def is_legacy(self) -> bool:
+        return False
+
+    def default_space(self) -> str:
+        return "cosine"
+
+    def supported_spaces(self) -> list[str]:
+        return ["cosine", "l2", "ip"]
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import logging
+import mmap
+import os
+from abc import ABC, abstractmethod
+from io import BytesIO
+from typing import Any
+
+from pypdf import PdfReader
+
+try:
+    import fitz  # PyMuPDF
+except Exception:  # pragma: no cover - optional dependency
+    fitz = None
+
+logger = logging.getLogger(__name__)
+
+
+"""
+An opened PDF. The FileProcessor only talks to PDFs through this interface, so it doesn't care which library parsed them.
+
+`render_doc` is the PyMuPDF document that OCR renders pages from (None if PyMuPDF isn't available).
+A document is opened either from bytes or from a path. Documents opened from a path never read the whole file into memory,
+and `path` can be handed to other processes (e.g. the OCR workers) instead of copying the PDF.
+"""
+class PdfDocument(ABC):
+
+    page_count: int = 0
+
+    path: str | None = None # set if the document was opened from a file
+
+    data: bytes | None = None # set if the document was opened from bytes
+
+    @abstractmethod
+    def page_text(self, page_index: int) -> str:
+        ...
+
+    @abstractmethod
+    def page_has_images(self, page_index: int) -> bool:
+        ...
+
+    # fraction of the page (0..1) that is covered by images, measured on the render document
+    def page_image_coverage(self, page_index: int) -> float:
+        render_doc = self.render_doc
+        if render_doc is None:
+            return 1.0 if self.page_has_images(page_index) else 0.0
+        try:
+            return image_coverage(render_doc.load_page(page_index))
+        except Exception:
+            logger.debug("Could not measure the image coverage of page %s", page_index + 1, exc_info=True)
+            return 1.0 if self.page_has_images(page_index) else 0.0
+
+    @property
+    def render_doc(self) -> Any | None:
+        return None
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "PdfDocument":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+"""
+Opens the PDF once with PyMuPDF and uses the same document for text, image detection and rendering.
+"""
+class PyMuPdfDocument(PdfDocument):
+
+    def __init__(self, source: bytes | str):
+        if isinstance(source, str):
+            # PyMuPDF reads the pages it needs from the file, the PDF is never loaded into memory as a whole
+            self.path = source
+            self._doc = fitz.open(source, filetype="pdf")
+        else:
+            self.data = source
+            self._doc = fitz.open(stream=source, filetype="pdf")
+        self.page_count = self._doc.page_count
+
+    def page_text(self, page_index: int) -> str:
+        return self._doc.load_page(page_index).get_text("text") or ""
+
+    def page_has_images(self, page_index: int) -> bool:
+        try:
+            return bool(self._doc.get_page_images(page_index))
+        except Exception:
+            # Best-effort; if detection fails, assume no images
+            return False
+
+    @property
+    def render_doc(self) -> Any | None:
+        return self._doc
+
+    def close(self) -> None:
+        self._doc.close()
+
+
+"""
+The old way: pypdf for text and image detection, plus a PyMuPDF document for rendering that is only opened when OCR needs it.
+Useful as a fallback for PDFs where PyMuPDF's text extraction is worse than pypdf's.
+"""
+class PypdfDocument(PdfDocument):
+
+    def __init__(self, source: bytes | str):
+        self._file = None
+        self._mmap = None
+        if isinstance(source, str):
+            # pypdf would read a path into a BytesIO, a memory map lets the OS page the file in instead
+            self.path = source
+            self._file = open(source, "rb")
+            try:
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                self._file.close()
+                raise
+            stream = self._mmap
+        else:
+            self.data = source
+            stream = BytesIO(source)
+        self._reader = PdfReader(stream)
+        self.page_count = len(self._reader.pages)
+        self._render_doc = None
+
+    def page_text(self, page_index: int) -> str:
+        return self._reader.pages[page_index].extract_text() or ""
+
+    def page_has_images(self, page_index: int) -> bool:
+        try:
+            resources = self._reader.pages[page_index].get("/Resources") or {}
+            x_objects = resources.get("/XObject")
+            if not x_objects:
+                return False
+            x_objects = x_objects.get_object()
+            for obj in x_objects.values():
+                obj_type = obj.get("/Subtype")
+                if obj_type == "/Image":
+                    return True
+        except Exception:
+            # Best-effort; if detection fails, assume no images
+            return False
+        return False
+
+    @property
+    def render_doc(self) -> Any | None:
+        if self._render_doc is None and fitz is not None:
+            try:
+                if self.path is not None:
+                    self._render_doc = fitz.open(self.path, filetype="pdf")
+                else:
+                    self._render_doc = fitz.open(stream=self.data, filetype="pdf")
+            except Exception:
+                logger.exception("Failed to open PDF with PyMuPDF; pages can't be rendered for OCR")
+        return self._render_doc
+
+    def close(self) -> None:
+        if self._render_doc is not None:
+            self._render_doc.close()
+        # the reader may still reference the map, drop it first so the map can be closed
+        self._reader = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # a page object still holds a view on the map, it is released with the last reference
+                pass
+        if self._file is not None:
+            self._file.close()
+
+
+# fraction of a PyMuPDF page that is covered by images (overlapping images are counted once, via a coarse grid)
+def image_coverage(page: Any, grid: int = 32) -> float:
+    page_rect = page.rect
+    if page_rect.is_empty:
+        return 0.0
+    boxes = [fitz.Rect(info["bbox"]) & page_rect for info in page.get_image_info()]
+    boxes = [box for box in boxes if not box.is_empty]
+    if not boxes:
+        return 0.0
+    if len(boxes) == 1:
+        return min(1.0, boxes[0].get_area() / page_rect.get_area())
+
+    cell_w = page_rect.width / grid
+    cell_h = page_rect.height / grid
+    covered = set()
+    for box in boxes:
+        for x in range(int((box.x0 - page_rect.x0) / cell_w), min(grid, int((box.x1 - page_rect.x0) / cell_w) + 1)):
+            for y in range(int((box.y0 - page_rect.y0) / cell_h), min(grid, int((box.y1 - page_rect.y0) / cell_h) + 1)):
+                covered.add((x, y))
+    return len(covered) / (grid * grid)
+
+
+PDF_BACKENDS = {
+    "pymupdf": PyMuPdfDocument,
+    "pypdf": PypdfDocument,
+}
+
+
+"""
+Returns the name of the backend that is actually used for `requested` ("pymupdf" or "pypdf").
+PyMuPDF is the default, pypdf is used if it's requested or PyMuPDF isn't installed.
+"""
+def resolve_pdf_backend(requested: str | None) -> str:
+    name = (requested or "pymupdf").strip().lower()
+    if name not in PDF_BACKENDS:
+        raise ValueError(f"Unknown PDF backend '{requested}', use one of {sorted(PDF_BACKENDS)}")
+    if name == "pymupdf" and fitz is None:
+        logger.warning("PyMuPDF is not installed, falling back to the pypdf backend")
+        return "pypdf"
+    return name
+
+
+# opens a PDF from its bytes or from a path (str or os.PathLike)
+def open_pdf(source: bytes | str | os.PathLike, backend: str = "pymupdf") -> PdfDocument:
+    if isinstance(source, os.PathLike):
+        source = os.fspath(source)
+    return PDF_BACKENDS[resolve_pdf_backend(backend)](source)
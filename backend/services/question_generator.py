@@ -1,7 +1,13 @@
 import os
 import json
+import math
+import asyncio
 import logging
-from openai import OpenAI
+from typing import Callable, Iterator
+import numpy as np
+from services.context_budgeter import ContextBudgeter
+from services.json_stream import IncrementalJSONArrayParser
+from services.openrouter_client import OpenRouterClient
 from models.question import Question
 from models.course_material import CourseMaterial
 from models.question_type import QuestionType
@@ -11,24 +17,36 @@ logger = logging.getLogger(__name__)
 """
 This class generates new exam questions by querying an LLM via OpenRouter.
 OpenRouter provides access to various LLM providers (OpenAI, Anthropic, Meta, etc.)
-through a unified API that is compatible with the OpenAI SDK.
+through a unified API that is compatible with the OpenAI API.
+All requests go through an `OpenRouterClient`, which should be shared with the other services (e.g. the VectorDB embeddings).
 """
 
 
 class QuestionGenerator:
 
-    def __init__(self):
+    # questions_per_shard, max_concurrent_shards and near_duplicate_threshold configure `generate_questions_sharded`
+    # client... the shared OpenRouterClient, if None a client of its own is created
+    # context_budgeter... selects the course material and example questions that fit into the prompt
+    def __init__(
+            self,
+            questions_per_shard: int = 10,
+            max_concurrent_shards: int = 4,
+            near_duplicate_threshold: float = 0.92,
+            client: OpenRouterClient | None = None,
+            context_budgeter: ContextBudgeter | None = None
+    ):
         api_key = os.environ.get("LLM_API_KEY")
         if not api_key:
             raise ValueError("LLM_API_KEY environment variable is not set")
 
-        self.client = OpenAI(
-            api_key=api_key,
-            base_url="https://openrouter.ai/api/v1"
-        )
+        self.client = client if client is not None else OpenRouterClient(api_key=api_key)
         # Default to Claude Sonnet 4.5 for better RAG reasoning
         # See https://openrouter.ai/models for available models
         self.model = os.environ.get("LLM_MODEL", "anthropic/claude-sonnet-4.5")
+        self.questions_per_shard = max(1, questions_per_shard)
+        self.max_concurrent_shards = max(1, max_concurrent_shards)
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.context_budgeter = context_budgeter if context_budgeter is not None else ContextBudgeter()
 
     def _build_prompt(
             self,
@@ -46,23 +64,22 @@ class QuestionGenerator:
         else:
             course_identifier = f"(Course ID: {course_id})"
 
+        # Keep only the most relevant material and questions that fit into the token budget
+        context = self.context_budgeter.pack(relevant_course_material, old_questions)
+        logger.info(
+            f"Prompt context: {len(context.course_material)} material chunks, {len(context.old_questions)} example questions, "
+            f"{context.tokens_after} tokens (was {context.tokens_before}, {context.n_dropped} items dropped)"
+        )
+
         # Format course material
         course_material_text = ""
-        for i, material in enumerate(relevant_course_material, 1):
-            course_material_text += f"\n--- Course Material {i} ---\n{material.text}\n"
-            if material.metadata:
-                course_material_text += f"Metadata: {material.metadata}\n"
+        for i, material in enumerate(context.course_material, 1):
+            course_material_text += self.context_budgeter.format_material(i, material)
 
         # Format old questions as examples
         old_questions_text = ""
-        for i, q in enumerate(old_questions, 1):
-            old_questions_text += f"\n--- Example Question {i} ---\n"
-            old_questions_text += f"Type: {q.question_type.value}\n"
-            old_questions_text += f"Question: {q.question}\n"
-            if q.answer_keys:
-                old_questions_text += f"Answer Options: {', '.join(q.answer_keys)}\n"
-            if q.metadata:
-                old_questions_text += f"Metadata: {q.metadata}\n"
+        for i, q in enumerate(context.old_questions, 1):
+            old_questions_text += self.context_budgeter.format_question(i, q)
 
         prompt = f"""You are a professor teaching the TU Wien course {course_identifier}. Your task is to create a new exam for this course.
 
@@ -119,25 +136,49 @@ IMPORTANT: Return ONLY the JSON array, no additional text or markdown formatting
             logger.error(f"Response was: {response_text[:500]}...")
             raise ValueError(f"LLM response is not valid JSON: {e}")
 
-        questions = []
-        for q_data in questions_data:
-            # Map question type string to enum
-            q_type_str = q_data.get("question_type", "text-answer")
-            try:
-                q_type = QuestionType(q_type_str)
-            except ValueError:
-                logger.warning(f"Unknown question type '{q_type_str}', defaulting to TEXT_ANSWER")
-                q_type = QuestionType.TEXT_ANSWER
-
-            question = Question(
-                question=q_data.get("question", ""),
-                question_type=q_type,
-                metadata=q_data.get("metadata", {}),
-                answer_keys=q_data.get("answer_keys")
-            )
-            questions.append(question)
+        return [self._question_from_dict(q_data) for q_data in questions_data]
 
-        return questions
+    def _question_from_dict(self, q_data: dict) -> Question:
+        """Converts one question object of the LLM response into a Question."""
+
+        # Map question type string to enum
+        q_type_str = q_data.get("question_type", "text-answer")
+        try:
+            q_type = QuestionType(q_type_str)
+        except ValueError:
+            logger.warning(f"Unknown question type '{q_type_str}', defaulting to TEXT_ANSWER")
+            q_type = QuestionType.TEXT_ANSWER
+
+        return Question(
+            question=q_data.get("question", ""),
+            question_type=q_type,
+            metadata=q_data.get("metadata", {}),
+            answer_keys=q_data.get("answer_keys")
+        )
+
+    def _build_messages(self, prompt: str) -> list[dict]:
+        return [
+            {
+                "role": "system",
+                "content": "You are an expert exam question generator. You always respond with valid JSON."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+
+    def _build_payload(self, prompt: str, seed: int | None = None) -> dict:
+        payload = {
+            "model": self.model,
+            "messages": self._build_messages(prompt),
+            "temperature": 0.7,
+            "max_tokens": 4000
+        }
+        if seed is not None:
+            # providers that support it sample deterministically for the same seed and prompt
+            payload["seed"] = seed
+        return payload
 
     def generate_questions(
             self,
@@ -145,7 +186,8 @@ IMPORTANT: Return ONLY the JSON array, no additional text or markdown formatting
             relevant_course_material: list[CourseMaterial],
             old_questions: list[Question],
             n_new_questions: int = 20,
-            course_name: str | None = None
+            course_name: str | None = None,
+            seed: int | None = None
     ) -> list[Question]:
         """
         Queries the LLM using a prompt enriched with relevant course material and old exam questions.
@@ -156,6 +198,7 @@ IMPORTANT: Return ONLY the JSON array, no additional text or markdown formatting
             old_questions... Old exam questions along with some metadata, queried from our vector DB
             n_new_questions... How many questions should be generated by the LLM
             course_name (Optional)... The name of the course (e.g. "Visual Computing"). If provided, used in prompt instead of course_id.
+            seed (Optional)... Sampling seed that is passed to the LLM, so that a generation can be reproduced (as far as the provider supports it)
 
         Output:
             list[Question]... A list of N newly generated exam questions
@@ -173,23 +216,9 @@ IMPORTANT: Return ONLY the JSON array, no additional text or markdown formatting
         logger.info(f"Generating {n_new_questions} questions for {log_identifier} using model {self.model}")
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert exam question generator. You always respond with valid JSON."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.7,
-                max_tokens=4000
-            )
+            response = self.client.chat_completion(self._build_payload(prompt, seed=seed))
 
-            response_text = response.choices[0].message.content
+            response_text = response["choices"][0]["message"]["content"]
             logger.debug(f"LLM response received: {len(response_text)} characters")
 
             questions = self._parse_response(response_text)
@@ -200,3 +229,196 @@ IMPORTANT: Return ONLY the JSON array, no additional text or markdown formatting
         except Exception as e:
             logger.error(f"Error calling LLM API: {e}")
             raise
+
+    async def agenerate_questions(
+            self,
+            course_id: int,
+            relevant_course_material: list[CourseMaterial],
+            old_questions: list[Question],
+            n_new_questions: int = 20,
+            course_name: str | None = None,
+            seed: int | None = None
+    ) -> list[Question]:
+        """Async version of `generate_questions`, the request runs on the client's event loop instead of blocking a thread."""
+
+        prompt = self._build_prompt(
+            course_id=course_id,
+            relevant_course_material=relevant_course_material,
+            old_questions=old_questions,
+            n_new_questions=n_new_questions,
+            course_name=course_name
+        )
+
+        log_identifier = course_name if course_name else f"course {course_id}"
+        logger.info(f"Generating {n_new_questions} questions for {log_identifier} using model {self.model}")
+
+        try:
+            response = await self.client.achat_completion(self._build_payload(prompt, seed=seed))
+            response_text = response["choices"][0]["message"]["content"]
+            logger.debug(f"LLM response received: {len(response_text)} characters")
+
+            questions = self._parse_response(response_text)
+            logger.info(f"Successfully generated {len(questions)} questions")
+            return questions
+
+        except Exception as e:
+            logger.error(f"Error calling LLM API: {e}")
+            raise
+
+    async def generate_questions_sharded(
+            self,
+            course_id: int,
+            relevant_course_material: list[CourseMaterial],
+            old_questions: list[Question],
+            n_new_questions: int = 20,
+            course_name: str | None = None,
+            embed_texts: Callable[[list[str]], list] | None = None,
+            seed: int | None = None
+    ) -> list[Question]:
+        """
+        Splits the generation of `n_new_questions` into shards of at most `questions_per_shard` questions.
+        The shards are generated concurrently (at most `max_concurrent_shards` at a time), each with a different slice
+        of the course material and example questions. The results are merged and (near-)duplicates are removed.
+
+        Input:
+            Same as `generate_questions`, plus
+            embed_texts (Optional)... Embeds a list of texts (e.g. `VectorDB.embed_texts`), used to detect near-duplicate questions
+            seed (Optional)... Sampling seed, shard i uses `seed + i`
+
+        Output:
+            list[Question]... At most N newly generated exam questions
+        """
+
+        n_shards = math.ceil(n_new_questions / self.questions_per_shard)
+        if n_shards <= 1:
+            return await self.agenerate_questions(
+                course_id=course_id,
+                relevant_course_material=relevant_course_material,
+                old_questions=old_questions,
+                n_new_questions=n_new_questions,
+                course_name=course_name,
+                seed=seed
+            )
+
+        # e.g. 25 questions in 3 shards -> 9, 8, 8
+        shard_sizes = [n_new_questions // n_shards + (1 if i < n_new_questions % n_shards else 0) for i in range(n_shards)]
+        logger.info(f"Generating {n_new_questions} questions in {n_shards} shards {shard_sizes} (max {self.max_concurrent_shards} concurrent)")
+
+        semaphore = asyncio.Semaphore(self.max_concurrent_shards)
+
+        async def generate_shard(i: int) -> list[Question]:
+            async with semaphore:
+                return await self.agenerate_questions(
+                    course_id=course_id,
+                    relevant_course_material=self._shard_slice(relevant_course_material, i, n_shards),
+                    old_questions=self._shard_slice(old_questions, i, n_shards),
+                    n_new_questions=shard_sizes[i],
+                    course_name=course_name,
+                    seed=None if seed is None else seed + i
+                )
+
+        results = await asyncio.gather(*(generate_shard(i) for i in range(n_shards)), return_exceptions=True)
+
+        merged: list[Question] = []
+        errors = []
+        for i, result in enumerate(results):
+            if isinstance(result, BaseException):
+                logger.error(f"Shard {i + 1}/{n_shards} failed: {result}")
+                errors.append(result)
+            else:
+                merged.extend(result)
+        if not merged and errors:
+            raise errors[0]
+
+        questions = await asyncio.to_thread(self._deduplicate, merged, embed_texts)
+        logger.info(f"Sharded generation complete: {len(merged)} generated, {len(questions)} after de-duplication, {len(errors)} failed shards")
+        return questions[:n_new_questions]
+
+    def _shard_slice(self, items: list, shard: int, n_shards: int) -> list:
+        """Every shard gets every n_shards-th item (round robin), so each shard sees different material of similar relevance."""
+        if len(items) < n_shards:
+            return items
+        return items[shard::n_shards]
+
+    def _deduplicate(self, questions: list[Question], embed_texts: Callable[[list[str]], list] | None = None) -> list[Question]:
+        """Removes questions with the same (normalized) text and, if `embed_texts` is given, questions whose embeddings are too similar."""
+
+        unique: list[Question] = []
+        seen: set[str] = set()
+        for question in questions:
+            key = " ".join(question.question.split()).casefold()
+            if key and key not in seen:
+                seen.add(key)
+                unique.append(question)
+
+        if embed_texts is None or len(unique) < 2:
+            return unique
+
+        try:
+            embeddings = np.asarray(embed_texts([q.question for q in unique]), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Could not embed questions for near-duplicate detection: {e}")
+            return unique
+
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.where(norms == 0, 1, norms)
+        similarities = embeddings @ embeddings.T
+
+        kept: list[int] = []
+        for i in range(len(unique)):
+            if not kept or similarities[i, kept].max() < self.near_duplicate_threshold:
+                kept.append(i)
+            else:
+                logger.debug(f"Dropping near-duplicate question: {unique[i].question[:80]}")
+        return [unique[i] for i in kept]
+
+    def stream_questions(
+            self,
+            course_id: int,
+            relevant_course_material: list[CourseMaterial],
+            old_questions: list[Question],
+            n_new_questions: int = 20,
+            course_name: str | None = None
+    ) -> Iterator[Question]:
+        """
+        Like `generate_questions`, but streams the LLM response and yields every question as soon as its JSON object is complete.
+        If the response is truncated (e.g. because it hit max_tokens), the questions that were completed are still yielded.
+
+        Input:
+            Same as `generate_questions`
+
+        Output:
+            Iterator[Question]... The newly generated exam questions, in the order the LLM generates them
+        """
+
+        prompt = self._build_prompt(
+            course_id=course_id,
+            relevant_course_material=relevant_course_material,
+            old_questions=old_questions,
+            n_new_questions=n_new_questions,
+            course_name=course_name
+        )
+
+        log_identifier = course_name if course_name else f"course {course_id}"
+        logger.info(f"Streaming {n_new_questions} questions for {log_identifier} using model {self.model}")
+
+        parser = IncrementalJSONArrayParser()
+        n_yielded = 0
+        finish_reason = None
+        try:
+            for chunk in self.client.stream_chat_completion(self._build_payload(prompt)):
+                if not chunk.get("choices"):
+                    continue
+                choice = chunk["choices"][0]
+                finish_reason = choice.get("finish_reason") or finish_reason
+                for q_data in parser.feed((choice.get("delta") or {}).get("content") or ""):
+                    n_yielded += 1
+                    yield self._question_from_dict(q_data)
+
+        except Exception as e:
+            logger.error(f"Error streaming from LLM API after {n_yielded} questions: {e}")
+            raise
+
+        if not parser.finished:
+            logger.warning(f"LLM response was truncated (finish_reason={finish_reason}), returning {n_yielded} completed questions")
+        logger.info(f"Successfully streamed {n_yielded} questions")
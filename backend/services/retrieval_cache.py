@@ -0,0 +1,93 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+"""
+This class caches retrieval results and query embeddings in memory, with LRU eviction and a TTL.
+
+Retrieval results are keyed by (collection, course_id, normalized query, n, collection version).
+The `VectorDB` bumps the collection version of a course whenever it indexes new chunks for it,
+so cached results of that course are never served after an upload.
+Query embeddings only depend on the query text, so they are shared by all retrievals of the same query.
+"""
+class RetrievalCache:
+
+    def __init__(self, max_items: int = 512, ttl_seconds: float = 600.0, max_query_embeddings: int = 1024):
+        self.max_items = max(0, max_items)
+        self.ttl_seconds = ttl_seconds
+        self.max_query_embeddings = max(0, max_query_embeddings)
+        self._results: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._query_embeddings: OrderedDict[str, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.query_embedding_hits = 0
+        self.query_embedding_misses = 0
+
+    # returns a copy of the cached result, or None if there is no (unexpired) result for this key
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._results[key]
+                self.misses += 1
+                return None
+            self._results.move_to_end(key)
+            self.hits += 1
+            value = entry[1]
+        # callers may modify the returned objects (e.g. their metadata), so they get their own copy
+        return copy.deepcopy(value)
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.max_items == 0:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._results[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_items:
+                self._results.popitem(last=False)
+
+    # removes all cached results of a course (keys are expected to have the course_id as their 2nd entry)
+    def invalidate_course(self, course_id: int) -> None:
+        with self._lock:
+            for key in [key for key in self._results if isinstance(key, tuple) and len(key) > 1 and key[1] == course_id]:
+                del self._results[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+            self._query_embeddings.clear()
+
+    def get_query_embedding(self, query: str) -> Any | None:
+        with self._lock:
+            embedding = self._query_embeddings.get(query)
+            if embedding is None:
+                self.query_embedding_misses += 1
+                return None
+            self._query_embeddings.move_to_end(query)
+            self.query_embedding_hits += 1
+            return embedding
+
+    def put_query_embedding(self, query: str, embedding: Any) -> None:
+        if self.max_query_embeddings == 0:
+            return
+        with self._lock:
+            self._query_embeddings[query] = embedding
+            self._query_embeddings.move_to_end(query)
+            while len(self._query_embeddings) > self.max_query_embeddings:
+                self._query_embeddings.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "items": len(self._results),
+                "query_embedding_hits": self.query_embedding_hits,
+                "query_embedding_misses": self.query_embedding_misses,
+            }
@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+
+class ExecutorSaturatedError(Exception):
+    """Raised when a BoundedExecutor already has `max_queue` calls waiting for a worker."""
+
+
+"""
+This class runs blocking functions (OCR, PDF rendering, Mongo, Chroma, LLM calls) on a bounded thread pool,
+so that they don't block the FastAPI event loop.
+
+`max_workers` limits how many calls run at the same time, `max_queue` limits how many calls may wait for a free worker.
+If the queue is full, `run()` raises an `ExecutorSaturatedError` instead of piling up more work.
+"""
+class BoundedExecutor:
+
+    def __init__(self, name: str, max_workers: int, max_queue: int = 100):
+        if max_workers <= 0:
+            raise ValueError("max_workers must be positive")
+        if max_queue < 0:
+            raise ValueError("max_queue must be non-negative")
+
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-worker")
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger(__name__)
+
+        # metrics
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._total_wait_time = 0.0
+        self._total_run_time = 0.0
+
+    """
+    Runs `fn(*args, **kwargs)` on a worker thread and returns its result.
+
+    Raises:
+        ExecutorSaturatedError... if `max_queue` calls are already waiting for a worker
+    """
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._rejected += 1
+                self._logger.warning("Executor %s saturated queued=%s running=%s", self.name, self._queued, self._running)
+                raise ExecutorSaturatedError(f"The {self.name} executor is busy, please try again later")
+            self._queued += 1
+
+        submitted_at = time.monotonic()
+
+        def call():
+            started_at = time.monotonic()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._total_wait_time += started_at - submitted_at
+
+            failed = False
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+                    self._failed += int(failed)
+                    self._total_run_time += time.monotonic() - started_at
+
+        # a call that is cancelled while it waits for a worker never runs `call()`, so its queue slot is released here
+        def release_if_cancelled(future):
+            if future.cancelled():
+                with self._lock:
+                    self._queued -= 1
+
+        try:
+            future = self._pool.submit(call)
+        except BaseException:
+            with self._lock:
+                self._queued -= 1
+            raise
+        future.add_done_callback(release_if_cancelled)
+        return await asyncio.wrap_future(future)
+
+    # returns a snapshot of the queue depth and timing metrics of this executor
+    def stats(self) -> dict:
+        with self._lock:
+            completed = self._completed
+            return {
+                "name": self.name,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self._queued,
+                "running": self._running,
+                "completed": completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "avg_wait_seconds": self._total_wait_time / completed if completed else 0.0,
+                "avg_run_seconds": self._total_run_time / completed if completed else 0.0,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,92 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload is larger than the configured limit."""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"The uploaded file is larger than {max_bytes // (1024 * 1024)} MB")
+        self.max_bytes = max_bytes
+
+
+@dataclass
+class SpooledUpload:
+    path: str # where the upload was written to
+    sha256: str
+    size: int # in bytes
+
+
+"""
+This class writes uploads to disk chunk by chunk and computes their sha256 on the way,
+so an upload is read exactly once and only `chunk_size` bytes of it are in memory at any time.
+The spooled file can then be moved to its final place (e.g. by the IngestionJobQueue) without copying it.
+"""
+class UploadSpooler:
+
+    def __init__(self, spool_dir: str = "data/uploads", max_bytes: int = 100 * 1024 * 1024, chunk_size: int = 1024 * 1024):
+        self.spool_dir = spool_dir
+        self.max_bytes = max_bytes
+        self.chunk_size = max(1, chunk_size)
+        self._logger = logging.getLogger(__name__)
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._remove_leftovers()
+
+    """
+    Spools an upload to disk.
+
+    Input:
+        file... An object with an async `read(size)` method, e.g. FastAPI's `UploadFile`
+
+    Output:
+        SpooledUpload... the path, sha256 and size of the spooled file. The caller has to move or `discard` it.
+        Raises `UploadTooLargeError` (and removes the partial file) if the upload is larger than `max_bytes`.
+    """
+    async def spool(self, file: Any) -> SpooledUpload:
+        path = os.path.join(self.spool_dir, f"upload-{uuid.uuid4().hex}.part")
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with open(path, "wb") as spool_file:
+                while True:
+                    chunk = await file.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise UploadTooLargeError(self.max_bytes)
+                    hasher.update(chunk)
+                    # the disk write must not block the event loop
+                    await asyncio.to_thread(spool_file.write, chunk)
+        except BaseException:
+            self.discard(path)
+            raise
+
+        return SpooledUpload(path=path, sha256=hasher.hexdigest(), size=size)
+
+    # removes partial uploads of a previous run (e.g. the backend was killed in the middle of an upload)
+    # files younger than `min_age` seconds may belong to another backend process that shares the directory
+    def _remove_leftovers(self, min_age: float = 3600.0) -> None:
+        now = time.time()
+        for name in os.listdir(self.spool_dir):
+            path = os.path.join(self.spool_dir, name)
+            if name.startswith("upload-") and name.endswith(".part"):
+                try:
+                    if now - os.path.getmtime(path) >= min_age:
+                        self.discard(path)
+                except OSError:
+                    continue
+
+    def discard(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            self._logger.warning("Could not remove spooled upload %s", path, exc_info=True)
@@ -1,14 +1,33 @@
 import chromadb
 import logging
 import os
-import time
-from chromadb.utils import embedding_functions
+from services.openrouter_client import OpenRouterClient, OpenRouterEmbeddingFunction
+from services.embedding_cache import CachedEmbeddingFunction, EmbeddingCache
+from services.retrieval_cache import RetrievalCache
+from services.indexing_pipeline import IndexingPipeline
+from services.bm25_index import BM25Index
 from models.course_material_chunk import CourseMaterialChunk
 from models.exam_question_chunk import ExamQuestionChunk
 from models.course_material import CourseMaterial
+from models.course_material_type import CourseMaterialType
 from models.question import Question
 from models.question_type import QuestionType
+import numpy as np
 import random
+import re
+import threading
+
+# the chunks embedded with this model live in the collections without a model suffix (they were created before there were other models)
+DEFAULT_EMBEDDING_MODEL = "text-embedding-3-small"
+
+# old exam questions are ranked by a weighted mix of the similarities of these parts of the question to the query
+DEFAULT_EXAM_VECTOR_WEIGHTS = {"stem": 0.6, "answers": 0.15, "topic": 0.25}
+
+# the usual constant of reciprocal rank fusion, it keeps a single first rank from outweighing good ranks in both lists
+DEFAULT_RRF_K = 60
+
+# maximal marginal relevance: 1.0 ranks by relevance only, lower values trade relevance for chunks that differ from the ones already picked
+DEFAULT_MMR_LAMBDA = 0.5
 
 """
 This class handles all interaction with our vector database.
@@ -16,33 +35,78 @@ This class handles all interaction with our vector database.
 class VectorDB:
 
     # build your constructor here
-    def __init__(self, db_path="data/chroma", embedding_function=None, require_api_key: bool = True):
+    # if an `embedding_cache` is given, only texts that aren't cached yet are sent to the embedding function
+    # the `retrieval_cache` caches query embeddings and query results (a default in-memory cache is used if None)
+    # without an `embedding_function`, texts are embedded via `openrouter_client` (the client shared with the QuestionGenerator)
+    # the `indexing_pipeline` embeds and stores new chunks in batches (a default pipeline is used if None)
+    # every `embedding_model_name` gets its own collections, so vectors of different models are never mixed (or compared)
+    # `exam_vector_weights` weighs the similarities of the question stem, the answers and the topic of old exam questions (see `retrieve_old_exam_questions`)
+    # with `hybrid_retrieval`, course material is also ranked by a BM25 index (stored next to the Chroma data if `bm25_index` is None) and both rankings are fused
+    # `mmr_lambda` < 1 picks the course material for a query out of `mmr_pool_factor` * n candidates with maximal marginal relevance (see `_mmr`)
+    def __init__(self, db_path="data/chroma", embedding_function=None, require_api_key: bool = True, embedding_cache: EmbeddingCache | None = None, embedding_model_name: str = DEFAULT_EMBEDDING_MODEL, retrieval_cache: RetrievalCache | None = None, openrouter_client: OpenRouterClient | None = None, indexing_pipeline: IndexingPipeline | None = None, exam_vector_weights: dict[str, float] | None = None, hybrid_retrieval: bool = True, bm25_index: BM25Index | None = None, rrf_k: int = DEFAULT_RRF_K, mmr_lambda: float = DEFAULT_MMR_LAMBDA, mmr_pool_factor: int = 3):
         api_key = os.environ.get("LLM_API_KEY")
         self._logger = logging.getLogger(__name__)
         if embedding_function is None:
             if require_api_key and not api_key:
                 raise ValueError("LLM_API_KEY environment variable is not set")
-            embedding_function = embedding_functions.OpenAIEmbeddingFunction(
-                api_base="https://openrouter.ai/api/v1",
-                api_key=api_key,
-                model_name="text-embedding-3-small"
-            )
+            if openrouter_client is None:
+                openrouter_client = OpenRouterClient(api_key=api_key)
+            embedding_function = OpenRouterEmbeddingFunction(openrouter_client, model_name=embedding_model_name)
+
+        if embedding_cache is not None:
+            embedding_function = CachedEmbeddingFunction(embedding_function, cache=embedding_cache, model_name=embedding_model_name)
 
         self.embedding_function = embedding_function
+        self.embedding_model_name = embedding_model_name
+        self.retrieval_cache = retrieval_cache if retrieval_cache is not None else RetrievalCache()
+        self.indexing_pipeline = indexing_pipeline if indexing_pipeline is not None else IndexingPipeline()
+        self.exam_vector_weights = dict(exam_vector_weights if exam_vector_weights is not None else DEFAULT_EXAM_VECTOR_WEIGHTS)
+        unknown_vectors = set(self.exam_vector_weights) - set(DEFAULT_EXAM_VECTOR_WEIGHTS)
+        if unknown_vectors:
+            raise ValueError(f"Unknown exam vectors {sorted(unknown_vectors)}, use {sorted(DEFAULT_EXAM_VECTOR_WEIGHTS)}")
+        self.rrf_k = max(1, rrf_k)
+        self.mmr_lambda = min(1.0, max(0.0, mmr_lambda))
+        self.mmr_pool_factor = max(1, mmr_pool_factor)
+        self.bm25_index = None
+        if hybrid_retrieval:
+            self.bm25_index = bm25_index if bm25_index is not None else BM25Index(os.path.join(db_path, "bm25.sqlite3"))
+        self._bm25_checked_courses: set[int] = set()
+        self._exam_vectors_checked_courses: set[int] = set()
+        # (collection name, course_id) -> version, bumped whenever the chunks of a course change
+        self._collection_versions: dict[tuple[str, int], int] = {}
+        self._versions_lock = threading.Lock()
 
         self.client = chromadb.PersistentClient(path=db_path)
         self.course_material_collection = self.client.get_or_create_collection(
-            name="course_material",
+            name=self._collection_name("course_material"),
             metadata={"hnsw:space": "cosine"},
             embedding_function=self.embedding_function
         )
 
         self.old_exam_collection = self.client.get_or_create_collection(
-            name="old_exam_collection",
+            name=self._collection_name("old_exam_collection"),
             metadata={"hnsw:space": "cosine"},
             embedding_function=self.embedding_function
         )
 
+        # sibling collections of `old_exam_collection` with one vector per part of a question (same IDs), the documents and
+        # metadata of the questions are only stored in `old_exam_collection`
+        self.exam_vector_collections = {
+            name: self.client.get_or_create_collection(
+                name=self._collection_name(f"old_exam_{name}"),
+                metadata={"hnsw:space": "cosine"},
+                embedding_function=self.embedding_function
+            )
+            for name in DEFAULT_EXAM_VECTOR_WEIGHTS
+        }
+
+    # e.g. "course_material" for text-embedding-3-small, "course_material__all-MiniLM-L6-v2-int8" for a local model
+    def _collection_name(self, base: str) -> str:
+        if self.embedding_model_name == DEFAULT_EMBEDDING_MODEL:
+            return base
+        model = re.sub(r"[^a-zA-Z0-9._-]+", "-", self.embedding_model_name).strip("-._")
+        return f"{base}__{model}"[:512]
+
     def clean_md(self, md: dict) -> dict:
         return {k: v for k, v in md.items() if v is not None}
     
@@ -57,6 +121,31 @@ class VectorDB:
     def embed_texts(self, texts: list[str]) -> list[list[float]]:
         return self.embedding_function(texts)
 
+    # embeds a (normalized) query once, all retrievals with the same query share the embedding
+    def _embed_query(self, query: str):
+        embedding = self.retrieval_cache.get_query_embedding(query)
+        if embedding is None:
+            embed = getattr(self.embedding_function, "embed_query", self.embedding_function)
+            embedding = embed([query])[0]
+            self.retrieval_cache.put_query_embedding(query, embedding)
+        return embedding
+
+    def _normalize_query(self, query: str) -> str:
+        return " ".join(query.split()).casefold()
+
+    def _collection_version(self, collection_name: str, course_id: int) -> int:
+        with self._versions_lock:
+            return self._collection_versions.get((collection_name, int(course_id)), 0)
+
+    # invalidates all cached retrieval results of the course for this collection
+    def _bump_collection_version(self, collection_name: str, course_ids) -> None:
+        with self._versions_lock:
+            for course_id in set(int(course_id) for course_id in course_ids):
+                key = (collection_name, course_id)
+                self._collection_versions[key] = self._collection_versions.get(key, 0) + 1
+        for course_id in set(int(course_id) for course_id in course_ids):
+            self.retrieval_cache.invalidate_course(course_id)
+
 
     """
     Stores the course material in the `course_material_collection` in the Vector DB
@@ -64,53 +153,10 @@ class VectorDB:
     Input:
         chunks... Chunks of course material along with some metadata
         metadata... Metadata of the course material chunks e.g. [{'topic': 'grpo', 'has_images': true}, {'topic': 'ppo', 'has_images': false}, ...]
+        progress_callback (Optional)... Called as progress_callback("embed", stored_chunks, total_chunks) after every embedded and stored batch
     """
-    def index_course_material(self, chunks: list[CourseMaterialChunk], metadata: list[dict]) -> None:
-        self._logger.info("Indexing course material chunks=%s", len(chunks))
-
-        if len(metadata) != len(chunks):
-            raise ValueError("Error! Metadata list is not as long as the chunks list")
-        
-        ids = []
-        documents = []
-        metadatas = []
-
-        for chunk, metadata_entry in zip(chunks, metadata):
-            metadata_entry = self.clean_md(metadata_entry)
-            ids.append(chunk.id)
-            documents.append(chunk.text)
-            combined_metadata = {
-                "course_id": str(chunk.course_id),
-                "chunk_ind": chunk.chunk_ind,
-                **metadata_entry
-            }
-            metadatas.append(combined_metadata)
-
-        batch_size = 64
-        start_time = time.time()
-        for i in range(0, len(ids), batch_size):
-            effective_batch_size = batch_size
-            if len(ids) - i < batch_size:
-                effective_batch_size = len(ids) - i
-            
-            batch_ids = ids[i:i + effective_batch_size]
-            batch_documents = documents[i:i + effective_batch_size]
-            batch_metadata = metadatas[i:i + effective_batch_size]
-
-            batch_start = time.time()
-            self.course_material_collection.add(
-                ids=batch_ids,
-                documents=batch_documents,
-                metadatas=batch_metadata
-            )
-            self._logger.debug(
-                "Indexed course material batch size=%s offset=%s duration=%.2fs",
-                len(batch_ids),
-                i,
-                time.time() - batch_start,
-            )
-        
-        self._logger.info("Indexed course material complete total=%s duration=%.2fs", len(ids), time.time() - start_time)
+    def index_course_material(self, chunks: list[CourseMaterialChunk], metadata: list[dict], progress_callback=None) -> None:
+        self._index_chunks(self.course_material_collection, chunks, metadata, progress_callback)
 
 
     """
@@ -119,56 +165,192 @@ class VectorDB:
     Input:
         chunks... Chunks of old exams (questions) along with some metadata
         metadata... Metadata of the exam question chunks e.g. [{'topic': 'grpo'}, {'topic': 'transformers'}, ...]
+        progress_callback (Optional)... Called as progress_callback("embed", stored_chunks, total_chunks) after every embedded and stored batch
     """
-    def index_old_exam_questions(self, chunks: list[ExamQuestionChunk], metadata: list[dict]) -> None:
-        self._logger.info("Indexing old exam questions chunks=%s", len(chunks))        
+    def index_old_exam_questions(self, chunks: list[ExamQuestionChunk], metadata: list[dict], progress_callback=None) -> None:
+        self._index_chunks(self.old_exam_collection, chunks, metadata, progress_callback)
+
+    # embeds and stores the chunks with the indexing pipeline (embedding the next batches overlaps with storing the current one)
+    def _index_chunks(self, collection, chunks: list, metadata: list[dict], progress_callback=None) -> None:
+        self._logger.info("Indexing chunks collection=%s chunks=%s", collection.name, len(chunks))
 
-        if len(chunks) != len(metadata):
+        if len(metadata) != len(chunks):
             raise ValueError("Error! Metadata list is not as long as the chunks list")
-        
-        ids = []
-        documents = []
-        metadatas = []
-        
-        for chunk, metadata_entry in zip(chunks, metadata):
-            metadata_entry = self.clean_md(metadata_entry)
-            ids.append(chunk.id)
-            documents.append(chunk.text)
-            combined_metadata = {
-                "course_id": str(chunk.course_id),
-                "chunk_ind": chunk.chunk_ind,
-                "question_type": chunk.question_type.value,
-                **metadata_entry
-            }
-            metadatas.append(combined_metadata)
-        
-        batch_size = 64
-        start_time = time.time()
-        for i in range(0, len(ids), batch_size):
-            effective_batch_size = batch_size
-            if len(ids) - i < batch_size:
-                effective_batch_size = len(ids) - i
-
-            batch_ids = ids[i:i + effective_batch_size]
-            batch_documents = documents[i:i + effective_batch_size]
-            batch_metadata = metadatas[i:i + effective_batch_size]
-            
-            batch_start = time.time()
-            self.old_exam_collection.add(
-                ids=batch_ids,
-                documents=batch_documents,
-                metadatas=batch_metadata
-            )
-            self._logger.debug(
-                "Indexed old exam batch size=%s offset=%s duration=%.2fs",
-                len(batch_ids),
-                i,
-                time.time() - batch_start,
-            )
 
-        self._logger.info("Indexed old exam questions complete total=%s duration=%.2fs", len(ids), time.time() - start_time)
+        metadatas = [self._chunk_metadata(chunk, metadata_entry) for chunk, metadata_entry in zip(chunks, metadata)]
+        stats = self.indexing_pipeline.run(
+            collection,
+            ids=[chunk.id for chunk in chunks],
+            documents=[chunk.text for chunk in chunks],
+            metadatas=metadatas,
+            embed=self.embedding_function,
+            progress_callback=progress_callback,
+        )
+        if collection is self.old_exam_collection:
+            self._index_exam_vectors([chunk.id for chunk in chunks], [chunk.text for chunk in chunks], metadatas)
+        if collection is self.course_material_collection and self.bm25_index is not None:
+            for course_id in set(chunk.course_id for chunk in chunks):
+                course_chunks = [chunk for chunk in chunks if chunk.course_id == course_id]
+                self.bm25_index.add(collection.name, course_id, [chunk.id for chunk in course_chunks], [chunk.text for chunk in course_chunks])
+
+        self._bump_collection_version(collection.name, [chunk.course_id for chunk in chunks])
+        self._logger.info(
+            "Indexed chunks complete collection=%s total=%s batches=%s embed=%.2fs write=%.2fs duration=%.2fs",
+            collection.name,
+            stats["chunks"],
+            stats["batches"],
+            stats["embed_seconds"],
+            stats["write_seconds"],
+            stats["seconds"],
+        )
 
     
+    # stores the stem, answers and topic vectors of exam questions in the sibling collections
+    def _index_exam_vectors(self, question_ids: list[str], texts: list[str], metadatas: list[dict]) -> None:
+        for name, collection in self.exam_vector_collections.items():
+            ids, documents, vector_metadatas, empty_ids = [], [], [], []
+            for question_id, question_text, metadata in zip(question_ids, texts, metadatas):
+                text = self._exam_vector_texts(question_text, metadata)[name]
+                if not text:
+                    empty_ids.append(question_id)  # e.g. a question without answer keys
+                    continue
+                ids.append(question_id)
+                documents.append(text)
+                # only what is needed to filter and delete, the rest of the metadata is in `old_exam_collection`
+                vector_metadatas.append(self.clean_md({"course_id": metadata["course_id"], "material_id": metadata.get("material_id")}))
+            if empty_ids:
+                collection.delete(ids=empty_ids)
+            self.indexing_pipeline.run(collection, ids=ids, documents=documents, metadatas=vector_metadatas, embed=self.embedding_function)
+
+    # the texts of the exam vectors: the question stem, the answer keys and the topic (if it is known)
+    def _exam_vector_texts(self, text: str, metadata: dict) -> dict[str, str]:
+        question, answer_keys = self._split_question(text)
+        topic = metadata.get("topic") or ""
+        return {
+            "stem": question.strip(),
+            "answers": "\n".join(answer_keys or []),
+            "topic": "" if topic.strip().lower() == "unknown" else topic.strip(),
+        }
+
+    # "What is 1+1? [ANSWER_KEYS] A) 2 [SEP] B) 5" -> ("What is 1+1? ", ["A) 2", "B) 5"]), the answer keys are None for text questions
+    def _split_question(self, text: str) -> tuple[str, list[str] | None]:
+        question_and_answers = text.split("[ANSWER_KEYS]")
+        question = question_and_answers[0]
+        if len(question_and_answers) > 1:
+            answer_keys_str = question_and_answers[1].strip()
+            answer_keys = [key.strip() for key in answer_keys_str.split("[SEP]") if key.strip()]
+        else:
+            answer_keys = None
+        return question, answer_keys
+
+    def _to_question(self, document: str, metadata: dict) -> Question:
+        metadata = metadata.copy()
+        question_type = QuestionType(metadata.pop("question_type"))
+        question, answer_keys = self._split_question(document)
+        return Question(question=question, question_type=question_type, metadata=metadata, answer_keys=answer_keys)
+
+    """
+    Returns the IDs out of `ids` that are stored in the collection of `material_type` (nothing is embedded)
+    """
+    def existing_chunk_ids(self, material_type: CourseMaterialType, ids: list[str]) -> set[str]:
+        collection = self._collection_for(material_type)
+        existing: set[str] = set()
+        for i in range(0, len(ids), 500):
+            existing.update(collection.get(ids=ids[i:i + 500], include=[])["ids"])
+        return existing
+
+
+    """
+    Replaces the metadata of chunks that are already stored, without embedding their text again
+    (e.g. an unchanged slide whose page number changed in a revised deck)
+
+    Input:
+        chunks... Chunks that are already stored in the collection of `material_type`
+        metadata... The new metadata of the chunks, like in `index_course_material`
+    """
+    def update_chunk_metadata(self, material_type: CourseMaterialType, chunks: list, metadata: list[dict]) -> None:
+        if len(metadata) != len(chunks):
+            raise ValueError("Error! Metadata list is not as long as the chunks list")
+        if not chunks:
+            return
+
+        collection = self._collection_for(material_type)
+        for i in range(0, len(chunks), 500):
+            batch = list(zip(chunks[i:i + 500], metadata[i:i + 500]))
+            collection.update(
+                ids=[chunk.id for chunk, _ in batch],
+                metadatas=[self._chunk_metadata(chunk, metadata_entry) for chunk, metadata_entry in batch],
+            )
+        self._bump_collection_version(collection.name, [chunk.course_id for chunk in chunks])
+        self._logger.info("Updated chunk metadata collection=%s chunks=%s", collection.name, len(chunks))
+
+
+    """
+    Deletes single chunks of a course by their IDs (e.g. the chunks that were removed from a revised document)
+    """
+    def delete_chunks(self, material_type: CourseMaterialType, course_id: int, ids: list[str]) -> None:
+        if not ids:
+            return
+
+        collection = self._collection_for(material_type)
+        for i in range(0, len(ids), 500):
+            collection.delete(ids=ids[i:i + 500])
+            if material_type == CourseMaterialType.EXAM:
+                for vector_collection in self.exam_vector_collections.values():
+                    vector_collection.delete(ids=ids[i:i + 500])
+        if collection is self.course_material_collection and self.bm25_index is not None:
+            self.bm25_index.remove(collection.name, ids)
+        self._bump_collection_version(collection.name, [course_id])
+        self._logger.info("Deleted chunks collection=%s course_id=%s chunks=%s", collection.name, course_id, len(ids))
+
+
+    """
+    Deletes all chunks of one uploaded document (by the `material_id` in their metadata).
+    The chunks are looked up by the metadata filter and deleted in batches of `batch_size`, so the rest of the collection is never read.
+
+    Output:
+        int... the number of deleted chunks
+    """
+    def delete_material(self, material_type: CourseMaterialType, course_id: int, material_id: str, batch_size: int = 500) -> int:
+        collection = self._collection_for(material_type)
+        filter = {"$and": [{"course_id": str(course_id)}, {"material_id": material_id}]}
+        deleted = self._delete_where(collection, filter, batch_size)
+        if material_type == CourseMaterialType.EXAM:
+            for vector_collection in self.exam_vector_collections.values():
+                self._delete_where(vector_collection, filter, batch_size)
+        if collection is self.course_material_collection and self.bm25_index is not None:
+            self.bm25_index.remove(collection.name, deleted)
+        self._bump_collection_version(collection.name, [course_id])
+        self._logger.info("Deleted material collection=%s course_id=%s material_id=%s chunks=%s", collection.name, course_id, material_id, len(deleted))
+        return len(deleted)
+
+    # deletes the chunks that match `where` in batches, returns the IDs of the deleted chunks
+    def _delete_where(self, collection, where: dict, batch_size: int = 500) -> list[str]:
+        deleted = []
+        while True:
+            ids = collection.get(where=where, limit=batch_size, include=[])["ids"]
+            if not ids:
+                return deleted
+            collection.delete(ids=ids)
+            deleted.extend(ids)
+
+    def _collection_for(self, material_type: CourseMaterialType):
+        if material_type == CourseMaterialType.EXAM:
+            return self.old_exam_collection
+        return self.course_material_collection
+
+    # the metadata that is stored with a chunk: the metadata of the FileProcessor + course id, chunk index (+ question type)
+    def _chunk_metadata(self, chunk, metadata_entry: dict) -> dict:
+        combined_metadata = {
+            "course_id": str(chunk.course_id),
+            "chunk_ind": chunk.chunk_ind,
+        }
+        if isinstance(chunk, ExamQuestionChunk):
+            combined_metadata["question_type"] = chunk.question_type.value
+        combined_metadata.update(self.clean_md(metadata_entry))
+        return combined_metadata
+
+
     """
     Retrieves relevant course material from the `course_material_collection`
 
@@ -184,7 +366,6 @@ class VectorDB:
         self._logger.info("Retrieving course material course_id=%s query=%s n=%s", course_id, query, n)
 
         filter = {"course_id": str(course_id)}
-        pool_size = n * 10  # when we have no query, we sample n * 10 entries from the DB and then select random entries out of that
 
         # if there is no query we just return the top n results without any semantic search
         if query is None or query.strip() == "":
@@ -217,27 +398,149 @@ class VectorDB:
             return course_materials
         
         # when we have a query, we filter by it
-        results = self.course_material_collection.query(
-            query_texts=[query],
-            n_results=n,
-            where=filter,
-            include=["documents", "metadatas", "distances"]
-        )
+        query = self._normalize_query(query)
+        cache_key = (self.course_material_collection.name, int(course_id), query, n, self._collection_version(self.course_material_collection.name, course_id))
+        cached = self.retrieval_cache.get(cache_key)
+        if cached is not None:
+            self._logger.info("Retrieved course material from cache course_id=%s count=%s query=%s", course_id, len(cached), query)
+            return cached
+
+        query_embedding = self._embed_query(query)
+        # with MMR we rank more candidates than we need and pick a diverse top n out of them
+        pool_size = n * self.mmr_pool_factor if self.mmr_lambda < 1 else n
+        if self.bm25_index is not None:
+            candidates = self._hybrid_course_material(course_id, query, query_embedding, pool_size)
+        else:
+            candidates = self._vector_course_material(course_id, query_embedding, pool_size)
 
         course_materials = []
-        if results["ids"] and len(results["ids"][0]) > 0:
-            for i in range(len(results["ids"][0])):
-                metadata = results["metadatas"][0][i].copy()
-                metadata["relevancy_score"] = 1 - results["distances"][0][i] # i included this, maybe it is useful for the LLM
-
-                course_materials.append(
-                    CourseMaterial(text=results["documents"][0][i], metadata=metadata)
-                )
+        for document, metadata, relevancy_score, _ in self._mmr(candidates, n):
+            # i included the relevancy score, maybe it is useful for the LLM
+            course_materials.append(CourseMaterial(text=document, metadata={**metadata, "relevancy_score": relevancy_score}))
         
+        self.retrieval_cache.put(cache_key, course_materials)
         self._logger.info("Retrieved course material course_id=%s count=%s query=%s", course_id, len(course_materials), query)
         return course_materials
 
 
+    """
+    Ranks the course material of a course by reciprocal rank fusion (RRF) of a lexical (BM25) and a semantic (cosine) ranking.
+
+    The BM25 index returns its best `n` chunks and their cosine similarities are computed exactly from their stored embeddings.
+    They already fill part of the semantic ranking, so HNSW is asked for fewer neighbours (`n` minus half the lexical candidates).
+    Both rankings are then fused with
+    score = sum over both rankings of 1 / (rrf_k + rank), so chunks that rank well in both come first.
+
+    The `relevancy_score` of every chunk is its fused score relative to the best possible score (rank 1 in both rankings),
+    so the context budgeter keeps the fused order.
+    """
+    def _hybrid_course_material(self, course_id: int, query: str, query_embedding, n: int) -> list[tuple[str, dict, float, np.ndarray]]:
+        collection = self.course_material_collection
+        self._backfill_bm25(course_id)
+        lexical = [id for id, _ in self.bm25_index.search(collection.name, course_id, query, n)]
+
+        # the lexical candidates with their stored embeddings (and everything else we need to return them)
+        stored: dict[str, tuple[str, dict, float, np.ndarray]] = {}
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        query_vector = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+        if lexical:
+            results = collection.get(ids=lexical, include=["documents", "metadatas", "embeddings"])
+            if results["ids"]:
+                vectors = np.asarray(results["embeddings"], dtype=np.float32)
+                similarities = vectors @ query_vector / np.maximum(np.linalg.norm(vectors, axis=1), 1e-12)
+                for id, document, metadata, similarity, vector in zip(results["ids"], results["documents"], results["metadatas"], similarities, vectors):
+                    stored[id] = (document, metadata, float(similarity), vector)
+            lexical = [id for id in lexical if id in stored]  # e.g. chunks deleted from Chroma but not (yet) from the BM25 index
+
+        # the semantic ranking has to cover the top n, the lexical candidates among them are already known
+        results = collection.query(
+            query_embeddings=[query_embedding],
+            n_results=max(1, n - len(lexical) // 2),
+            where={"course_id": str(course_id)},
+            include=["documents", "metadatas", "distances", "embeddings"]
+        )
+        if results["ids"] and len(results["ids"][0]) > 0:
+            for id, document, metadata, distance, vector in zip(results["ids"][0], results["documents"][0], results["metadatas"][0], results["distances"][0], results["embeddings"][0]):
+                stored.setdefault(id, (document, metadata, 1 - distance, np.asarray(vector, dtype=np.float32)))
+
+        semantic = sorted(stored, key=lambda id: -stored[id][2])
+        fused: dict[str, float] = {}
+        for ranking in (lexical, semantic):
+            for rank, id in enumerate(ranking, start=1):
+                fused[id] = fused.get(id, 0.0) + 1.0 / (self.rrf_k + rank)
+
+        best_score = 2.0 / (self.rrf_k + 1)
+        candidates = []
+        for id in sorted(fused, key=lambda id: -fused[id])[:n]:
+            document, metadata, _, vector = stored[id]
+            candidates.append((document, metadata, fused[id] / best_score, vector))
+        return candidates
+
+    # the `n` nearest chunks of the course as (document, metadata, cosine similarity, embedding), best first
+    def _vector_course_material(self, course_id: int, query_embedding, n: int) -> list[tuple[str, dict, float, np.ndarray]]:
+        results = self.course_material_collection.query(
+            query_embeddings=[query_embedding],
+            n_results=n,
+            where={"course_id": str(course_id)},
+            include=["documents", "metadatas", "distances", "embeddings"]
+        )
+        if not results["ids"] or len(results["ids"][0]) == 0:
+            return []
+        return [
+            (document, metadata, 1 - distance, np.asarray(vector, dtype=np.float32))
+            for document, metadata, distance, vector in zip(results["documents"][0], results["metadatas"][0], results["distances"][0], results["embeddings"][0])
+        ]
+
+    """
+    Picks `n` of the candidates with maximal marginal relevance (MMR): one after another, the candidate with the best
+    mmr_lambda * relevance - (1 - mmr_lambda) * (highest cosine similarity to an already picked candidate).
+    Overlapping neighbours of the sliding window chunking are so similar to each other that usually only one of them is picked.
+
+    Input:
+        candidates... (document, metadata, relevance, embedding), best first
+    Output:
+        the picked candidates, in the order they were picked
+    """
+    def _mmr(self, candidates: list[tuple[str, dict, float, np.ndarray]], n: int) -> list[tuple[str, dict, float, np.ndarray]]:
+        if self.mmr_lambda >= 1 or len(candidates) <= n:
+            return candidates[:n]
+
+        vectors = np.stack([np.asarray(vector, dtype=np.float32) for *_, vector in candidates])
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        relevance = np.array([relevance for _, _, relevance, _ in candidates], dtype=np.float32)
+
+        picked = [0]  # the most relevant candidate is always picked first
+        max_similarity = vectors @ vectors[0]
+        available = np.ones(len(candidates), dtype=bool)
+        available[0] = False
+        while len(picked) < n:
+            scores = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * max_similarity
+            scores[~available] = -np.inf
+            best = int(np.argmax(scores))
+            picked.append(best)
+            available[best] = False
+            max_similarity = np.maximum(max_similarity, vectors @ vectors[best])
+        return [candidates[i] for i in picked]
+
+
+    # course material that was indexed before there was a BM25 index is added to it on the first query of its course
+    def _backfill_bm25(self, course_id: int, batch_size: int = 500) -> None:
+        if int(course_id) in self._bm25_checked_courses:
+            return
+        collection = self.course_material_collection
+        if not self.bm25_index.has_course(collection.name, course_id):
+            offset = 0
+            while True:
+                results = collection.get(where={"course_id": str(course_id)}, limit=batch_size, offset=offset, include=["documents"])
+                if not results["ids"]:
+                    break
+                self.bm25_index.add(collection.name, course_id, results["ids"], results["documents"])
+                offset += len(results["ids"])
+            if offset:
+                self._logger.info("Added existing course material to the BM25 index course_id=%s chunks=%s", course_id, offset)
+        self._bm25_checked_courses.add(int(course_id))
+
+
     """
     Retrieves old exam questions from the `old_exam_collection`
 
@@ -253,7 +556,6 @@ class VectorDB:
         self._logger.info("Retrieving old exam questions course_id=%s query=%s n=%s", course_id, query, n)
 
         filter = {"course_id": str(course_id)}
-        pool_size = n * 10  # when we have no query, we sample n * 10 entries from the DB and then select random entries out of that to improve lecture coverage
 
         # we just retrieve n old questions
         if query is None or query.strip() == "":
@@ -275,58 +577,125 @@ class VectorDB:
                 )
 
                 for i in range(len(results["ids"])):
-                    metadata = results["metadatas"][i].copy()
-
-                    question_type = metadata.pop("question_type")
-                    question_type = QuestionType(question_type)
-
-                    question_and_answers = results["documents"][i].split("[ANSWER_KEYS]")
-                    question = question_and_answers[0]
-                    if len(question_and_answers) > 1:
-                        answer_keys_str = question_and_answers[1].strip()
-                        answer_keys = [key.strip() for key in answer_keys_str.split("[SEP]") if key.strip()]
-                    else:
-                        answer_keys = None
-
-                    questions.append(
-                        Question(question=question, question_type=question_type, metadata=metadata, answer_keys=answer_keys)
-                    )
+                    questions.append(self._to_question(results["documents"][i], results["metadatas"][i]))
                 
             self._logger.info("Retrieved old exam questions course_id=%s count=%s", course_id, len(questions))
             return questions
             
         # we filter by the query
-        results = self.old_exam_collection.query(
-            query_texts=[query],
-            n_results=n,
-            where=filter,
-            include=["documents", "metadatas", "distances"]
-        )
+        query = self._normalize_query(query)
+        cache_key = (self.old_exam_collection.name, int(course_id), query, n, self._collection_version(self.old_exam_collection.name, course_id))
+        cached = self.retrieval_cache.get(cache_key)
+        if cached is not None:
+            self._logger.info("Retrieved old exam questions from cache course_id=%s count=%s query=%s", course_id, len(cached), query)
+            return cached
+
+        query_embedding = self._embed_query(query)
+        self._backfill_exam_vectors(course_id)
+        ranked = self._query_exam_vectors(course_id, query_embedding, n)
 
         questions = []
-        if results["ids"] and len(results["ids"][0]) > 0:
-            for i in range(len(results["ids"][0])):
-                metadata = results["metadatas"][0][i].copy()
-                metadata["relevancy_score"] = 1 - results["distances"][0][i]
-
-                question_type = metadata.pop("question_type")
-                question_type = QuestionType(question_type)
-
-                question_and_answers = results["documents"][0][i].split("[ANSWER_KEYS]")
-                question = question_and_answers[0]
-                if len(question_and_answers) > 1:
-                    answer_keys_str = question_and_answers[1].strip()
-                    answer_keys = [key.strip() for key in answer_keys_str.split("[SEP]") if key.strip()]
-                else:
-                    answer_keys = None
-
-                questions.append(
-                    Question(question=question, question_type=question_type, metadata=metadata, answer_keys=answer_keys)
-                )
+        if ranked:
+            results = self.old_exam_collection.get(ids=[id for id, _ in ranked], include=["documents", "metadatas"])
+            stored = {id: (document, metadata) for id, document, metadata in zip(results["ids"], results["documents"], results["metadatas"])}
+            for id, score in ranked:
+                if id in stored:
+                    document, metadata = stored[id]
+                    questions.append(self._to_question(document, {**metadata, "relevancy_score": score}))
+        else:
+            # no exam vectors to rank by (e.g. all weights are 0), rank by the embedding of the full text
+            results = self.old_exam_collection.query(
+                query_embeddings=[query_embedding],
+                n_results=n,
+                where=filter,
+                include=["documents", "metadatas", "distances"]
+            )
+            if results["ids"] and len(results["ids"][0]) > 0:
+                for i in range(len(results["ids"][0])):
+                    metadata = {**results["metadatas"][0][i], "relevancy_score": 1 - results["distances"][0][i]}
+                    questions.append(self._to_question(results["documents"][0][i], metadata))
         
+        self.retrieval_cache.put(cache_key, questions)
         self._logger.info("Retrieved old exam questions course_id=%s count=%s query=%s", course_id, len(questions), query)
         return questions
     
+    # old exam questions that were indexed before there were exam vectors get them on the first query of their course
+    def _backfill_exam_vectors(self, course_id: int, batch_size: int = 500) -> None:
+        if int(course_id) in self._exam_vectors_checked_courses:
+            return
+        filter = {"course_id": str(course_id)}
+        with_vectors: set[str] = set()
+        for collection in self.exam_vector_collections.values():
+            with_vectors.update(collection.get(where=filter, include=[])["ids"])
+
+        offset = 0
+        backfilled = 0
+        while True:
+            results = self.old_exam_collection.get(where=filter, limit=batch_size, offset=offset, include=["documents", "metadatas"])
+            if not results["ids"]:
+                break
+            offset += len(results["ids"])
+            missing = [i for i, id in enumerate(results["ids"]) if id not in with_vectors]
+            if missing:
+                self._index_exam_vectors(
+                    [results["ids"][i] for i in missing],
+                    [results["documents"][i] for i in missing],
+                    [results["metadatas"][i] for i in missing],
+                )
+                backfilled += len(missing)
+        if backfilled:
+            self._bump_collection_version(self.old_exam_collection.name, [course_id])
+            self._logger.info("Added exam vectors to existing old exam questions course_id=%s questions=%s", course_id, backfilled)
+        self._exam_vectors_checked_courses.add(int(course_id))
+
+    """
+    Ranks the old exam questions of a course by the weighted similarity of their exam vectors (stem, answers, topic) to the query.
+
+    Every exam vector collection is searched with the same query embedding for candidates (returning their vectors as well),
+    then the exact similarities of all candidates are computed from their vectors. Only the vectors of candidates that another
+    collection found are fetched afterwards. A question without some vector (e.g. no topic) is ranked by the weights of the others.
+
+    Output:
+        list[tuple[str, float]]... (chunk ID, fused similarity) of the best `n` questions, best first
+    """
+    def _query_exam_vectors(self, course_id: int, query_embedding, n: int) -> list[tuple[str, float]]:
+        filter = {"course_id": str(course_id)}
+        weighted = [(self.exam_vector_collections[name], weight) for name, weight in self.exam_vector_weights.items() if weight > 0]
+
+        candidates: dict[str, None] = {}
+        # per collection: the vectors of the candidates it found itself
+        found: list[dict[str, np.ndarray]] = []
+        for collection, _ in weighted:
+            result = collection.query(query_embeddings=[query_embedding], n_results=max(1, n * 3), where=filter, include=["embeddings"])
+            result_ids = result["ids"][0] if result["ids"] else []
+            found.append(dict(zip(result_ids, result["embeddings"][0])) if result_ids else {})
+            candidates.update(dict.fromkeys(result_ids))
+        if not candidates:
+            return []
+
+        ids = list(candidates)
+        rows = {id: row for row, id in enumerate(ids)}
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        query_vector = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+        scores = np.zeros(len(ids), dtype=np.float32)
+        weights = np.zeros(len(ids), dtype=np.float32)
+        for (collection, weight), vectors_by_id in zip(weighted, found):
+            missing = [id for id in ids if id not in vectors_by_id]
+            if missing:
+                stored = collection.get(ids=missing, include=["embeddings"])
+                vectors_by_id = {**vectors_by_id, **dict(zip(stored["ids"], stored["embeddings"]))}
+            if not vectors_by_id:
+                continue
+            vectors = np.asarray(list(vectors_by_id.values()), dtype=np.float32)
+            similarities = vectors @ query_vector / np.maximum(np.linalg.norm(vectors, axis=1), 1e-12)
+            index = [rows[id] for id in vectors_by_id]
+            scores[index] += weight * similarities
+            weights[index] += weight
+
+        fused = scores / np.maximum(weights, 1e-12)
+        order = np.argsort(-fused, kind="stable")[:n]
+        return [(ids[i], float(fused[i])) for i in order]
+
     """
     Deletes the data associated with a specific course id.
     I used this only for testing
@@ -335,20 +704,15 @@ class VectorDB:
         self._logger.info("Deleting all material for course_id %s", course_id)
 
         filter = {"course_id": str(course_id)}
-        
-        material_results = self.course_material_collection.get(
-            where=filter,
-            include=[]
-        )
-        if material_results['ids']:
-            self.course_material_collection.delete(ids=material_results['ids'])
-        
-        exam_results = self.old_exam_collection.get(
-            where=filter,
-            include=[]
-        )
-        if exam_results['ids']:
-            self.old_exam_collection.delete(ids=exam_results['ids'])
+        self._delete_where(self.course_material_collection, filter)
+        self._delete_where(self.old_exam_collection, filter)
+        for vector_collection in self.exam_vector_collections.values():
+            self._delete_where(vector_collection, filter)
+        if self.bm25_index is not None:
+            self.bm25_index.remove_course(self.course_material_collection.name, course_id)
+
+        self._bump_collection_version(self.course_material_collection.name, [course_id])
+        self._bump_collection_version(self.old_exam_collection.name, [course_id])
         
         self._logger.info("Deleted all material for course_id %s", course_id)
 
@@ -359,5 +723,10 @@ class VectorDB:
     """
     def delete_collections(self):
         self._logger.info("Deleting all collections...")
-        self.client.delete_collection("course_material")
-        self.client.delete_collection("old_exam_collection")
\ No newline at end of file
+        self.client.delete_collection(self.course_material_collection.name)
+        self.client.delete_collection(self.old_exam_collection.name)
+        for vector_collection in self.exam_vector_collections.values():
+            self.client.delete_collection(vector_collection.name)
+        if self.bm25_index is not None:
+            self.bm25_index.remove_collection(self.course_material_collection.name)
+        self.retrieval_cache.clear()
\ No newline at end of file
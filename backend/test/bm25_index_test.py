@@ -0,0 +1,48 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.bm25_index import BM25Index, tokenize
+
+
+def test_tokenize_splits_on_punctuation_and_ignores_case():
+    assert tokenize("GRPO vs. PPO (CS-101)") == ["grpo", "vs", "ppo", "cs", "101"]
+
+
+def test_rare_terms_and_short_documents_rank_first(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25.sqlite3"))
+    index.add("material", 1, ["a", "b", "c", "d"], [
+        "Serverless Computing",
+        "serverless functions scale to zero, serverless platforms bill per call and per memory",
+        "virtual machines and containers",
+        "containers everywhere",
+    ])
+    index.add("material", 2, ["other"], ["Serverless Computing"])
+
+    results = index.search("material", 1, "serverless computing", n=10)
+
+    assert [id for id, _ in results] == ["a", "b"]  # only chunks of course 1 that contain a query term
+    assert results[0][1] > results[1][1] > 0
+    assert index.search("material", 1, "lambda", n=10) == []
+    assert [id for id, _ in index.search("material", 1, "containers", n=1)] == ["d"]
+
+
+def test_index_is_persisted_and_updated_incrementally(tmp_path):
+    path = str(tmp_path / "bm25.sqlite3")
+    index = BM25Index(path)
+    index.add("material", 1, ["a", "b"], ["GRPO and PPO", "PPO only"])
+    assert [id for id, _ in index.search("material", 1, "grpo", n=5)] == ["a"]  # the course is loaded and compiled here
+
+    index.add("material", 1, ["c"], ["GRPO again, GRPO"])
+    index.remove("material", ["a"])
+    assert [id for id, _ in index.search("material", 1, "grpo", n=5)] == ["c"]
+    index.close()
+
+    reopened = BM25Index(path)
+    assert reopened.has_course("material", 1)
+    assert [id for id, _ in reopened.search("material", 1, "ppo grpo", n=5)] == ["c", "b"]
+
+    reopened.remove_course("material", 1)
+    assert not reopened.has_course("material", 1)
+    assert reopened.search("material", 1, "ppo", n=5) == []
@@ -0,0 +1,46 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from models.course_material import CourseMaterial
+from models.question import Question
+from models.question_type import QuestionType
+from services.context_budgeter import ContextBudgeter
+
+TEXT = " ".join(f"Sentence number {i} about policy gradients." for i in range(60))
+
+
+def _material(text: str, score: float) -> CourseMaterial:
+    return CourseMaterial(
+        text=text,
+        metadata={"topic": "RL", "page_start": 3, "page_end": 3, "char_len": len(text), "ocr_language": "eng", "relevancy_score": score},
+    )
+
+
+def test_drops_noisy_metadata_and_chunk_overlap():
+    # two consecutive chunks of the same page, with a 200 char overlap like the FileProcessor creates them
+    first, second = TEXT[:1000], TEXT[800:1800]
+    materials = [_material(second, 0.5), _material(first, 0.9)]
+    questions = [Question(question="What is PPO?", question_type=QuestionType.TEXT_ANSWER, metadata={"question_number": 1, "topic": "unknown", "difficulty": "hard"})]
+
+    context = ContextBudgeter(max_tokens=10_000).pack(materials, questions)
+
+    assert [m.text for m in context.course_material] == [first, TEXT[1000:1800].strip()]
+    assert context.course_material[0].metadata == {"topic": "RL"}
+    assert context.old_questions[0].metadata == {"difficulty": "hard"}
+    assert context.tokens_after < context.tokens_before
+    # the retrieved items aren't modified
+    assert materials[0].text == second and "relevancy_score" in materials[0].metadata
+
+
+def test_packs_most_relevant_items_into_the_budget():
+    materials = [_material(f"Chunk {i}: " + TEXT[i * 300:i * 300 + 250], score) for i, score in enumerate([0.1, 0.8, 0.5, 0.9])]
+    item_tokens = ContextBudgeter().count_tokens(f"\n--- Course Material 1 ---\n{materials[0].text}\nMetadata: {{'topic': 'RL'}}\n")
+    budgeter = ContextBudgeter(max_tokens=int(item_tokens * 2.5), question_share=0.0)
+
+    context = budgeter.pack(materials, [])
+
+    assert context.tokens_after <= budgeter.max_tokens
+    assert [m.text.split(":")[0] for m in context.course_material] == ["Chunk 3", "Chunk 1"]
+    assert context.n_dropped == 2
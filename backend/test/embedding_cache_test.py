@@ -0,0 +1,102 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.embedding_cache import CachedEmbeddingFunction, EmbeddingCache
+from services.vector_db import VectorDB
+from models.course_material_chunk import CourseMaterialChunk
+
+
+class _CountingEmbeddingFunction:
+    def __init__(self):
+        self.embedded: list[str] = []
+
+    def __call__(self, input):
+        self.embedded.extend(input)
+        return [[float(len(text)), 1.0, 0.5] for text in input]
+
+    def name(self):
+        return "default"
+
+    def is_legacy(self):
+        return False
+
+    def get_config(self):
+        return {}
+
+    def default_space(self):
+        return "cosine"
+
+    def supported_spaces(self):
+        return ["cosine"]
+
+
+def test_only_cache_misses_are_embedded(tmp_path):
+    inner = _CountingEmbeddingFunction()
+    cache = EmbeddingCache(db_path=str(tmp_path / "cache.sqlite3"))
+    embedding_function = CachedEmbeddingFunction(inner, cache=cache, model_name="test-model")
+
+    first = embedding_function(["alpha", "beta", "alpha"])
+    second = embedding_function(["beta", " alpha ", "gamma"])
+
+    assert inner.embedded == ["alpha", "beta", "gamma"]
+    assert [list(v) for v in first] == [[5.0, 1.0, 0.5], [4.0, 1.0, 0.5], [5.0, 1.0, 0.5]]
+    assert list(second[1]) == list(first[0])  # whitespace is normalized away in the cache key
+    assert cache.stats()["misses"] == 4  # counted per text, the duplicate "alpha" was embedded only once
+
+
+def test_cache_survives_restart_and_is_keyed_by_model(tmp_path):
+    db_path = str(tmp_path / "cache.sqlite3")
+    CachedEmbeddingFunction(_CountingEmbeddingFunction(), cache=EmbeddingCache(db_path=db_path), model_name="model-a")(["slide text"])
+
+    inner = _CountingEmbeddingFunction()
+    restarted = EmbeddingCache(db_path=db_path, max_memory_items=0)
+    CachedEmbeddingFunction(inner, cache=restarted, model_name="model-a")(["slide text"])
+    assert inner.embedded == []
+    assert restarted.stats()["disk_hits"] == 1
+
+    CachedEmbeddingFunction(inner, cache=restarted, model_name="model-b")(["slide text"])
+    assert inner.embedded == ["slide text"]
+
+
+def test_reindexing_the_same_slides_does_not_embed_again(tmp_path):
+    inner = _CountingEmbeddingFunction()
+    vector_db = VectorDB(
+        db_path=str(tmp_path / "chroma"),
+        embedding_function=inner,
+        require_api_key=False,
+        embedding_cache=EmbeddingCache(db_path=str(tmp_path / "cache.sqlite3")),
+    )
+    for course_id in (1, 2):
+        chunks = [CourseMaterialChunk(id=f"{course_id}-slides-{i}", course_id=course_id, chunk_ind=i, text=f"slide {i}") for i in range(3)]
+        vector_db.index_course_material(chunks, [{"topic": "unknown"}] * 3)
+
+    assert inner.embedded == ["slide 0", "slide 1", "slide 2"]
+    assert len(vector_db.retrieve_course_material(course_id=2, n=5)) == 3
+    vector_db.delete_collections()
+
+
+def test_collections_store_the_cached_function_config_and_can_be_reopened(tmp_path):
+    def open_vector_db():
+        return VectorDB(
+            db_path=str(tmp_path / "chroma"),
+            embedding_function=_CountingEmbeddingFunction(),
+            require_api_key=False,
+            embedding_cache=EmbeddingCache(db_path=str(tmp_path / "cache.sqlite3")),
+        )
+
+    vector_db = open_vector_db()
+    vector_db.index_course_material([CourseMaterialChunk(id="1-slides-0", course_id=1, chunk_ind=0, text="slide")], [{"topic": "unknown"}])
+
+    # Chroma registers the function by the name of its class
+    assert CachedEmbeddingFunction.name() == "cached"
+    config = vector_db.course_material_collection.configuration_json["embedding_function"]
+    assert config["name"] == "cached" and config["config"]["embedding_function"] == "default"
+    rebuilt = CachedEmbeddingFunction.build_from_config(config["config"])
+    assert rebuilt.default_space() == "cosine"
+
+    reopened = open_vector_db()
+    reopened.index_course_material([CourseMaterialChunk(id="1-slides-1", course_id=1, chunk_ind=1, text="another slide")], [{"topic": "unknown"}])
+    assert len(reopened.retrieve_course_material(course_id=1, n=5)) == 2
+    reopened.delete_collections()
@@ -0,0 +1,68 @@
+import sys
+from pathlib import Path
+
+import mongomock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from models.course_material_type import CourseMaterialType
+from models.exam_variant import ExamVariant
+from services.exam_cache import ExamCache
+from services.hash_db import HashDB
+
+
+def _variant(key: str, seed: int, material_version: str = "v1") -> ExamVariant:
+    return ExamVariant(
+        key=key, course_id=1, topics="ppo", n_questions=5, material_version=material_version,
+        model="test-model", seed=seed, questions=[{"question": f"Q{seed}"}], pdf=f"pdf {seed}".encode(),
+    )
+
+
+def test_variants_are_handed_out_once_and_can_be_replayed_by_seed():
+    cache = ExamCache(client=mongomock.MongoClient(), pool_size=2, max_serves=1)
+    key = ExamCache.make_key(1, "PPO,  Transformers", 5, "v1", "test-model")
+    assert key == ExamCache.make_key(1, "transformers, ppo", 5, "v1", "test-model")
+
+    cache.put_variant(_variant(key, seed=11))
+    cache.put_variant(_variant(key, seed=22))
+    assert cache.missing_variants(key) == 0
+
+    served = {cache.take_variant(key).seed, cache.take_variant(key).seed}
+    assert served == {11, 22}
+    assert cache.take_variant(key) is None
+    assert cache.missing_variants(key) == 2
+
+    replay = cache.take_variant(key, seed=11)
+    assert replay.pdf == b"pdf 11" and replay.served_count == 2
+
+
+def test_new_material_version_replaces_old_variants():
+    client = mongomock.MongoClient()
+    cache = ExamCache(client=client)
+    hash_db = HashDB(client=client)
+
+    version = hash_db.get_material_version(1)
+    hash_db.add_file_hash(course_id=1, hash="abc", type=CourseMaterialType.NOTES, filename="notes.pdf")
+    hash_db.add_file_hash(course_id=1, hash="generated", generated=True)
+    new_version = hash_db.get_material_version(1)
+    assert new_version != version
+
+    old_key = ExamCache.make_key(1, "ppo", 5, version, "test-model")
+    new_key = ExamCache.make_key(1, "ppo", 5, new_version, "test-model")
+    cache.put_variant(_variant(old_key, seed=1, material_version=version))
+    cache.put_variant(_variant(new_key, seed=2, material_version=new_version))
+
+    assert cache.take_variant(old_key, seed=1) is None
+    assert cache.take_variant(new_key).seed == 2
+
+
+def test_popular_requests():
+    cache = ExamCache(client=mongomock.MongoClient())
+    for topics in ["PPO", "ppo ", "Transformers", "PPO"]:
+        cache.record_request(1, topics, 20)
+    cache.record_request(2, "PPO", 20)
+
+    assert cache.popular_requests(1) == [
+        {"topics": "ppo", "n_questions": 20, "count": 3},
+        {"topics": "transformers", "n_questions": 20, "count": 1},
+    ]
@@ -1,13 +1,16 @@
 import io
+import threading
 from pathlib import Path
 
+import fitz
 import pytest
 from fpdf import FPDF
 
 import sys
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
-from services.file_processor import FileProcessor
+from services.file_processor import FileProcessor, ProcessingCancelled, _OcrProfile
+from services.ocr_cache import OcrCache, OcrResult
 from models.course_material_type import CourseMaterialType
 from models.question_type import QuestionType
 
@@ -39,7 +42,8 @@ def test_course_material_chunking_and_metadata():
     )
 
     assert len(chunks) == len(metadata) > 1
-    assert chunks[0].id == f"123-{CourseMaterialType.NOTES.value}-0"
+    assert chunks[0].id.startswith(f"123-{CourseMaterialType.NOTES.value}-")
+    assert len({chunk.id for chunk in chunks}) == len(chunks)
     assert metadata[0]["page_start"] == 1
     assert metadata[0]["page_end"] == 1
     assert metadata[0]["has_images"] is False
@@ -85,3 +89,283 @@ D) 9
     assert metadata[1]["question_number"] == 2
     assert metadata[1]["has_choices"] is True
     assert metadata[1]["question_type"] == QuestionType.MULTIPLE_CHOICE.value
+
+
+class _FakeOCRProcessor(FileProcessor):
+    """Pretends every page is a scan so the OCR pipeline runs without a tesseract binary."""
+
+    def _ensure_ocr_ready(self) -> bool:
+        self.use_ocr = True
+        return True
+
+    def _needs_ocr(self, native_text: str) -> bool:
+        return True
+
+    def _extract_ocr_from_page(self, render_doc, page_index: int, native_text: str = "", profile=None):
+        page = render_doc.load_page(page_index)
+        return OcrResult(f"ocr page {page_index + 1} width={int(page.rect.width)}", "eng")
+
+
+def test_parallel_ocr_matches_serial_output():
+    pdf_stream = _build_pdf([f"Page {i} " * 30 for i in range(6)])
+
+    serial = _FakeOCRProcessor(text_chunk_size=80, text_chunk_overlap=10, ocr_workers=1)
+    parallel = _FakeOCRProcessor(text_chunk_size=80, text_chunk_overlap=10, ocr_workers=3)
+
+    serial_metadata, serial_chunks = serial.chunk_and_enrich(pdf_stream, CourseMaterialType.SLIDES, course_id=7)
+    parallel_metadata, parallel_chunks = parallel.chunk_and_enrich(pdf_stream, CourseMaterialType.SLIDES, course_id=7)
+
+    assert parallel_chunks == serial_chunks
+    assert parallel_metadata == serial_metadata
+    assert "ocr page 6" in serial_chunks[-1].text
+
+
+class _CountingOCRProcessor(_FakeOCRProcessor):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.ocr_calls = 0
+
+    def _extract_ocr_from_page(self, render_doc, page_index: int, native_text: str = "", profile=None):
+        self.ocr_calls += 1
+        return super()._extract_ocr_from_page(render_doc, page_index, native_text, profile)
+
+
+def test_ocr_cache_skips_known_pages(tmp_path):
+    cache_path = str(tmp_path / "ocr.sqlite3")
+    first = _CountingOCRProcessor(ocr_cache=OcrCache(db_path=cache_path))
+    _, first_chunks = first.chunk_and_enrich(_build_pdf(["Page one", "Page two"]), CourseMaterialType.SLIDES, course_id=1)
+    assert first.ocr_calls == 2
+
+    # same PDF in another course, after a restart: nothing is OCR'd again
+    second = _CountingOCRProcessor(ocr_cache=OcrCache(db_path=cache_path))
+    _, second_chunks = second.chunk_and_enrich(_build_pdf(["Page one", "Page two"]), CourseMaterialType.SLIDES, course_id=2)
+    assert second.ocr_calls == 0
+    assert [c.text for c in second_chunks] == [c.text for c in first_chunks]
+
+    # a changed page and a different DPI are misses
+    third = _CountingOCRProcessor(ocr_cache=OcrCache(db_path=cache_path))
+    third.chunk_and_enrich(_build_pdf(["Page one", "Page 2"]), CourseMaterialType.SLIDES, course_id=3)
+    assert third.ocr_calls == 1
+    fourth = _CountingOCRProcessor(ocr_cache=OcrCache(db_path=cache_path), ocr_dpi=200)
+    fourth.chunk_and_enrich(_build_pdf(["Page one"]), CourseMaterialType.SLIDES, course_id=4)
+    assert fourth.ocr_calls == 1
+
+
+    # so are another OCR engine and another document profile (language/rotation)
+    fifth = _CountingOCRProcessor(ocr_cache=OcrCache(db_path=cache_path))
+    fifth.ocr_engine.name = "tesserocr"
+    fifth.chunk_and_enrich(_build_pdf(["Page one"]), CourseMaterialType.SLIDES, course_id=5)
+    assert fifth.ocr_calls == 1
+    render_doc = fitz.open(stream=_build_pdf(["Page one"]).getvalue(), filetype="pdf")
+    keys = {
+        first._ocr_cache_key(render_doc, 0, "", profile)
+        for profile in (None, _OcrProfile(rotation=0, lang="eng", sampled_pages=3), _OcrProfile(rotation=0, lang="deu", sampled_pages=3), _OcrProfile(rotation=90, lang="eng", sampled_pages=3))
+    }
+    assert len(keys) == 4
+
+
+def test_cancelled_processing_raises():
+    cancel_event = threading.Event()
+    cancel_event.set()
+    processor = _FakeOCRProcessor(ocr_workers=2)
+
+    with pytest.raises(ProcessingCancelled):
+        processor.chunk_and_enrich(_build_pdf(["a", "b"]), CourseMaterialType.NOTES, course_id=1, cancel_event=cancel_event)
+
+
+def test_pdf_backends_extract_the_same_pages(tmp_path):
+    from PIL import Image
+
+    image_path = tmp_path / "figure.png"
+    Image.new("RGB", (40, 40), color=(200, 30, 30)).save(image_path)
+    pdf = FPDF()
+    pdf.set_font("Arial", size=12)
+    pdf.add_page()
+    pdf.multi_cell(0, 10, "Plain text page about policy gradients.")
+    pdf.add_page()
+    pdf.multi_cell(0, 10, "A page with a figure.")
+    pdf.image(str(image_path), x=10, y=40, w=40)
+    pdf_stream = io.BytesIO(pdf.output(dest="S").encode("latin1"))
+
+    results = {}
+    for pdf_backend in ("pymupdf", "pypdf"):
+        processor = FileProcessor(use_ocr=False, pdf_backend=pdf_backend)
+        assert processor.pdf_backend == pdf_backend
+        results[pdf_backend] = processor.chunk_and_enrich(pdf_stream, CourseMaterialType.SLIDES, course_id=5)
+
+    for metadata, chunks in results.values():
+        assert metadata[1]["has_images"] is True
+        assert "policy gradients" in chunks[0].text
+        assert "figure" in chunks[1].text
+    # fpdf shares one resource dictionary between all pages, so both backends see the image on every page
+    assert [m["has_images"] for m in results["pymupdf"][0]] == [m["has_images"] for m in results["pypdf"][0]]
+
+
+class _TriageProcessor(_FakeOCRProcessor):
+    """Runs the real page triage, with a fake thumbnail probe that finds `probe_words` new words on every page it is asked about."""
+
+    def __init__(self, probe_words: int = 10, **kwargs):
+        super().__init__(**kwargs)
+        self.probe_words = probe_words
+        self.probed_pages = []
+
+    def _needs_ocr(self, native_text: str) -> bool:
+        return FileProcessor._needs_ocr(self, native_text)
+
+    def _probe_new_words(self, render_doc, page_index: int, native_text: str) -> int:
+        self.probed_pages.append(page_index)
+        return self.probe_words
+
+
+def _triage_pdf(tmp_path) -> bytes:
+    from PIL import Image
+
+    image_path = tmp_path / "scan.png"
+    Image.new("RGB", (400, 500), color=(240, 240, 240)).save(image_path)
+    Image.new("RGB", (60, 60), color=(20, 60, 160)).save(tmp_path / "logo.png")
+    pdf = FPDF()
+    pdf.set_font("Arial", size=12)
+    pdf.add_page()
+    pdf.multi_cell(0, 10, "A born-digital page with a good text layer. " * 5)
+    pdf.add_page()
+    pdf.multi_cell(0, 10, "A slide with a large diagram.")
+    pdf.image(str(image_path), x=10, y=40, w=180)
+    pdf.add_page()
+    pdf.image(str(image_path), x=0, y=0, w=210)  # a scanned page without a text layer
+    pdf.add_page()
+    pdf.multi_cell(0, 10, "Thank you")  # a short closing slide with a small logo
+    pdf.image(str(tmp_path / "logo.png"), x=190, y=5, w=15)
+    return pdf.output(dest="S").encode("latin1")
+
+
+def test_page_triage_only_ocrs_pages_that_need_it(tmp_path):
+    pdf_bytes = _triage_pdf(tmp_path)
+
+    processor = _TriageProcessor(text_chunk_size=2000, text_chunk_overlap=10, min_text_len_for_ocr=20, probe_words=0)
+    metadata, chunks = processor.chunk_and_enrich(io.BytesIO(pdf_bytes), CourseMaterialType.SLIDES, course_id=3)
+
+    # pages with a text layer are never OCR'd, and the short slide is only probed instead of OCR'd like without triage
+    decisions = {m["page_start"]: m["ocr_decision"] for m in metadata}
+    assert decisions == {1: "skip:text_layer", 2: "skip:text_layer", 3: "ocr:no_text_layer", 4: "skip:probe_no_new_text"}
+    assert processor.probed_pages == [3]
+    assert metadata[0]["ocr_used"] is False and metadata[2]["ocr_used"] is True
+    assert metadata[2]["image_coverage"] > 0.5
+
+    # opt-in: image-heavy pages with a text layer are probed and OCR'd if the probe finds new words
+    processor = _TriageProcessor(text_chunk_size=2000, text_chunk_overlap=10, min_text_len_for_ocr=20, triage_probe_text_pages=True)
+    metadata, chunks = processor.chunk_and_enrich(io.BytesIO(pdf_bytes), CourseMaterialType.SLIDES, course_id=3)
+
+    decisions = {m["page_start"]: m["ocr_decision"] for m in metadata}
+    assert decisions == {1: "skip:text_layer", 2: "ocr:probe_found_text", 3: "ocr:no_text_layer", 4: "ocr:probe_found_text"}
+    assert processor.probed_pages == [1, 3]
+
+
+class _RegionOCRProcessor(FileProcessor):
+    """Runs the region OCR with a fake tesseract that reports the size of every image it gets."""
+
+    def _ensure_ocr_ready(self) -> bool:
+        self.use_ocr = True
+        return True
+
+    def _probe_new_words(self, render_doc, page_index: int, native_text: str) -> int:
+        return 10
+
+    def _ocr_image(self, image, lang: str, dpi: int, page_index: int) -> str:
+        return f"region {image.shape[1]}x{image.shape[0]}", 90.0
+
+
+def test_region_ocr_only_reads_the_largest_images_in_reading_order(tmp_path):
+    from PIL import Image
+
+    sizes = {"top.png": (300, 200), "small.png": (60, 60), "bottom.png": (400, 100)}
+    for name, size in sizes.items():
+        Image.new("RGB", size, color=(230, 230, 230)).save(tmp_path / name)
+    pdf = FPDF()
+    pdf.set_font("Arial", size=12)
+    pdf.add_page()
+    pdf.multi_cell(0, 10, "A slide about PPO with two diagrams and a small logo.")
+    pdf.image(str(tmp_path / "bottom.png"), x=10, y=200, w=180)
+    pdf.image(str(tmp_path / "top.png"), x=10, y=40, w=150)
+    pdf.image(str(tmp_path / "small.png"), x=180, y=5, w=15)
+    pdf_stream = io.BytesIO(pdf.output(dest="S").encode("latin1"))
+
+    processor = _RegionOCRProcessor(
+        text_chunk_size=2000, text_chunk_overlap=10, min_text_len_for_ocr=0,
+        triage_min_image_coverage=0.0, ocr_mode="regions", max_images_per_page=2,
+    )
+    metadata, chunks = processor.chunk_and_enrich(pdf_stream, CourseMaterialType.SLIDES, course_id=4)
+
+    assert metadata[0]["ocr_used"] is True
+    # native resolution, top to bottom, and the logo is over the limit
+    assert chunks[0].text.endswith("region 300x200\nregion 400x100")
+
+
+class _RenderRecordingProcessor(_FakeOCRProcessor):
+    """Runs the real page rendering and records what would be sent to tesseract."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.ocr_inputs = []
+
+    def _extract_ocr_from_page(self, render_doc, page_index: int, native_text: str = "", profile=None):
+        return FileProcessor._extract_ocr_from_page(self, render_doc, page_index, native_text, profile)
+
+    def _detect_rotation(self, preview) -> int:
+        self.ocr_inputs.append(("preview", preview.size, None))
+        return 0
+
+    def _ocr_image(self, image, lang: str, dpi: int, page_index: int) -> str:
+        self.ocr_inputs.append(("page", image.shape, dpi))
+        return "scanned text", 90.0
+
+
+def test_pages_are_rendered_in_grayscale_at_the_ocr_size():
+    processor = _RenderRecordingProcessor(ocr_dpi=300, ocr_max_dim=2000, ocr_min_dim=1000)
+    _, chunks = processor.chunk_and_enrich(_build_pdf(["A4 page"]), CourseMaterialType.SLIDES, course_id=1)
+
+    (_, preview_size, _), (_, shape, dpi) = processor.ocr_inputs
+    assert max(preview_size) <= 1000
+    # 300 DPI would be 3508 pixels high, the page is rendered at the 2000 pixel limit instead of being resized afterwards
+    assert len(shape) == 2 and max(shape) == 2000
+    assert dpi == 171
+    assert "scanned text" in chunks[0].text
+
+
+class _FakeEngine:
+    """Counts the tesseract calls; the OCR confidence of the pages listed in `low_confidence_calls` is low."""
+
+    name = "fake"
+
+    def __init__(self, low_confidence_calls=(), rotations=None):
+        self.calls = 0
+        self.recognize_calls = 0
+        self.osd_calls = 0
+        self.low_confidence_calls = set(low_confidence_calls)
+        self.rotations = list(rotations or [])
+
+    def recognize(self, image, lang, psm, dpi=None):
+        self.calls += 1
+        self.recognize_calls += 1
+        confidence = 20.0 if self.recognize_calls in self.low_confidence_calls else 92.0
+        return f"text {self.recognize_calls} rotated={image.shape[1] > image.shape[0]}", confidence
+
+    def detect_rotation(self, image):
+        self.calls += 1
+        self.osd_calls += 1
+        return self.rotations.pop(0) if self.rotations else 0
+
+
+def test_orientation_is_detected_once_per_document_and_rechecked_on_low_confidence():
+    pdf_stream = _build_pdf([f"Scanned page {i}" for i in range(8)])
+
+    processor = _RenderRecordingProcessor(ocr_profile_sample_pages=3)
+    processor._detect_rotation = lambda preview: FileProcessor._detect_rotation(processor, preview)
+    processor._ocr_image = lambda image, lang, dpi, page_index: FileProcessor._ocr_image(processor, image, lang, dpi, page_index)
+    # 3 sample pages, then page 5 (the 5th recognize call) is turned: its own OSD finds the rotation and it is OCR'd again
+    processor.ocr_engine = _FakeEngine(low_confidence_calls={5}, rotations=[0, 0, 0, 90])
+    metadata, chunks = processor.chunk_and_enrich(pdf_stream, CourseMaterialType.SLIDES, course_id=1)
+
+    assert processor.ocr_engine.osd_calls == 4  # instead of one per page
+    assert processor.ocr_engine.recognize_calls == 9
+    texts = {m["page_start"]: c.text for m, c in zip(metadata, chunks)}
+    assert "rotated=True" in texts[5] and "rotated=False" in texts[4]
@@ -0,0 +1,48 @@
+import sys
+from pathlib import Path
+
+import mongomock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from models.course_material_type import CourseMaterialType
+from services.hash_db import HashDB
+
+
+def test_legacy_entries_get_their_material_id_stored():
+    client = mongomock.MongoClient()
+    # written before material IDs existed: the filename (or the hash) identified the document
+    client["hash_db"]["hashes"].insert_many([
+        {"course_id": 1, "hash": "hash-a", "type": "slides", "filename": "a.pdf"},
+        {"course_id": 1, "hash": "hash-b", "type": "notes"},
+        {"course_id": 1, "hash": "hash-exam", "type": "generated"},
+    ])
+
+    hash_db = HashDB(client=client)
+
+    material_id = HashDB.material_id(CourseMaterialType.SLIDES, "a.pdf")
+    assert hash_db.get_material(1, material_id)["hash"] == "hash-a"
+    assert hash_db.get_material(1, HashDB.material_id(CourseMaterialType.NOTES, "hash-b"))["material"] == "hash-b"
+    assert "material_id" not in client["hash_db"]["hashes"].find_one({"hash": "hash-exam"})
+    assert hash_db.get_material(2, material_id) is None
+
+    hash_db.remove_material(1, material_id)
+    assert hash_db.get_file_hash(1, "hash-a") is None and hash_db.get_file_hash(1, "hash-b") is not None
+
+
+def test_material_version_changes_only_when_material_changes():
+    hash_db = HashDB(client=mongomock.MongoClient())
+    empty = hash_db.get_material_version(1)
+    assert hash_db.get_material_version(1) == empty
+
+    hash_db.add_file_hash(1, "hash-a", CourseMaterialType.SLIDES, filename="a.pdf")
+    uploaded = hash_db.get_material_version(1)
+    assert uploaded != empty
+
+    # generated exams and other courses don't count
+    hash_db.add_file_hash(1, "hash-exam", generated=True)
+    hash_db.add_file_hash(2, "hash-c", CourseMaterialType.NOTES, filename="c.pdf")
+    assert hash_db.get_material_version(1) == uploaded
+
+    hash_db.remove_file_hash(1, "hash-a")
+    assert hash_db.get_material_version(1) != uploaded
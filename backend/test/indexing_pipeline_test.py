@@ -0,0 +1,77 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.indexing_pipeline import IndexingPipeline
+from services.openrouter_client import OpenRouterError
+
+
+class _SlowCollection:
+    name = "test"
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.upserts: list[dict] = []
+        self.events: list[tuple[str, int, float]] = []
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.events.append(("write_start", len(self.upserts), time.perf_counter()))
+        time.sleep(self.delay)
+        self.upserts.append({"ids": ids, "embeddings": embeddings, "documents": documents, "metadatas": metadatas})
+        self.events.append(("write_end", len(self.upserts) - 1, time.perf_counter()))
+
+
+def test_next_batch_is_embedded_while_the_previous_one_is_written():
+    collection = _SlowCollection(delay=0.05)
+    embed_starts: list[float] = []
+
+    def embed(texts):
+        embed_starts.append(time.perf_counter())
+        time.sleep(0.05)
+        return [[float(len(text))] for text in texts]
+
+    documents = [f"chunk {i}" for i in range(8)]
+    stats = IndexingPipeline(max_batch_size=2).run(collection, [str(i) for i in range(8)], documents, [{"i": i} for i in range(8)], embed)
+
+    assert stats["batches"] == 4 and len(collection.upserts) == 4
+    assert [id for upsert in collection.upserts for id in upsert["ids"]] == [str(i) for i in range(8)]
+    assert collection.upserts[0]["embeddings"] == [[7.0], [7.0]]  # precomputed, Chroma doesn't embed
+    # batch 1 started embedding before batch 0 was written
+    first_write_end = next(t for kind, batch, t in collection.events if kind == "write_end" and batch == 0)
+    assert embed_starts[1] < first_write_end
+    # 4 x (embed + write) would take 0.4s, overlapped it's about 5 x 0.05s
+    assert stats["seconds"] < 0.37
+
+
+def test_batches_follow_the_token_limit_and_rejected_batches_are_split():
+    calls: list[int] = []
+    rejected = threading.Event()
+
+    def embed(texts):
+        calls.append(len(texts))
+        if len(texts) > 2 and not rejected.is_set():
+            rejected.set()
+            raise OpenRouterError(413, "too many tokens")
+        return [[0.0] for _ in texts]
+
+    pipeline = IndexingPipeline(max_batch_tokens=40, max_in_flight=1, count_tokens=lambda text: 10)
+    collection = _SlowCollection(delay=0)
+    pipeline.run(collection, [str(i) for i in range(10)], ["x"] * 10, [{}] * 10, embed)
+
+    assert calls[:3] == [4, 2, 2]  # 4 texts of 10 tokens fit, the rejected batch is split in half
+    assert pipeline.max_batch_tokens == 20  # the following batches are cut smaller
+    assert max(calls[3:]) == 2
+    assert sum(len(upsert["ids"]) for upsert in collection.upserts) == 10
+
+
+def test_other_errors_are_raised():
+    def embed(texts):
+        raise OpenRouterError(401, "unauthorized")
+
+    with pytest.raises(OpenRouterError):
+        IndexingPipeline().run(_SlowCollection(delay=0), ["1"], ["text"], [{}], embed)
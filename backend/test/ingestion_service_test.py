@@ -0,0 +1,137 @@
+import io
+import sys
+from pathlib import Path
+
+import mongomock
+import pytest
+from fpdf import FPDF
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from models.course_material_type import CourseMaterialType
+from services.file_processor import FileProcessor
+from services.hash_db import HashDB
+from services.ingestion_service import IngestionService
+from services.vector_db import VectorDB
+
+
+class _CountingEmbeddingFunction:
+    def __init__(self):
+        self.embedded: list[str] = []
+
+    def __call__(self, input):
+        self.embedded.extend(input)
+        return [[float(len(text)), 1.0, 0.5] for text in input]
+
+    def name(self):
+        return "default"
+
+    def is_legacy(self):
+        return False
+
+    def get_config(self):
+        return {}
+
+    def default_space(self):
+        return "cosine"
+
+    def supported_spaces(self):
+        return ["cosine"]
+
+
+def _write_slides(path: Path, slides: list[str]) -> str:
+    pdf = FPDF()
+    pdf.set_font("Arial", size=12)
+    for text in slides:
+        pdf.add_page()
+        pdf.multi_cell(0, 10, text)
+    pdf.output(str(path))
+    return str(path)
+
+
+def test_revised_document_only_embeds_changed_chunks(tmp_path):
+    embedding_function = _CountingEmbeddingFunction()
+    vector_db = VectorDB(db_path=str(tmp_path / "chroma"), embedding_function=embedding_function, require_api_key=False)
+    hash_db = HashDB(client=mongomock.MongoClient())
+    service = IngestionService(file_processor=FileProcessor(text_chunk_size=120, text_chunk_overlap=20), vector_db=vector_db, hash_db=hash_db)
+
+    slides = [f"Slide {i}: the Bellman equation of value function number {i} is a fixed point of an operator. " * 2 for i in range(20)]
+    first = service.ingest(7, CourseMaterialType.SLIDES, _write_slides(tmp_path / "v1.pdf", slides), "hash-v1", filename="rl.pdf")
+    assert first["embedded"] == first["chunks"] and first["deleted"] == 0
+
+    # v2: one slide edited, one removed, one added at the front (so all page numbers shift)
+    revised = ["A new title slide about temporal difference learning."] + slides[:5] + [slides[5].replace("Bellman", "Poisson")] + slides[6:19]
+    embedding_function.embedded.clear()
+    material_id = hash_db.get_materials_for_course(7)[0]["material_id"]
+    second = service.ingest(7, CourseMaterialType.SLIDES, _write_slides(tmp_path / "v2.pdf", revised), "hash-v2", filename="rl.pdf", replaces=material_id)
+
+    assert second["embedded"] == len(embedding_function.embedded) < first["chunks"] // 4
+    assert second["deleted"] > 0
+    assert second["unchanged"] == second["chunks"] - second["embedded"]
+
+    stored = vector_db.course_material_collection.get(where={"course_id": "7"}, include=["documents", "metadatas"])
+    assert len(stored["ids"]) == second["chunks"]
+    assert not any("Slide 19" in text for text in stored["documents"])
+    page_of_slide_6 = {m["page_start"] for text, m in zip(stored["documents"], stored["metadatas"]) if text.startswith("Slide 6:")}
+    assert page_of_slide_6 == {8}  # unchanged chunks got the page numbers of the revised deck
+
+    # the replaced version is forgotten, only the current one counts as uploaded
+    assert hash_db.get_file_hash(7, "hash-v1") is None
+    assert hash_db.get_file_hash(7, "hash-v2") is not None
+    assert [m["material_id"] for m in hash_db.get_materials_for_course(7)] == [material_id]
+    vector_db.delete_collections()
+
+
+def test_different_documents_with_the_same_name_are_kept_apart(tmp_path):
+    vector_db = VectorDB(db_path=str(tmp_path / "chroma"), embedding_function=_CountingEmbeddingFunction(), require_api_key=False)
+    hash_db = HashDB(client=mongomock.MongoClient())
+    service = IngestionService(file_processor=FileProcessor(text_chunk_size=80, text_chunk_overlap=10), vector_db=vector_db, hash_db=hash_db)
+
+    first = service.ingest(5, CourseMaterialType.SLIDES, _write_slides(tmp_path / "a.pdf", ["Lecture 1 about Markov decision processes."] * 3), "hash-a", filename="lecture.pdf")
+    second = service.ingest(5, CourseMaterialType.SLIDES, _write_slides(tmp_path / "b.pdf", ["Lecture 2 about policy iteration."] * 3), "hash-b", filename="lecture.pdf")
+
+    assert second["deleted"] == 0
+    stored = vector_db.course_material_collection.get(where={"course_id": "5"}, include=[])
+    assert len(stored["ids"]) == first["chunks"] + second["chunks"]
+    assert hash_db.get_file_hash(5, "hash-a") is not None and hash_db.get_file_hash(5, "hash-b") is not None
+    material_ids = {m["material_id"] for m in hash_db.get_materials_for_course(5)}
+    assert len(material_ids) == 2
+
+    # removing one of them keeps the other one
+    service.remove_material(5, hash_db.get_file_hash(5, "hash-a")["material_id"])
+    assert len(vector_db.course_material_collection.get(where={"course_id": "5"}, include=[])["ids"]) == second["chunks"]
+    assert hash_db.get_file_hash(5, "hash-b") is not None
+
+    # a revision has to name an existing document of the same type
+    with pytest.raises(ValueError):
+        service.ingest(5, CourseMaterialType.NOTES, _write_slides(tmp_path / "c.pdf", ["Notes."]), "hash-c", filename="lecture.pdf", replaces=hash_db.get_file_hash(5, "hash-b")["material_id"])
+    vector_db.delete_collections()
+
+
+def test_removing_a_material_only_deletes_its_chunks_and_hashes(tmp_path):
+    vector_db = VectorDB(db_path=str(tmp_path / "chroma"), embedding_function=_CountingEmbeddingFunction(), require_api_key=False)
+    hash_db = HashDB(client=mongomock.MongoClient())
+    service = IngestionService(file_processor=FileProcessor(text_chunk_size=80, text_chunk_overlap=10), vector_db=vector_db, hash_db=hash_db)
+
+    slides = [f"Slide {i} about policy gradients and the score function estimator." * 2 for i in range(6)]
+    service.ingest(3, CourseMaterialType.SLIDES, _write_slides(tmp_path / "a.pdf", slides), "hash-a", filename="a.pdf")
+    kept = service.ingest(3, CourseMaterialType.NOTES, _write_slides(tmp_path / "b.pdf", slides[:2]), "hash-b", filename="b.pdf")
+
+    material_id = next(m["material_id"] for m in hash_db.get_materials_for_course(3) if m["filename"] == "a.pdf")
+    stored = vector_db.course_material_collection.get(where={"material_id": material_id}, include=["metadatas"])
+    assert stored["ids"] and all(m["file_hash"] == "hash-a" for m in stored["metadatas"])
+
+    vector_db.delete_material = _with_batch_size(vector_db.delete_material, 4)
+    result = service.remove_material(3, material_id)
+
+    assert result["filename"] == "a.pdf" and result["deleted"] == len(stored["ids"])
+    assert len(vector_db.course_material_collection.get(where={"course_id": "3"}, include=[])["ids"]) == kept["chunks"]
+    assert [m["filename"] for m in hash_db.get_materials_for_course(3)] == ["b.pdf"]
+    assert hash_db.get_file_hash(3, "hash-a") is None
+    assert hash_db.get_chunk_manifest(3, CourseMaterialType.SLIDES, "hash-a") is None
+    assert service.remove_material(3, material_id) is None
+    vector_db.delete_collections()
+
+
+def _with_batch_size(delete_material, batch_size):
+    return lambda *args, **kwargs: delete_material(*args, batch_size=batch_size, **kwargs)
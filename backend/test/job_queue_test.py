@@ -0,0 +1,138 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+import mongomock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from models.course_material_type import CourseMaterialType
+from models.ingestion_job import JobStatus
+from services.file_processor import ProcessingCancelled
+from services.job_queue import IngestionJobQueue
+from services.job_store import JobStore
+
+
+class _FakeIngestionService:
+    def __init__(self, block: threading.Event | None = None):
+        self.block = block
+        self.ingested = []
+
+    def ingest(self, course_id, material_type, pdf_path, file_hash, filename=None, progress_callback=None, cancel_event=None, replaces=None):
+        with open(pdf_path, "rb") as f:
+            content = f.read()
+        for page in range(1, 4):
+            progress_callback("ocr", page, 3)
+        if self.block is not None:
+            while not self.block.is_set():
+                if cancel_event.is_set():
+                    raise ProcessingCancelled()
+                time.sleep(0.01)
+        self.ingested.append((course_id, material_type, content))
+        return {"chunks": 3}
+
+
+def _spooled_upload(tmp_path: Path, content: bytes = b"%PDF") -> str:
+    path = tmp_path / f"upload-{time.monotonic_ns()}.part"
+    path.write_bytes(content)
+    return str(path)
+
+
+def _wait_for_status(store: JobStore, job_id: str, statuses: set[JobStatus], timeout: float = 5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = store.get_job(job_id)
+        if job.status in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not reach {statuses}, it is {store.get_job(job_id).status}")
+
+
+def test_submitted_job_completes_and_reports_progress(tmp_path):
+    store = JobStore(client=mongomock.MongoClient())
+    service = _FakeIngestionService()
+    job_queue = IngestionJobQueue(store, service, upload_dir=str(tmp_path), workers=1)
+    job_queue.start()
+
+    job = job_queue.submit(course_id=1, material_type=CourseMaterialType.SLIDES, file_hash="abc", pdf_path=_spooled_upload(tmp_path), filename="slides.pdf")
+    assert store.get_job(job.job_id) is not None
+
+    done = _wait_for_status(store, job.job_id, {JobStatus.COMPLETED})
+    job_queue.shutdown()
+
+    assert done.result == {"chunks": 3}
+    assert done.stage == "ocr" and done.progress == {"current": 3, "total": 3}
+    assert done.attempts == 1
+    assert service.ingested == [(1, CourseMaterialType.SLIDES, b"%PDF")]
+    assert list(tmp_path.iterdir()) == []  # the upload is removed once the job finished
+
+
+def test_running_job_can_be_cancelled(tmp_path):
+    store = JobStore(client=mongomock.MongoClient())
+    job_queue = IngestionJobQueue(store, _FakeIngestionService(block=threading.Event()), upload_dir=str(tmp_path), workers=1)
+    job_queue.start()
+
+    job = job_queue.submit(course_id=1, material_type=CourseMaterialType.EXAM, file_hash="abc", pdf_path=_spooled_upload(tmp_path))
+    _wait_for_status(store, job.job_id, {JobStatus.RUNNING})
+    assert store.find_active_job(course_id=1, file_hash="abc").job_id == job.job_id
+
+    assert job_queue.cancel(job.job_id)
+    _wait_for_status(store, job.job_id, {JobStatus.CANCELLED})
+    job_queue.shutdown()
+    assert store.find_active_job(course_id=1, file_hash="abc") is None
+
+
+class _UninterruptibleIndexingService(_FakeIngestionService):
+    """Signals `indexing` once it got past the last cancellation check, then waits for `release` and completes anyway."""
+
+    def __init__(self):
+        super().__init__()
+        self.indexing = threading.Event()
+        self.release = threading.Event()
+
+    def ingest(self, course_id, material_type, pdf_path, file_hash, filename=None, progress_callback=None, cancel_event=None, replaces=None):
+        self.indexing.set()
+        self.release.wait(timeout=5)
+        return {"chunks": 3}
+
+
+def test_job_cancelled_during_indexing_stays_cancelled(tmp_path):
+    store = JobStore(client=mongomock.MongoClient())
+    service = _UninterruptibleIndexingService()
+    job_queue = IngestionJobQueue(store, service, upload_dir=str(tmp_path), workers=1)
+    job_queue.start()
+
+    job = job_queue.submit(course_id=1, material_type=CourseMaterialType.SLIDES, file_hash="abc", pdf_path=_spooled_upload(tmp_path))
+    assert service.indexing.wait(timeout=5)
+    assert job_queue.cancel(job.job_id)
+    service.release.set()
+    job_queue.shutdown()
+
+    cancelled = store.get_job(job.job_id)
+    assert cancelled.status == JobStatus.CANCELLED
+    assert cancelled.result == {}
+    assert not job_queue.cancel(job.job_id)
+
+
+def test_unfinished_jobs_are_resumed_after_restart(tmp_path):
+    client = mongomock.MongoClient()
+    block = threading.Event()
+    store = JobStore(client=client)
+    job_queue = IngestionJobQueue(store, _FakeIngestionService(block=block), upload_dir=str(tmp_path), workers=1)
+    job_queue.start()
+    job = job_queue.submit(course_id=2, material_type=CourseMaterialType.NOTES, file_hash="def", pdf_path=_spooled_upload(tmp_path))
+    _wait_for_status(store, job.job_id, {JobStatus.RUNNING})
+    job_queue.shutdown()  # interrupts the running job, it should be queued again
+
+    lost = store.create_job(course_id=2, material_type="notes", file_hash="ghi")  # no uploaded file on disk
+
+    restarted_store = JobStore(client=client)
+    service = _FakeIngestionService()
+    restarted = IngestionJobQueue(restarted_store, service, upload_dir=str(tmp_path), workers=1)
+    restarted.start()
+
+    done = _wait_for_status(restarted_store, job.job_id, {JobStatus.COMPLETED})
+    restarted.shutdown()
+    assert done.attempts == 2
+    assert restarted_store.get_job(lost.job_id).status == JobStatus.FAILED
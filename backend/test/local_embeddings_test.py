@@ -0,0 +1,61 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.local_embeddings import OnnxEmbeddingFunction
+from services.vector_db import VectorDB
+
+WORDS = ["[PAD]", "[UNK]", "policy", "gradient", "value", "function", "bellman", "equation"]
+
+
+def _tokenizer() -> Tokenizer:
+    tokenizer = Tokenizer(WordLevel({word: i for i, word in enumerate(WORDS)}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    return tokenizer
+
+
+# stands in for the ONNX session of a model whose token embedding is a fixed vector per token id
+class _TokenEmbeddingSession:
+    def __init__(self):
+        self.table = np.random.default_rng(0).normal(size=(len(WORDS), 4)).astype(np.float32)
+        self.shapes: list[tuple[int, int]] = []
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input_ids"), SimpleNamespace(name="attention_mask"), SimpleNamespace(name="token_type_ids")]
+
+    def run(self, output_names, feed):
+        assert set(feed) == {"input_ids", "attention_mask", "token_type_ids"}
+        self.shapes.append(feed["input_ids"].shape)
+        return [self.table[feed["input_ids"]]]
+
+
+def test_batches_are_padded_to_their_longest_text_and_mean_pooled():
+    session = _TokenEmbeddingSession()
+    embed = OnnxEmbeddingFunction(model_name="Xenova/tiny", batch_size=2, threads=2, session=session, tokenizer=_tokenizer())
+    texts = ["policy gradient value function bellman equation", "value", "bellman equation", "policy gradient value function", "policy"]
+
+    vectors = embed(texts)
+
+    # sorted by length: [1, 1], [2, 4], [6] tokens
+    assert sorted(session.shapes) == [(1, 6), (2, 1), (2, 4)]
+    for text, vector in zip(texts, vectors):
+        expected = session.table[[WORDS.index(word) for word in text.split()]].mean(axis=0)
+        assert np.allclose(vector, expected / np.linalg.norm(expected), atol=1e-6)
+    assert embed.model_id == "tiny-int8"
+
+
+def test_every_embedding_model_gets_its_own_collections(tmp_path):
+    embed = OnnxEmbeddingFunction(model_name="Xenova/tiny", session=_TokenEmbeddingSession(), tokenizer=_tokenizer())
+    local = VectorDB(db_path=str(tmp_path / "chroma"), embedding_function=embed, embedding_model_name=embed.model_id, require_api_key=False)
+    default = VectorDB(db_path=str(tmp_path / "chroma"), embedding_function=embed, require_api_key=False)
+
+    assert local.course_material_collection.name == "course_material__tiny-int8"
+    assert local.old_exam_collection.name == "old_exam_collection__tiny-int8"
+    assert default.course_material_collection.name == "course_material"  # text-embedding-3-small keeps the old collections
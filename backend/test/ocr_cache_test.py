@@ -0,0 +1,49 @@
+import pickle
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.ocr_cache import OcrCache, OcrResult
+
+
+def test_results_survive_restart(tmp_path):
+    db_path = str(tmp_path / "ocr.sqlite3")
+    cache = OcrCache(db_path=db_path)
+    assert cache.get("page-a") is None
+    cache.put("page-a", OcrResult("Satz von Bayes", "deu", rotation=90))
+    cache.close()
+
+    restarted = OcrCache(db_path=db_path)
+    assert restarted.get("page-a") == OcrResult("Satz von Bayes", "deu", rotation=90)
+    # a copy for an OCR worker process opens its own connection
+    assert pickle.loads(pickle.dumps(restarted)).get("page-a").text == "Satz von Bayes"
+
+
+def test_least_recently_used_results_are_evicted(tmp_path):
+    cache = OcrCache(db_path=str(tmp_path / "ocr.sqlite3"), max_bytes=250)
+    for key in ["a", "b", "c"]:
+        cache.put(key, OcrResult(key * 100, "eng"))  # 101 bytes each
+        if key == "b":
+            cache.get("a")  # "a" is now used more recently than "b"
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["bytes"] <= 250
+
+
+def test_total_size_is_kept_up_to_date(tmp_path):
+    db_path = str(tmp_path / "ocr.sqlite3")
+    cache = OcrCache(db_path=db_path, max_bytes=1000)
+    other_process = OcrCache(db_path=db_path, max_bytes=1000)
+    cache.put("a", OcrResult("x" * 99, "eng"))  # 100 bytes
+    other_process.put("b", OcrResult("y" * 199, "eng"))  # 200 bytes
+    cache.put("a", OcrResult("x" * 49, "eng"))  # replaced, now 50 bytes
+    assert cache.stats()["bytes"] == 250
+
+    # an eviction frees the bytes of the evicted entries ("b" is the least recently used one)
+    other_process.put("c", OcrResult("z" * 899, "eng"))
+    assert cache.get("b") is None and cache.get("a") is not None
+    assert cache.stats()["bytes"] == 950
+    cache.close()
+    assert OcrCache(db_path=db_path).stats()["bytes"] == 950
@@ -0,0 +1,24 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services import ocr_engines
+from services.ocr_engines import PytesseractEngine, _mean_confidence, _text_from_data, create_ocr_engine
+
+
+def test_text_and_confidence_are_rebuilt_from_image_to_data():
+    data = {
+        "text": ["", "Policy", "gradients", "", "work", "", "Block", "two"],
+        "conf": [-1, 90, 80, -1, 70, -1, 60, 100],
+        "block_num": [1, 1, 1, 1, 1, 2, 2, 2],
+        "par_num": [1, 1, 1, 1, 1, 1, 1, 1],
+        "line_num": [1, 1, 1, 2, 2, 1, 1, 1],
+    }
+    assert _text_from_data(data) == "Policy gradients\nwork\n\nBlock two"
+    assert _mean_confidence(data["conf"], data["text"]) == 80.0
+
+
+def test_tesserocr_falls_back_to_pytesseract(monkeypatch):
+    monkeypatch.setattr(ocr_engines, "tesserocr", None)
+    assert isinstance(create_ocr_engine("tesserocr"), PytesseractEngine)
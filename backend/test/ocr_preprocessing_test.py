@@ -0,0 +1,79 @@
+import sys
+from pathlib import Path
+
+import fitz
+import numpy as np
+from PIL import Image, ImageFilter
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.ocr_preprocessing import autocontrast_lut, otsu_threshold, pixmap_to_gray, prepare_for_ocr, rgb_to_gray
+
+
+def _otsu_threshold_loop(hist: list[int]) -> int:
+    """The pure Python implementation that FileProcessor used before."""
+    total = sum(hist)
+    sum_total = sum(i * hist[i] for i in range(256))
+    sumB = 0
+    wB = 0
+    var_max = 0.0
+    threshold = 0
+    for t in range(256):
+        wB += hist[t]
+        if wB == 0:
+            continue
+        wF = total - wB
+        if wF == 0:
+            break
+        sumB += t * hist[t]
+        mB = sumB / wB
+        mF = (sum_total - sumB) / wF
+        var_between = wB * wF * (mB - mF) ** 2
+        if var_between > var_max:
+            var_max = var_between
+            threshold = t
+    return threshold
+
+
+def test_vectorized_otsu_matches_the_loop():
+    rng = np.random.default_rng(0)
+    histograms = [
+        [0] * 256,
+        [0] * 40 + [1000] + [0] * 215,  # a single gray value
+        list(np.bincount(rng.integers(0, 256, 50_000), minlength=256)),
+    ]
+    for _ in range(50):
+        # bimodal pages: dark text on a light background
+        pixels = np.concatenate([rng.normal(rng.uniform(20, 90), 15, 5_000), rng.normal(rng.uniform(160, 240), 20, 60_000)])
+        histograms.append(list(np.bincount(np.clip(pixels, 0, 255).astype(np.uint8), minlength=256)))
+
+    for hist in histograms:
+        assert otsu_threshold(np.array(hist)) == _otsu_threshold_loop([int(count) for count in hist])
+
+
+def test_gray_pixmaps_are_not_copied_and_rgb_matches_pil():
+    gray_pix = fitz.Pixmap(fitz.csGRAY, fitz.IRect(0, 0, 30, 20), False)
+    gray_pix.set_rect(gray_pix.irect, (200,))
+    gray = pixmap_to_gray(gray_pix)
+    assert gray.shape == (20, 30) and not gray.flags.owndata and int(gray[5, 5]) == 200
+
+    rgb = np.random.default_rng(1).integers(0, 256, (20, 30, 3), dtype=np.uint8)
+    assert np.array_equal(rgb_to_gray(rgb), np.asarray(Image.fromarray(rgb).convert("L")))
+
+
+def test_prepare_for_ocr_binarizes_and_fits_the_size():
+    page = np.full((3508, 2480), 230, dtype=np.uint8)
+    page[1000:1040, 300:2000] = 30  # a line of "text"
+    prepared = prepare_for_ocr(page, min_dim=1200, max_dim=2600)
+    assert max(prepared.shape) == 2600
+    assert set(np.unique(prepared)) == {0, 255}
+
+
+def test_prepare_for_ocr_matches_autocontrast_median_and_threshold():
+    gray = np.random.default_rng(2).integers(60, 200, (300, 200), dtype=np.uint8)
+    hist = np.bincount(gray.ravel(), minlength=256)
+    stretched = autocontrast_lut(hist)[gray]
+    threshold = otsu_threshold(np.bincount(stretched.ravel(), minlength=256))
+    expected = np.asarray(Image.fromarray(stretched).filter(ImageFilter.MedianFilter(size=3))) > threshold
+
+    assert np.array_equal(prepare_for_ocr(gray, min_dim=100, max_dim=400) > 0, expected)
@@ -0,0 +1,146 @@
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.openrouter_client import OpenRouterClient, OpenRouterError, OpenRouterEmbeddingFunction
+
+
+class _StubServer:
+    """Local HTTP server that answers with the scripted responses of `responses` (one per request, the last one repeats)."""
+
+    def __init__(self, responses: list[dict]):
+        self.responses = responses
+        self.requests: list[dict] = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.requests.append({"path": self.path, "body": body, "authorization": self.headers.get("Authorization")})
+                response = stub.responses[min(len(stub.requests), len(stub.responses)) - 1]
+                time.sleep(response.get("delay", 0))
+                payload = response.get("stream") or json.dumps(response.get("json", {}))
+                self.send_response(response.get("status", 200))
+                for name, value in response.get("headers", {}).items():
+                    self.send_header(name, value)
+                # "truncate" announces more bytes than are sent, the connection is closed in the middle of the body
+                self.send_header("Content-Length", str(len(payload.encode()) + (100 if response.get("truncate") else 0)))
+                self.end_headers()
+                self.wfile.write(payload.encode())
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/api/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _completion(content: str) -> dict:
+    return {"choices": [{"message": {"content": content}}]}
+
+
+@pytest.fixture
+def make_client():
+    servers, clients = [], []
+
+    def make(responses, **kwargs):
+        server = _StubServer(responses)
+        client = OpenRouterClient(api_key="test-key", base_url=server.url, backoff_base=0.01, **kwargs)
+        servers.append(server)
+        clients.append(client)
+        return server, client
+
+    yield make
+    for client in clients:
+        client.close()
+    for server in servers:
+        server.close()
+
+
+def test_retries_rate_limited_and_failed_requests(make_client):
+    server, client = make_client([
+        {"status": 429, "headers": {"Retry-After": "0.2"}},
+        {"status": 503},
+        {"json": _completion("hello")},
+    ])
+
+    started = time.monotonic()
+    response = client.chat_completion({"model": "m", "messages": []})
+
+    assert response["choices"][0]["message"]["content"] == "hello"
+    assert len(server.requests) == 3
+    assert server.requests[0]["authorization"] == "Bearer test-key"
+    assert client.stats()["retries"] == 2
+    assert time.monotonic() - started >= 0.2  # Retry-After was respected
+
+
+def test_does_not_retry_client_errors(make_client):
+    server, client = make_client([{"status": 400, "json": {"error": "bad request"}}])
+
+    with pytest.raises(OpenRouterError) as error:
+        client.chat_completion({"model": "m", "messages": []})
+
+    assert error.value.status_code == 400
+    assert len(server.requests) == 1
+
+
+def test_hedges_slow_requests(make_client):
+    server, client = make_client([
+        {"delay": 2.0, "json": _completion("slow")},
+        {"json": _completion("fast")},
+    ], hedge_after=0.1)
+
+    started = time.monotonic()
+    response = client.chat_completion({"model": "m", "messages": []})
+
+    assert response["choices"][0]["message"]["content"] == "fast"
+    assert time.monotonic() - started < 1.5
+    assert client.stats()["hedged"] == 1
+
+
+def test_embeddings_and_streaming(make_client):
+    stream = "".join(
+        f"data: {json.dumps({'choices': [{'delta': {'content': piece}, 'finish_reason': None}]})}\n\n" for piece in ["[{", "}]"]
+    ) + ": OPENROUTER PROCESSING\n\ndata: [DONE]\n\n"
+    server, client = make_client([
+        {"json": {"data": [{"index": 1, "embedding": [0.0, 1.0]}, {"index": 0, "embedding": [1.0, 0.0]}]}},
+        {"stream": stream, "headers": {"Content-Type": "text/event-stream"}},
+    ])
+
+    embedding_function = OpenRouterEmbeddingFunction(client, model_name="text-embedding-3-small")
+    embeddings = embedding_function(["first", "second"])
+    chunks = list(client.stream_chat_completion({"model": "m", "messages": []}))
+
+    assert [list(embedding) for embedding in embeddings] == [[1.0, 0.0], [0.0, 1.0]]  # sorted by index
+    assert server.requests[0]["path"] == "/api/v1/embeddings"
+    assert server.requests[1]["body"]["stream"] is True
+    assert "".join(chunk["choices"][0]["delta"]["content"] for chunk in chunks) == "[{}]"
+
+
+def test_does_not_retry_streams_that_break_after_the_first_chunk(make_client):
+    partial = f"data: {json.dumps({'choices': [{'delta': {'content': '[{'}, 'finish_reason': None}]})}\n\n"
+    server, client = make_client([
+        {"stream": partial, "truncate": True, "headers": {"Content-Type": "text/event-stream"}},
+        {"stream": partial + "data: [DONE]\n\n", "headers": {"Content-Type": "text/event-stream"}},
+    ])
+
+    chunks = []
+    with pytest.raises(httpx.TransportError):
+        for chunk in client.stream_chat_completion({"model": "m", "messages": []}):
+            chunks.append(chunk)
+
+    assert [chunk["choices"][0]["delta"]["content"] for chunk in chunks] == ["[{"]  # not streamed a second time
+    assert len(server.requests) == 1
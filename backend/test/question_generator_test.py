@@ -0,0 +1,124 @@
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from models.course_material import CourseMaterial
+from models.question_type import QuestionType
+from services.json_stream import IncrementalJSONArrayParser
+from services.question_generator import QuestionGenerator
+
+QUESTIONS = [
+    {"question": "What does PPO clip? {not a brace}", "question_type": "single-choice", "answer_keys": ["The ratio", "The \"reward\"", "[x] Nothing", "Gradients"], "metadata": {"topic": "PPO"}},
+    {"question": "Explain GRPO.", "question_type": "text-answer", "answer_keys": None, "metadata": {"topic": "GRPO", "difficulty": "hard"}},
+    {"question": "Which are RL algorithms?", "question_type": "multiple-choice", "answer_keys": ["PPO", "GRPO", "SGD", "Adam"], "metadata": {}},
+]
+
+
+def _pieces(text: str, size: int) -> list[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_parser_yields_each_object_as_soon_as_it_closes():
+    response = "```json\n" + json.dumps(QUESTIONS, indent=2) + "\n```"
+    parser = IncrementalJSONArrayParser()
+
+    parsed = []
+    for piece in _pieces(response, 7):
+        parsed.extend(parser.feed(piece))
+        if len(parsed) == 1:
+            # the first question is available long before the reply is complete
+            assert not parser.finished
+
+    assert parsed == QUESTIONS
+    assert parser.finished
+
+
+def test_parser_keeps_completed_objects_of_a_truncated_reply():
+    response = json.dumps(QUESTIONS)
+    truncated = response[:response.index("Which are RL")]
+    parser = IncrementalJSONArrayParser()
+
+    parsed = []
+    for piece in _pieces(truncated, 5):
+        parsed.extend(parser.feed(piece))
+
+    assert parsed == QUESTIONS[:2]
+    assert not parser.finished
+
+
+class _FakeStreamingClient:
+    def __init__(self, response: str, finish_reason: str = "stop"):
+        pieces = _pieces(response, 11)
+        self.chunks = [{"choices": [{"delta": {"content": piece}, "finish_reason": None}]} for piece in pieces]
+        self.chunks.append({"choices": [{"delta": {}, "finish_reason": finish_reason}]})
+        self.payload = None
+
+    def stream_chat_completion(self, payload):
+        self.payload = payload
+        return iter(self.chunks)
+
+
+def test_stream_questions_returns_questions_of_truncated_reply():
+    os.environ.setdefault("LLM_API_KEY", "test-key")
+    response = json.dumps(QUESTIONS)
+    generator = QuestionGenerator(client=_FakeStreamingClient(response[:-40], finish_reason="length"))
+
+    questions = list(generator.stream_questions(course_id=1, relevant_course_material=[], old_questions=[], n_new_questions=3))
+
+    assert generator.client.payload["messages"][1]["content"].startswith("You are a professor")
+    assert [q.question for q in questions] == [QUESTIONS[0]["question"], QUESTIONS[1]["question"]]
+    assert questions[0].question_type == QuestionType.SINGLE_CHOICE
+    assert questions[0].answer_keys[1] == 'The "reward"'
+    assert questions[1].answer_keys is None
+
+
+class _FakeShardClient:
+    """Answers every prompt with the requested number of questions after a fixed delay."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.prompts = []
+
+    async def achat_completion(self, payload):
+        prompt = payload["messages"][1]["content"]
+        self.prompts.append(prompt)
+        n = int(re.search(r"Generate exactly (\d+) new questions", prompt).group(1))
+        shard = len(self.prompts)
+        await asyncio.sleep(self.delay)
+        questions = [{"question": f"Shard {shard} question {i}", "question_type": "text-answer", "answer_keys": None, "metadata": {}} for i in range(n)]
+        # every shard also returns the same "classic" question
+        questions[0]["question"] = "What is  reinforcement learning?"
+        return {"choices": [{"message": {"content": json.dumps(questions)}}]}
+
+
+def test_sharded_generation_runs_concurrently_and_deduplicates():
+    os.environ.setdefault("LLM_API_KEY", "test-key")
+    generator = QuestionGenerator(questions_per_shard=10, max_concurrent_shards=4, client=_FakeShardClient(delay=0.3))
+    material = [CourseMaterial(text=f"Material chunk {i}", metadata={}) for i in range(8)]
+
+    def embed_texts(texts):
+        # "question 1" and "question 2" of the first shard are treated as near-duplicates
+        vectors = [[1.0 if j == i else 0.0 for j in range(len(texts))] for i in range(len(texts))]
+        vectors[texts.index("Shard 1 question 2")] = vectors[texts.index("Shard 1 question 1")]
+        return vectors
+
+    started = time.monotonic()
+    questions = asyncio.run(generator.generate_questions_sharded(
+        course_id=1, relevant_course_material=material, old_questions=[], n_new_questions=40, embed_texts=embed_texts
+    ))
+    duration = time.monotonic() - started
+
+    assert len(generator.client.prompts) == 4
+    assert duration < 0.3 * 2  # about as slow as the slowest shard, not the sum of all shards
+    texts = [q.question for q in questions]
+    assert texts.count("What is  reinforcement learning?") == 1
+    assert "Shard 1 question 1" in texts and "Shard 1 question 2" not in texts
+    assert len(texts) == len(set(texts)) == 40 - 3 - 1
+    # every shard got a different slice of the material
+    assert "Material chunk 0" in generator.client.prompts[0] and "Material chunk 1" not in generator.client.prompts[0]
@@ -0,0 +1,85 @@
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.task_executor import BoundedExecutor, ExecutorSaturatedError
+
+
+def test_blocking_call_does_not_block_event_loop():
+    executor = BoundedExecutor(name="test", max_workers=1)
+
+    async def scenario():
+        slow = asyncio.ensure_future(executor.run(time.sleep, 0.3))
+        started = time.monotonic()
+        await asyncio.sleep(0.01)  # the loop keeps serving other coroutines while the worker sleeps
+        responsive_after = time.monotonic() - started
+        await slow
+        return responsive_after
+
+    assert asyncio.run(scenario()) < 0.2
+    stats = executor.stats()
+    assert stats["completed"] == 1
+    assert stats["queued"] == 0 and stats["running"] == 0
+    executor.shutdown()
+
+
+def test_concurrency_limit_and_saturation():
+    executor = BoundedExecutor(name="test", max_workers=2, max_queue=1)
+    release = threading.Event()
+    running = []
+    max_running = []
+
+    def job():
+        running.append(1)
+        max_running.append(len(running))
+        release.wait(timeout=5)
+        running.pop()
+
+    async def scenario():
+        tasks = [asyncio.ensure_future(executor.run(job)) for _ in range(3)]
+        await asyncio.sleep(0.1)
+        # two jobs run, one waits in the queue, so a fourth call is rejected
+        assert executor.stats()["queued"] == 1
+        with pytest.raises(ExecutorSaturatedError):
+            await executor.run(job)
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert max(max_running) == 2
+    stats = executor.stats()
+    assert stats["completed"] == 3
+    assert stats["rejected"] == 1
+    executor.shutdown()
+
+
+def test_cancelled_queued_calls_release_their_queue_slot():
+    executor = BoundedExecutor(name="test", max_workers=1, max_queue=3)
+    release = threading.Event()
+
+    async def scenario():
+        blocker = asyncio.ensure_future(executor.run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        queued = [asyncio.ensure_future(executor.run(time.sleep, 0)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        assert executor.stats()["queued"] == 3
+        for task in queued:
+            task.cancel()
+        await asyncio.gather(*queued, return_exceptions=True)
+        await asyncio.sleep(0.05)  # the done callbacks run on the loop
+
+        assert executor.stats()["queued"] == 0
+        release.set()
+        await blocker
+        assert await executor.run(lambda: "still accepting calls") == "still accepting calls"
+
+    asyncio.run(scenario())
+    stats = executor.stats()
+    assert stats["queued"] == 0 and stats["running"] == 0 and stats["rejected"] == 0
+    executor.shutdown()
@@ -0,0 +1,52 @@
+import asyncio
+import hashlib
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.upload_spooler import UploadSpooler, UploadTooLargeError
+
+
+class _FakeUploadFile:
+    def __init__(self, content: bytes):
+        self.content = content
+        self.position = 0
+        self.read_sizes = []
+
+    async def read(self, size: int = -1) -> bytes:
+        self.read_sizes.append(size)
+        chunk = self.content[self.position:self.position + size]
+        self.position += len(chunk)
+        return chunk
+
+
+def test_spool_writes_and_hashes_in_one_pass(tmp_path):
+    content = bytes(range(256)) * 1000
+    spooler = UploadSpooler(spool_dir=str(tmp_path), chunk_size=4096)
+    upload_file = _FakeUploadFile(content)
+
+    upload = asyncio.run(spooler.spool(upload_file))
+
+    assert upload.sha256 == hashlib.sha256(content).hexdigest()
+    assert upload.size == len(content)
+    assert Path(upload.path).read_bytes() == content
+    assert set(upload_file.read_sizes) == {4096}  # never more than one chunk in memory
+    assert upload_file.position == len(content)  # read exactly once
+
+
+def test_too_large_upload_is_rejected_and_removed(tmp_path):
+    leftover = tmp_path / "upload-leftover.part"
+    leftover.write_bytes(b"partial upload of a crashed run")
+    os.utime(leftover, (time.time() - 7200, time.time() - 7200))
+    spooler = UploadSpooler(spool_dir=str(tmp_path), max_bytes=10_000, chunk_size=4096)
+    assert list(tmp_path.iterdir()) == []
+
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(spooler.spool(_FakeUploadFile(b"x" * 20_000)))
+
+    assert list(tmp_path.iterdir()) == []
@@ -223,7 +223,190 @@ def test3_adding_and_retrieving_old_exam_questions_with_query():
 
     print(f"TEST 3 PASSED\n")
 
+class _CountingEmbeddingFunction(_DummyEmbeddingFunction):
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, input):
+        self.calls += 1
+        return [[1.0, float(len(text)), 0.0] for text in input]
+
+
+def test4_repeated_queries_are_served_from_the_retrieval_cache(tmp_path):
+
+    print(f"\nTEST 4: Repeated queries are served from the retrieval cache\n")
+
+    # Arrange
+    embedding_function = _CountingEmbeddingFunction()
+    vector_db = VectorDB(db_path=str(tmp_path), embedding_function=embedding_function, require_api_key=False)
+    course_id = 4
+
+    material = [CourseMaterialChunk(id=f"m{i}", course_id=course_id, chunk_ind=i, text=f"PPO slide {i}") for i in range(3)]
+    questions = [ExamQuestionChunk(id="q1", course_id=course_id, chunk_ind=0, text="What is PPO?", question_type=QuestionType.TEXT_ANSWER)]
+    vector_db.index_course_material(chunks=material, metadata=[{"topic": "PPO"}] * 3)
+    vector_db.index_old_exam_questions(chunks=questions, metadata=[{"topic": "PPO"}])
+    calls_after_indexing = embedding_function.calls
+
+    # Act: a whole class asks for the same topics
+    for _ in range(5):
+        course_material = vector_db.retrieve_course_material(course_id=course_id, query="Reinforcement  Learning", n=2)
+        old_questions = vector_db.retrieve_old_exam_questions(course_id=course_id, query="reinforcement learning", n=2)
+        course_material[0].metadata["topic"] = "modified by a caller"
+
+    # Assert: one query embedding shared by both retrievals, and cached results aren't modified by callers
+    assert embedding_function.calls == calls_after_indexing + 1
+    assert len(course_material) == 2 and len(old_questions) == 1
+    assert vector_db.retrieve_course_material(course_id=course_id, query="Reinforcement Learning", n=2)[0].metadata["topic"] == "PPO"
+
+    # new chunks for the course invalidate its cached results
+    assert len(vector_db.retrieve_course_material(course_id=course_id, query="Reinforcement Learning", n=5)) == 3
+    vector_db.index_course_material(chunks=[CourseMaterialChunk(id="m3", course_id=course_id, chunk_ind=3, text="PPO slide 3")], metadata=[{"topic": "PPO"}])
+    assert len(vector_db.retrieve_course_material(course_id=course_id, query="Reinforcement Learning", n=5)) == 4
+
+    vector_db.delete_collections()
+
+    print(f"TEST 4 PASSED\n")
+
+class _KeywordEmbeddingFunction(_DummyEmbeddingFunction):
+    KEYWORDS = ["ppo", "policy", "reinforcement", "attention", "transformer", "head"]
+
+    def __call__(self, input):
+        return [[float(text.lower().count(keyword)) + 0.01 for keyword in self.KEYWORDS] for text in input]
+
+
+def test5_exam_questions_are_ranked_by_stem_answers_and_topic(tmp_path):
+
+    print(f"\nTEST 5: Exam questions are ranked by their stem, answers and topic vectors\n")
+
+    # Arrange: the answers of the PPO question are all about attention, which dominates the embedding of its full text
+    vector_db = VectorDB(db_path=str(tmp_path), embedding_function=_KeywordEmbeddingFunction(), require_api_key=False)
+    course_id = 5
+    questions = [
+        ExamQuestionChunk(
+            id="ppo",
+            course_id=course_id,
+            chunk_ind=0,
+            text="Which policy does PPO optimize? [ANSWER_KEYS] A) attention attention head [SEP] B) attention head [SEP] C) transformer attention",
+            question_type=QuestionType.SINGLE_CHOICE,
+        ),
+        ExamQuestionChunk(id="attention", course_id=course_id, chunk_ind=1, text="Explain multi-head attention and the attention head.", question_type=QuestionType.TEXT_ANSWER),
+        # ranked first by its full text (it only mentions "policy"), but its stem alone is a weaker match than the PPO stem + topic
+        ExamQuestionChunk(id="policy", course_id=course_id, chunk_ind=2, text="Define a policy.", question_type=QuestionType.TEXT_ANSWER),
+    ]
+    vector_db.index_old_exam_questions(chunks=questions, metadata=[{"topic": "reinforcement learning, PPO"}, {"topic": "transformers"}, {"topic": "unknown"}])
+
+    # Act
+    ranked = vector_db.retrieve_old_exam_questions(course_id=course_id, query="PPO policy reinforcement", n=2)
+    by_full_text = vector_db.old_exam_collection.query(query_texts=["PPO policy reinforcement"], n_results=1, include=[])["ids"][0]
+
+    # Assert
+    assert by_full_text == ["policy"]
+    assert ranked[0].question.startswith("Which policy does PPO optimize?") and ranked[1].question == "Define a policy."
+    assert ranked[0].answer_keys == ["A) attention attention head", "B) attention head", "C) transformer attention"]
+    assert ranked[0].metadata["relevancy_score"] > ranked[1].metadata["relevancy_score"]
+    assert vector_db.exam_vector_collections["topic"].get(include=[])["ids"] == ["ppo", "attention"]  # "unknown" has no topic vector
+    assert sorted(vector_db.exam_vector_collections["answers"].get(include=[])["ids"]) == ["ppo"]
+
+    vector_db.delete_course_data(course_id=course_id)
+    assert all(not collection.get(include=[])["ids"] for collection in vector_db.exam_vector_collections.values())
+    vector_db.delete_collections()
+
+    print(f"TEST 5 PASSED\n")
+
+def test6_hybrid_retrieval_finds_exact_terms_the_embeddings_miss(tmp_path):
+
+    print(f"\nTEST 6: Course material is ranked by BM25 and vector similarity\n")
+
+    # Arrange: the embeddings only know "policy", so the one chunk about GRPO looks unrelated to them
+    course_id = 42
+    texts = [
+        "GRPO drops the critic and compares a group of sampled answers",
+        "policy gradient methods update the policy directly",
+        "the policy is improved step by step in policy iteration",
+        "an actor critic learns a policy and a value function",
+    ]
+    chunks = [CourseMaterialChunk(id=f"c{i}", course_id=course_id, chunk_ind=i, text=text) for i, text in enumerate(texts)]
+    vector_only = VectorDB(db_path=str(tmp_path), embedding_function=_KeywordEmbeddingFunction(), require_api_key=False, hybrid_retrieval=False, mmr_lambda=1.0)
+    vector_only.index_course_material(chunks, [{"topic": "rl"}] * len(chunks))
+
+    # Act: the hybrid VectorDB picks up the chunks that were indexed without a BM25 index on the first query
+    hybrid = VectorDB(db_path=str(tmp_path), embedding_function=_KeywordEmbeddingFunction(), require_api_key=False)
+    vector_results = vector_only.retrieve_course_material(course_id, query="GRPO policy", n=2)
+    hybrid_results = hybrid.retrieve_course_material(course_id, query="GRPO policy", n=2)
+
+    # Assert
+    assert texts[0] not in [material.text for material in vector_results]
+    assert texts[0] in [material.text for material in hybrid_results]
+    assert len(hybrid_results) == 2
+    scores = [material.metadata["relevancy_score"] for material in hybrid_results]
+    assert scores == sorted(scores, reverse=True) and 0 < scores[-1] <= scores[0] <= 1
+
+    # deleted chunks are gone from the lexical ranking as well
+    hybrid.delete_course_data(course_id)
+    assert hybrid.bm25_index.search(hybrid.course_material_collection.name, course_id, "GRPO", 5) == []
+    assert hybrid.retrieve_course_material(course_id, query="GRPO", n=2) == []
+
+    hybrid.delete_collections()
+
+    print(f"TEST 6 PASSED\n")
+
+
+def test7_mmr_skips_near_duplicate_chunks(tmp_path):
+
+    print(f"\nTEST 7: Course material is picked with maximal marginal relevance\n")
+
+    # Arrange: three near-duplicates about PPO (like overlapping neighbours of the chunking) and one chunk about attention,
+    # the duplicates have similar but distinct vectors, so their order is the same in every query
+    course_id = 7
+    texts = ["ppo clips the ratio, ppo", "ppo, the policy ratio is clipped in ppo", "ppo ppo ppo with a clipped policy ratio", "attention heads"]
+    chunks = [CourseMaterialChunk(id=f"m{i}", course_id=course_id, chunk_ind=i, text=text) for i, text in enumerate(texts)]
+    metadata = [{"topic": "rl"}] * len(chunks)
+    relevance_only = VectorDB(db_path=str(tmp_path), embedding_function=_KeywordEmbeddingFunction(), require_api_key=False, hybrid_retrieval=False, mmr_lambda=1.0)
+    relevance_only.index_course_material(chunks, metadata)
+    diverse = VectorDB(db_path=str(tmp_path), embedding_function=_KeywordEmbeddingFunction(), require_api_key=False, hybrid_retrieval=False)
+
+    # Act
+    top = relevance_only.retrieve_course_material(course_id, query="ppo ppo attention", n=2)
+    picked = diverse.retrieve_course_material(course_id, query="ppo ppo attention", n=2)
+
+    # Assert
+    assert [material.text for material in top] == [texts[0], texts[2]]
+    assert [material.text for material in picked] == [texts[0], "attention heads"]  # the most relevant chunk is always picked first
+
+    diverse.delete_collections()
+
+    print(f"TEST 7 PASSED\n")
+
+def test8_old_exam_questions_without_exam_vectors_get_them_on_the_first_query(tmp_path):
+
+    print(f"\nTEST 8: Old exam questions indexed before the exam vectors are backfilled\n")
+
+    # Arrange: "old" lost its exam vectors, like a question that was indexed before there were any
+    course_id = 8
+    questions = [
+        ExamQuestionChunk(id="old", course_id=course_id, chunk_ind=0, text="How does PPO clip the policy update?", question_type=QuestionType.TEXT_ANSWER),
+        ExamQuestionChunk(id="new", course_id=course_id, chunk_ind=1, text="Explain multi-head attention.", question_type=QuestionType.TEXT_ANSWER),
+    ]
+    VectorDB(db_path=str(tmp_path), embedding_function=_KeywordEmbeddingFunction(), require_api_key=False).index_old_exam_questions(
+        chunks=questions, metadata=[{"topic": "PPO"}, {"topic": "transformers"}]
+    )
+    vector_db = VectorDB(db_path=str(tmp_path), embedding_function=_KeywordEmbeddingFunction(), require_api_key=False)
+    for collection in vector_db.exam_vector_collections.values():
+        collection.delete(ids=["old"])
+
+    # Act
+    ranked = vector_db.retrieve_old_exam_questions(course_id=course_id, query="PPO policy", n=2)
+
+    # Assert
+    assert ranked[0].question == "How does PPO clip the policy update?"
+    assert sorted(vector_db.exam_vector_collections["stem"].get(include=[])["ids"]) == ["new", "old"]
+
+    vector_db.delete_collections()
+
+    print(f"TEST 8 PASSED\n")
+
+
 if __name__ == "__main__":
     test1_adding_and_retrieving_course_material_chunks_without_query()
     test2_adding_and_retrieving_old_exam_questions_without_query()
-    test3_adding_and_retrieving_old_exam_questions_with_query()
\ No newline at end of file
+    test3_adding_and_retrieving_old_exam_questions_with_query()
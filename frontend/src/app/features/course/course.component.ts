@@ -5,6 +5,12 @@ import { ActivatedRoute, Router } from '@angular/router';
 import { CourseService } from '../../services/course.service';
 import { HttpClient, HttpParams } from '@angular/common/http';
 
+interface UploadJob {
+  job_id: string;
+  status: 'queued' | 'running' | 'completed' | 'failed' | 'cancelled';
+  stage: string | null;
+  progress: { current?: number; total?: number };
+}
 
 @Component({
   selector: 'app-course',
@@ -21,6 +27,7 @@ export class CourseComponent {
   isLoading = true;
 
   private apiUrl = 'http://localhost:8000/courses';
+  private jobsUrl = 'http://localhost:8000/jobs';
 
   showAddModalMaterial = false;
   showAddModalExam = false;
@@ -160,7 +167,8 @@ export class CourseComponent {
     const uploadPromises = this.selectedFiles.map(file => {
       const formData = new FormData();
       formData.append('file', file);
-      return this.http.post(`${this.apiUrl}/${this.courseId}/upload/${type}`, formData).toPromise();
+      return this.http.post<UploadJob>(`${this.apiUrl}/${this.courseId}/upload/${type}`, formData).toPromise()
+        .then(job => this.waitForJob(job!.job_id));
     });
 
     Promise.all(uploadPromises)
@@ -193,6 +201,20 @@ export class CourseComponent {
       });
   }
 
+  // The backend ingests uploads in a background job, so we poll the job until it is done
+  private async waitForJob(jobId: string): Promise<UploadJob> {
+    while (true) {
+      const job = await this.http.get<UploadJob>(`${this.jobsUrl}/${jobId}`).toPromise();
+      if (job!.status === 'completed') {
+        return job!;
+      }
+      if (job!.status === 'failed' || job!.status === 'cancelled') {
+        throw { status: 500, job };
+      }
+      await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+  }
+
   // Returns correct icon depending on type of material
   getMaterialIcon(type: string): string {
     switch (type) {